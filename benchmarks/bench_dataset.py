@@ -0,0 +1,73 @@
+"""Before/after timing of the training pair-dataset build.
+
+    python benchmarks/bench_dataset.py [folder] [pairs]
+"""
+import os
+import sys
+import time
+import random
+
+import numpy as np
+import cv2
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, ROOT)
+
+import dataset
+
+
+def legacy_build(folder, list_dir, a_data):
+    # the original loop from training.py: two imreads and 5000 appends per pair
+    data, t = [], []
+    for i in range(a_data):
+        try:
+            photodata = []
+            a1 = random.randint(1, len(list_dir) - 1)
+            a2 = random.randint(0, 1)
+            image1 = cv2.imread(folder + "/" + list_dir[a1])
+            subnum = list_dir[a1].split('-')[0][1:]
+            subindexnum = list_dir[a1].split('-')[1]
+            if a2 == 0:
+                a3 = random.randint(1, len(list_dir) - 1)
+                image2 = cv2.imread(folder + "/" + list_dir[a3])
+            if a2 == 1:
+                a4 = random.randint(1, 6)
+                if subindexnum[0:-4] == str(a4):
+                    a4 += 1
+                image2 = cv2.imread(folder + "/m" + subnum + '-' + str(a4) + '.png')
+            for j in range(50):
+                for k in range(50):
+                    photodata.append(image1[j][k][0] / 255)
+            for j in range(50):
+                for k in range(50):
+                    photodata.append(image2[j][k][0] / 255)
+            data.append(photodata)
+            t.append(a2)
+        except Exception:
+            pass
+    return np.array(data), np.array(t)
+
+
+def main():
+    folder = sys.argv[1] if len(sys.argv) > 1 else os.path.join(ROOT, 'data')
+    a_data = int(sys.argv[2]) if len(sys.argv) > 2 else 1400
+    random.seed(0)
+    list_dir = sorted(f for f in os.listdir(folder) if f.endswith('.png'))
+
+    start = time.perf_counter()
+    X_old, _ = legacy_build(folder, list_dir, a_data)
+    before = time.perf_counter() - start
+
+    start = time.perf_counter()
+    images, _, subjects, _ = dataset.load_images(folder)
+    X_new, _ = dataset.build_pairs(images, subjects, a_data, rng=0)
+    after = time.perf_counter() - start
+
+    print(f'pairs            : {a_data}')
+    print(f'before (loop)    : {before:.3f} s  {X_old.shape} {X_old.dtype}')
+    print(f'after (vector)   : {after:.3f} s  {X_new.shape} {X_new.dtype}')
+    print(f'speedup          : {before / after:.1f}x')
+
+
+if __name__ == '__main__':
+    main()
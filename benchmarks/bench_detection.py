@@ -0,0 +1,67 @@
+"""Detections per second on a synthetic video: full-frame Haar scans vs. detection.FaceDetector.
+
+    python benchmarks/bench_detection.py [frames]
+
+A face from data/ is scaled up and drifted across a 640x480 noisy background.
+The still-image case runs the same photo through extract_face repeatedly.
+"""
+import os
+import sys
+import time
+
+import numpy as np
+import cv2
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, ROOT)
+
+import dataset
+from detection import FaceDetector
+from enroll import extract_face
+
+
+def synthetic_video(frames, rng):
+    face = cv2.imread(os.path.join(ROOT, 'data', dataset.list_images(os.path.join(ROOT, 'data'))[0]), 0)
+    face = cv2.resize(face, (150, 150))
+    background = rng.integers(60, 120, (480, 640), dtype=np.uint8)
+    video = []
+    for n in range(frames):
+        frame = background.copy()
+        x = 100 + int(300 * n / max(1, frames - 1))
+        y = 120 + int(40 * np.sin(n / 10))
+        frame[y:y + 150, x:x + 150] = face
+        video.append(frame)
+    return video
+
+
+def rate(detect, video):
+    found = 0
+    start = time.perf_counter()
+    for frame in video:
+        found += len(detect(frame)) > 0
+    seconds = time.perf_counter() - start
+    return len(video) / seconds, found
+
+
+def main():
+    frames = int(sys.argv[1]) if len(sys.argv) > 1 else 120
+    cascade = cv2.CascadeClassifier(os.path.join(ROOT, 'haarcascade_frontalface_default.xml'))
+    video = synthetic_video(frames, np.random.default_rng(0))
+
+    full, found = rate(lambda f: cascade.detectMultiScale(f, 1.3, 5), video)
+    print(f'full scan      : {full:8.1f} frames/s  face in {found}/{frames}')
+    detector = FaceDetector(cascade, memoize=False)
+    roi, found = rate(lambda f: detector.detectMultiScale(f, 1.3, 5), video)
+    print(f'ROI + fallback : {roi:8.1f} frames/s  face in {found}/{frames}  '
+          f'({roi / full:.1f}x, {detector.full_scans} full scans)')
+
+    still = [cv2.cvtColor(video[0], cv2.COLOR_GRAY2BGR)] * frames
+    plain, _ = rate(lambda f: [] if extract_face(f, cascade) is None else [1], still)
+    detector = FaceDetector(cascade, track=False)
+    memo, _ = rate(lambda f: [] if extract_face(f, detector) is None else [1], still)
+    print(f'repeated still : {plain:8.1f} -> {memo:8.1f} images/s with the content-hash memo '
+          f'({memo / plain:.0f}x)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+"""Per-query identification latency vs gallery size, brute force vs the IVF prefilter.
+
+    python benchmarks/bench_gallery_index.py [queries] [candidates]
+
+Galleries of 100 .. 100k faces are synthesised from noisy copies of the
+first-layer embeddings of data/ (computing 100k real embeddings would dominate
+the run). "found" is how often the candidates include a gallery copy of the
+query photo; "agreement" is how often both paths name the same top subject,
+which only means something with trained weights in model/.
+"""
+import os
+import sys
+import time
+
+import numpy as np
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, ROOT)
+
+import image_cache
+import inference
+from network import Network
+
+
+def main():
+    n_queries = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    candidates = int(sys.argv[2]) if len(sys.argv) > 2 else 64
+    rng = np.random.default_rng(0)
+    try:
+        network = inference.load_network(os.path.join(ROOT, 'model'))
+    except OSError:
+        np.random.seed(0)
+        network = Network()
+    images, _, _, _ = image_cache.load_images(os.path.join(ROOT, 'data'))
+    chosen = rng.choice(len(images), n_queries, replace=False)
+    queries = images[chosen]
+    network = inference.quantize.to_float32(network)
+    embeddings = inference.gallery_embeddings(network, images)
+
+    print('%8s %12s %12s %8s %7s %10s' % ('gallery', 'brute ms/q', 'index ms/q', 'speedup', 'found',
+                                          'agreement'))
+    for size in (100, 1000, 10000, 100000):
+        # gallery rows: data embeddings plus noise, 2 photos per subject; row q is query q's photo
+        pick = np.concatenate([chosen, rng.integers(0, len(images), size - n_queries)])
+        part = embeddings[pick]
+        part += rng.normal(0, 0.05 * part.std(), part.shape).astype(part.dtype)
+        gallery = np.broadcast_to(np.zeros((1, 50, 50), np.uint8), (size, 50, 50))
+        subjects = np.arange(size) // 2
+
+        brute = inference.FaceMatcher(network, gallery[:1], subjects)
+        brute.engine.set_gallery(gallery, part)
+        indexed = inference.FaceMatcher(network, gallery[:1], subjects, candidates=candidates)
+        indexed.engine.set_gallery(gallery, part)
+        start = time.perf_counter()
+        indexed.index = inference.IVFIndex(part, n_probe=8)
+        build = time.perf_counter() - start
+        ids, _ = indexed.index.search(indexed.engine.query_features(queries), candidates)
+        found = np.mean([np.any(pick[row] == c) for c, row in zip(chosen, ids)])
+
+        timings = {}
+        answers = {}
+        for name, matcher in (('brute', brute), ('index', indexed)):
+            matcher.identify(queries[:1])
+            start = time.perf_counter()
+            answers[name] = [matcher.identify(q)[0][0][0] for q in queries]
+            timings[name] = (time.perf_counter() - start) / n_queries
+        agreement = np.mean([a == b for a, b in zip(answers['brute'], answers['index'])])
+        print('%8d %12.2f %12.2f %7.1fx %6.0f%% %9.0f%%   (index built in %.2f s)'
+              % (size, timings['brute'] * 1000, timings['index'] * 1000,
+                 timings['brute'] / timings['index'], found * 100, agreement * 100, build))
+
+
+if __name__ == '__main__':
+    main()
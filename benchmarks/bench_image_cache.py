@@ -0,0 +1,40 @@
+"""Start-up time of decoding a folder with OpenCV vs. the memory-mapped cache.
+
+    python benchmarks/bench_image_cache.py [folder]
+"""
+import os
+import sys
+import time
+import tempfile
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, ROOT)
+
+import dataset
+import image_cache
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return time.perf_counter() - start, result
+
+
+def main():
+    folder = sys.argv[1] if len(sys.argv) > 1 else os.path.join(ROOT, 'data')
+    cache_folder = tempfile.mkdtemp()
+
+    decode, (images, _, _, _) = timed(dataset.load_images, folder)
+    build, _ = timed(image_cache.load_images, folder, cache_folder)
+    warm, (cached, _, _, _) = timed(image_cache.load_images, folder, cache_folder)
+
+    print(f'images              : {len(images)}')
+    print(f'decode every run    : {decode * 1000:.1f} ms')
+    print(f'first run (pack)    : {build * 1000:.1f} ms')
+    print(f'later runs (mmap)   : {warm * 1000:.1f} ms')
+    print(f'speedup             : {decode / warm:.1f}x')
+    assert (cached == images).all()
+
+
+if __name__ == '__main__':
+    main()
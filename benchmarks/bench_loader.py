@@ -0,0 +1,42 @@
+"""Decode scaling of loader.py across 1, 2, 4 and 8 worker processes.
+
+    python benchmarks/bench_loader.py [folder] [repeat]
+
+The folder's images are listed repeat times so there is enough work to spread.
+"""
+import os
+import sys
+import time
+
+import numpy as np
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, ROOT)
+
+import cv2
+
+import dataset
+import loader
+
+
+def main():
+    folder = sys.argv[1] if len(sys.argv) > 1 else os.path.join(ROOT, 'data')
+    repeat = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+    paths = [os.path.join(folder, f) for f in dataset.list_images(folder)] * repeat
+    print(f'{len(paths)} files, {os.cpu_count()} CPUs')
+
+    start = time.perf_counter()
+    serial = np.stack([dataset.to_face(cv2.imread(p)) for p in paths])
+    base = time.perf_counter() - start
+    print(f'in-process      : {base * 1000:8.1f} ms')
+
+    for workers in (1, 2, 4, 8):
+        start = time.perf_counter()
+        images, _ = loader.decode_files(paths, workers)
+        seconds = time.perf_counter() - start
+        assert np.array_equal(images, serial)
+        print(f'{workers} worker(s)     : {seconds * 1000:8.1f} ms  ({base / seconds:.2f}x)')
+
+
+if __name__ == '__main__':
+    main()
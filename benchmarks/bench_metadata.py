@@ -0,0 +1,105 @@
+"""Metadata CSV for a photo folder: full decode per file vs header-only on a thread pool,
+then incremental re-runs against the manifest.
+
+    python benchmarks/bench_metadata.py [files] [side]
+
+Writes files synthetic side x side photos (half PNG, half JPEG) to a temporary
+folder. The "decode" line is the old approach: cv2.imread of every file and
+a pandas DataFrame of all rows before writing.
+"""
+import os
+import sys
+import time
+import shutil
+import tempfile
+import tracemalloc
+
+import numpy as np
+import cv2
+import pandas as pd
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, ROOT)
+
+import generate_image_metadata
+
+
+def legacy_metadata(image_dir, csv_path):
+    records = []
+    for root, dirs, files in os.walk(image_dir):
+        for file in sorted(files):
+            image = cv2.imread(os.path.join(root, file))
+            if image is None:
+                continue
+            records.append({"filename": file, "width": image.shape[1], "height": image.shape[0],
+                            "size_kb": round(os.path.getsize(os.path.join(root, file)) / 1024, 2),
+                            "format": os.path.splitext(file)[1].replace(".", "").upper()})
+    pd.DataFrame(records).to_csv(csv_path, index=False)
+
+
+def measure(function, *args, reset=None):
+    """(seconds, peak traced bytes); the peak comes from a second, traced run (tracing slows it down)."""
+    for run in range(2):
+        if reset is not None:
+            reset()
+        if run:
+            tracemalloc.start()
+        start = time.perf_counter()
+        function(*args)
+        if not run:
+            seconds = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return seconds, peak
+
+
+def main():
+    files = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    side = int(sys.argv[2]) if len(sys.argv) > 2 else 320
+    rng = np.random.default_rng(0)
+    folder = tempfile.mkdtemp(prefix='facerec-metadata-')
+    try:
+        image = cv2.resize(rng.integers(0, 256, (side // 8, side // 8), dtype=np.uint8), (side, side))
+        encoded = {ext: cv2.imencode('.' + ext, image)[1].tobytes() for ext in ('png', 'jpg')}
+        names = ['m%d-%d.%s' % (n // 6 + 1, n % 6 + 1, 'png' if n % 2 else 'jpg') for n in range(files)]
+        for name in names:
+            with open(os.path.join(folder, name), 'wb') as f:
+                f.write(encoded[name[-3:]])
+        old_csv, new_csv = os.path.join(folder, 'old.csv'), os.path.join(folder, 'new.csv')
+        # warm the page cache so both sides read from memory
+        legacy_metadata(folder, old_csv)
+
+        print(f'{files} files of {side}x{side}, {os.cpu_count()} CPUs')
+        before, before_peak = measure(legacy_metadata, folder, old_csv)
+        print(f'decode + DataFrame : {before * 1000:8.1f} ms  peak {before_peak / 2 ** 20:6.1f} MiB')
+        manifest = new_csv + generate_image_metadata.MANIFEST_SUFFIX
+
+        def reset():
+            if os.path.exists(manifest):
+                os.remove(manifest)
+        for workers in (1, 4, 16):
+            after, peak = measure(generate_image_metadata.generate_metadata, folder, new_csv, workers,
+                                  reset=reset)
+            print(f'header, {workers:2d} thread(s): {after * 1000:8.1f} ms  peak {peak / 2 ** 20:6.1f} MiB'
+                  f'  ({before / after:.1f}x)')
+
+        start = time.perf_counter()
+        generate_image_metadata.generate_metadata(folder, new_csv)
+        print(f're-run, unchanged  : {(time.perf_counter() - start) * 1000:8.1f} ms')
+        for name in names[::100]:
+            os.utime(os.path.join(folder, name), ns=(0, 0))
+        os.remove(os.path.join(folder, names[1]))
+        start = time.perf_counter()
+        generate_image_metadata.generate_metadata(folder, new_csv)
+        print(f're-run, 1% touched : {(time.perf_counter() - start) * 1000:8.1f} ms')
+        legacy_metadata(folder, old_csv)
+        old = pd.read_csv(old_csv)
+        new = pd.read_csv(new_csv)[old.columns]
+        assert old.sort_values('filename').reset_index(drop=True).equals(
+            new.sort_values('filename').reset_index(drop=True))
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,48 @@
+"""Generations per second of the population search for 1, 2, 4 and 8 worker processes.
+
+    python benchmarks/bench_population_search.py [generations] [population] [pairs]
+
+Each worker runs its own forward passes, so cap the BLAS threads to get clean
+per-process scaling, e.g. OMP_NUM_THREADS=1 OPENBLAS_NUM_THREADS=1.
+"""
+import os
+import sys
+import time
+
+import numpy as np
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, ROOT)
+
+import dataset
+import image_cache
+from network import Network
+from random_search import PopulationSearch
+
+
+def main():
+    generations = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    population = int(sys.argv[2]) if len(sys.argv) > 2 else 16
+    pairs = int(sys.argv[3]) if len(sys.argv) > 3 else 1400
+    images, _, subjects, _ = image_cache.load_images(os.path.join(ROOT, 'data'))
+    X, y = dataset.build_pairs(images, subjects, pairs, rng=0)
+    print(f'{os.cpu_count()} CPUs, population {population}, {len(y)} pairs')
+
+    base = None
+    for workers in (0, 1, 2, 4, 8):
+        np.random.seed(0)
+        network = Network()
+        with PopulationSearch(network.layers, X, y, population=population, workers=workers) as search:
+            search.step()  # start-up and first page-in of the shared data
+            start = time.perf_counter()
+            best = search.run(generations)
+            seconds = time.perf_counter() - start
+        rate = generations / seconds
+        base = base or rate
+        label = 'in-process' if workers == 0 else f'{workers} worker(s)'
+        print(f'{label:12s}: {rate:6.3f} gen/s  {rate * population:7.2f} candidates/s  '
+              f'({rate / base:.2f}x)  best loss {best:.4f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+"""Iterations per second of the random-perturbation trainer, before and after the flat buffer.
+
+    python benchmarks/bench_random_search.py [iterations] [pairs]
+"""
+import os
+import sys
+import time
+
+import numpy as np
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, ROOT)
+
+import dataset
+import image_cache
+from network import Network
+from random_search import RandomSearch
+
+
+def legacy(network, X, y, iterations, lr=0.1):
+    # fresh float64 noise per layer and eight restore copies on every rejection
+    layers = network.layers
+    best = [(l.weights.copy(), l.biases.copy()) for l in layers]
+    best_loss = np.inf
+    rv = lr
+    for i in range(iterations):
+        for l in layers:
+            l.weights += rv * np.random.rand(*l.weights.shape) - rv / 2
+            l.biases += rv * np.random.rand(*l.biases.shape) - rv / 2
+        loss, _ = network.loss(X, y)
+        if loss < best_loss:
+            rv = lr
+            best = [(l.weights.copy(), l.biases.copy()) for l in layers]
+            best_loss = loss
+        else:
+            rv -= rv / 10
+            for l, (w, b) in zip(layers, best):
+                l.weights = w.copy()
+                l.biases = b.copy()
+    return best_loss
+
+
+def buffered(network, X, y, iterations, lr=0.1):
+    search = RandomSearch(network.layers, seed=0)
+    return search.run(network, X.astype(np.float32, copy=False), y, iterations, lr=lr)
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 30
+    pairs = int(sys.argv[2]) if len(sys.argv) > 2 else 1400
+    images, _, subjects, _ = image_cache.load_images(os.path.join(ROOT, 'data'))
+    X, y = dataset.build_pairs(images, subjects, pairs, rng=0)
+
+    results = {}
+    for name, method in (('before (float64 copies)', legacy), ('after (float32 buffer)', buffered)):
+        np.random.seed(0)
+        network = Network()
+        start = time.perf_counter()
+        loss = method(network, X, y, iterations)
+        seconds = time.perf_counter() - start
+        results[name] = iterations / seconds
+        print(f'{name:24s}: {iterations / seconds:6.2f} it/s  best loss {loss:.4f}')
+    before, after = results.values()
+    print(f'speedup                 : {after / before:.2f}x')
+
+
+if __name__ == '__main__':
+    main()
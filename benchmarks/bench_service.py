@@ -0,0 +1,85 @@
+"""Load generator for service.py: p50 / p99 latency and requests/s with and without micro-batching.
+
+    python benchmarks/bench_service.py [clients] [requests per client]
+
+The service runs in-process on a threaded local server with data/ as the
+gallery; every client thread posts 50x50 PNG faces to /identify back to back.
+"""
+import os
+import sys
+import time
+import logging
+import threading
+import urllib.request
+
+import numpy as np
+import cv2
+from werkzeug.serving import make_server
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, ROOT)
+
+import image_cache
+import inference
+import service
+from network import Network
+
+
+def load(url, bodies, clients, per_client):
+    latencies = []
+    lock = threading.Lock()
+
+    def client(c):
+        mine = []
+        for n in range(per_client):
+            body = bodies[(c * per_client + n) % len(bodies)]
+            req = urllib.request.Request(url, data=body, headers={'Content-Type': 'image/png'})
+            start = time.perf_counter()
+            with urllib.request.urlopen(req) as reply:
+                reply.read()
+            mine.append(time.perf_counter() - start)
+        with lock:
+            latencies.extend(mine)
+
+    threads = [threading.Thread(target=client, args=(c,)) for c in range(clients)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return np.array(latencies), time.perf_counter() - start
+
+
+def main():
+    clients = int(sys.argv[1]) if len(sys.argv) > 1 else 16
+    per_client = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    try:
+        network = inference.load_network(os.path.join(ROOT, 'model'))
+    except OSError:
+        np.random.seed(0)
+        network = Network()
+    images, _, subjects, _ = image_cache.load_images(os.path.join(ROOT, 'data'))
+    matcher = inference.FaceMatcher(network, images, subjects, precision='float32')
+    bodies = [cv2.imencode('.png', face)[1].tobytes() for face in images[:64]]
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    print(f'{clients} clients x {per_client} requests, gallery {len(images)} photos, {os.cpu_count()} CPUs')
+
+    for batch, wait in ((1, 0.), (8, 0.002), (32, 0.005)):
+        app = service.create_app(matcher, max_batch=batch, max_wait=wait)
+        server = make_server('127.0.0.1', 0, app, threaded=True)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        url = 'http://127.0.0.1:%d/identify' % server.server_port
+        load(url, bodies, 2, 2)  # warm-up
+        latencies, seconds = load(url, bodies, clients, per_client)
+        stats = app.batcher
+        print(f'max_batch {batch:3d} max_wait {wait * 1000:4.1f} ms : '
+              f'p50 {np.percentile(latencies, 50) * 1000:7.1f} ms  '
+              f'p99 {np.percentile(latencies, 99) * 1000:7.1f} ms  '
+              f'{len(latencies) / seconds:7.1f} req/s  mean batch {stats.items / stats.batches:5.1f}')
+        server.shutdown()
+        app.batcher.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+"""Cold-start cost of a single verification: import profile before / after facerec.py.
+
+    python benchmarks/bench_startup.py [photo] [subject]
+
+"before" imports what test.py pulled in at the top (matplotlib, pygame and
+tkinter are skipped when they are not installed); "after" is the import set
+of `facerec.py verify`. Each is run in a fresh interpreter with -X importtime.
+"""
+import os
+import re
+import sys
+import time
+import subprocess
+import importlib.util
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+BEFORE = ['matplotlib.pyplot', 'numpy', 'random', 'os', 'cv2', 'time', 'pygame', 'tkinter.filedialog',
+          'dataset', 'image_cache', 'inference', 'model_io', 'network']
+AFTER_HELP = ['facerec']
+AFTER_VERIFY = ['facerec', 'numpy', 'cv2', 'inference']
+
+
+def profile(modules):
+    code = 'import ' + ', '.join(modules)
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], cwd=ROOT,
+                            capture_output=True, text=True)
+    wall = time.perf_counter() - start
+    rows = []
+    for line in result.stderr.splitlines():
+        match = re.match(r'import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)', line)
+        if match and not match.group(3).strip() and len(match.group(3)) <= 1:
+            rows.append((int(match.group(2)) / 1e6, match.group(4)))
+    return wall, sorted(rows, reverse=True)
+
+
+def available(modules):
+    return [m for m in modules if importlib.util.find_spec(m.split('.')[0]) is not None]
+
+
+def main():
+    for label, modules in (('before (test.py imports)', available(BEFORE)),
+                           ('after: facerec --help', AFTER_HELP),
+                           ('after: facerec verify', AFTER_VERIFY)):
+        wall, rows = profile(modules)
+        print(f'{label:26s}: {wall * 1000:7.0f} ms interpreter + imports')
+        for seconds, name in rows[:6]:
+            print(f'    {seconds * 1000:7.1f} ms  {name}')
+
+    if len(sys.argv) > 2:
+        start = time.perf_counter()
+        subprocess.run([sys.executable, os.path.join(ROOT, 'facerec.py'), 'verify', sys.argv[1], sys.argv[2]],
+                       cwd=ROOT)
+        print(f'facerec verify end to end  : {(time.perf_counter() - start) * 1000:7.0f} ms')
+
+
+if __name__ == '__main__':
+    main()
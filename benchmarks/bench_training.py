@@ -0,0 +1,76 @@
+"""Wall-clock time to a target loss: random-perturbation search vs. mini-batch Adam.
+
+    python benchmarks/bench_training.py [target_loss] [budget_seconds]
+"""
+import os
+import sys
+import time
+
+import numpy as np
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, ROOT)
+
+import dataset
+import image_cache
+from network import Network, Optimizer_Adam
+
+
+def random_search(network, X, y, target_loss, budget, lr=0.1):
+    # the hill-climbing loop from training.py, stopped at the target or the budget
+    layers = network.layers
+    best = [(l.weights.copy(), l.biases.copy()) for l in layers]
+    best_loss, _ = network.loss(X, y)
+    best_loss += 1
+    rv = 0
+    start = time.perf_counter()
+    iterations = 0
+    while time.perf_counter() - start < budget:
+        for l in layers:
+            l.weights += rv * np.random.rand(*l.weights.shape) - rv / 2
+            l.biases += rv * np.random.rand(*l.biases.shape) - rv / 2
+        loss, _ = network.loss(X, y)
+        iterations += 1
+        if loss < best_loss:
+            rv = lr
+            best = [(l.weights.copy(), l.biases.copy()) for l in layers]
+            best_loss = loss
+            if loss <= target_loss:
+                break
+        else:
+            rv -= rv / 10
+            for l, (w, b) in zip(layers, best):
+                l.weights = w.copy()
+                l.biases = b.copy()
+    return time.perf_counter() - start, best_loss, iterations
+
+
+def gradient(network, X, y, target_loss, budget, lr=0.0003):
+    start = time.perf_counter()
+    best = [np.inf]
+
+    def stop(epoch, loss, acc):
+        best[0] = min(best[0], network.loss(X, y)[0])
+        return best[0] <= target_loss or time.perf_counter() - start > budget
+
+    history = network.fit(X, y, epochs=1000, batch_size=64, optimizer=Optimizer_Adam(lr),
+                          callback=stop, rng=0, print_every=0)
+    return time.perf_counter() - start, best[0], len(history)
+
+
+def main():
+    target_loss = float(sys.argv[1]) if len(sys.argv) > 1 else 0.6
+    budget = float(sys.argv[2]) if len(sys.argv) > 2 else 300
+    images, _, subjects, _ = image_cache.load_images(os.path.join(ROOT, 'data'))
+    X, y = dataset.build_pairs(images, subjects, 1400, rng=0)
+
+    print(f'target loss {target_loss}, budget {budget:.0f} s, {len(X)} pairs')
+    for name, method in (('random search', random_search), ('adam fit', gradient)):
+        np.random.seed(0)
+        seconds, loss, steps = method(Network(), X, y, target_loss, budget)
+        status = 'reached' if loss <= target_loss else 'NOT reached'
+        print(f'{name:14s}: {status} in {seconds:7.1f} s, best loss {loss:.4f}, {steps} iterations/epochs')
+
+
+if __name__ == '__main__':
+    main()
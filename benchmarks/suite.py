@@ -0,0 +1,310 @@
+"""Offline benchmark suite on synthetic 50x50 faces, with JSON results and a baseline check.
+
+    python benchmarks/suite.py                      # run all, write benchmarks/results.json
+    python benchmarks/suite.py --save-baseline      # ... and store them as benchmarks/baseline.json
+    python benchmarks/suite.py --compare            # exit 1 if anything is slower than the baseline
+    python benchmarks/suite.py --only forward identify --repeat 10
+
+Nothing is read from data/ or model/: faces, frames and photo folders are
+generated from fixed seeds in a temporary directory and the networks have
+random weights, so two runs on the same machine time the same work. Every
+benchmark reports the median / min / max milliseconds per call over --repeat
+timed rounds; --compare flags a regression when the median is more than
+--threshold (default 20%) above the baseline's.
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import platform
+import argparse
+import tempfile
+import contextlib
+import statistics
+
+import numpy as np
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, ROOT)
+
+import cv2
+
+import dataset
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+RESULTS = os.path.join(HERE, 'results.json')
+BASELINE = os.path.join(HERE, 'baseline.json')
+
+
+# -----------------------------
+# Synthetic data
+# -----------------------------
+def synthetic_faces(n_subjects, photos=6, seed=0):
+    """(images, subjects, photos): a random pattern per subject plus per-photo noise, subjects contiguous."""
+    rng = np.random.default_rng(seed)
+    base = rng.integers(40, 216, (n_subjects, 1, dataset.IMAGE_SIZE, dataset.IMAGE_SIZE))
+    noise = rng.normal(0, 20, (n_subjects, photos, dataset.IMAGE_SIZE, dataset.IMAGE_SIZE))
+    images = np.clip(base + noise, 0, 255).astype(np.uint8).reshape(-1, dataset.IMAGE_SIZE, dataset.IMAGE_SIZE)
+    subjects = np.repeat(np.arange(1, n_subjects + 1), photos)
+    return images, subjects, np.tile(np.arange(1, photos + 1), n_subjects)
+
+
+def synthetic_frame(width=640, height=480, seed=0):
+    """BGR camera-sized frame: smooth background with a bright face-sized ellipse."""
+    rng = np.random.default_rng(seed)
+    frame = cv2.resize(rng.integers(0, 256, (12, 16, 3), dtype=np.uint8), (width, height))
+    cv2.ellipse(frame, (width // 2, height // 2), (70, 95), 0, 0, 360, (170, 180, 200), -1)
+    for dx in (-28, 28):
+        cv2.circle(frame, (width // 2 + dx, height // 2 - 20), 9, (40, 40, 40), -1)
+    return frame
+
+
+def write_photos(folder, images, subjects, photos):
+    os.makedirs(folder, exist_ok=True)
+    for image, s, p in zip(images, subjects, photos):
+        cv2.imwrite(os.path.join(folder, 'm%d-%d.png' % (s, p)), image)
+
+
+# -----------------------------
+# Benchmarks
+# -----------------------------
+BENCHMARKS = []
+
+
+def benchmark(name, number=1):
+    """Register make(workdir) -> run or (run, setup); run is timed number times per round, setup is not."""
+    def register(make):
+        BENCHMARKS.append((name, make, number))
+        return make
+    return register
+
+
+@benchmark('pairs_build_1400', number=5)
+def bench_pairs_build(workdir):
+    # training.main(): 1400 pairs from the decoded photos
+    images, subjects, _ = synthetic_faces(80)
+    return lambda: dataset.build_pairs(images, subjects, 1400, rng=0)
+
+
+@benchmark('pairs_stream_epoch')
+def bench_pairs_stream(workdir):
+    # training.py with stream_pairs: one epoch of freshly drawn balanced batches
+    images, subjects, _ = synthetic_faces(80)
+
+    def run():
+        for _ in dataset.iter_pair_batches(images, subjects, 64, batches=22, rng=0):
+            pass
+    return run
+
+
+@benchmark('train_step_adam_64', number=3)
+def bench_train_step(workdir):
+    from network import Network, Optimizer_Adam
+    images, subjects, _ = synthetic_faces(80)
+    X, y = dataset.build_pairs(images, subjects, 64, rng=0)
+    np.random.seed(0)
+    network = Network()
+    optimizer = Optimizer_Adam(0.0003)
+    return lambda: network.train_step(X, y, optimizer)
+
+
+def _bench_forward(batch):
+    def make(workdir):
+        from network import Layer
+        np.random.seed(0)
+        layer = Layer(dataset.PIXELS * 2, 500)
+        X = np.random.rand(batch, dataset.PIXELS * 2)
+        return lambda: layer.forward(X)
+    return make
+
+
+for _batch, _number in ((1, 200), (64, 10), (1024, 1)):
+    benchmark('layer_forward_b%d' % _batch, _number)(_bench_forward(_batch))
+
+
+@benchmark('identify_1_vs_600', number=10)
+def bench_identify(workdir):
+    # test.py: one query photo against every subject photo, top 3
+    import inference
+    from network import Network
+    gallery, subjects, _ = synthetic_faces(100)
+    query = synthetic_faces(1, 1, seed=1)[0]
+    np.random.seed(0)
+    matcher = inference.FaceMatcher(Network(), gallery, subjects)
+    return lambda: matcher.identify(query, k=3)
+
+
+@benchmark('extract_face_640x480', number=3)
+def bench_extract_face(workdir):
+    from enroll import extract_face
+    cascade = cv2.CascadeClassifier(os.path.join(ROOT, 'haarcascade_frontalface_default.xml'))
+    frame = synthetic_frame()
+    return lambda: extract_face(frame, cascade)
+
+
+def _metadata(workdir, fresh):
+    import generate_image_metadata
+    folder = os.path.join(workdir, 'metadata_photos')
+    if not os.path.isdir(folder):
+        write_photos(folder, *synthetic_faces(50))
+    csv = os.path.join(workdir, 'image_metadata.csv')
+    manifest = csv + generate_image_metadata.MANIFEST_SUFFIX
+
+    def run():
+        generate_image_metadata.generate_metadata(folder, csv)
+
+    def setup():
+        if os.path.exists(manifest):
+            os.remove(manifest)
+    return (run, setup) if fresh else run
+
+
+@benchmark('metadata_300')
+def bench_metadata(workdir):
+    # every header read: no manifest yet
+    return _metadata(workdir, fresh=True)
+
+
+@benchmark('metadata_300_unchanged', number=5)
+def bench_metadata_unchanged(workdir):
+    # re-run on a folder the manifest already describes
+    return _metadata(workdir, fresh=False)
+
+
+@benchmark('dedup_10000')
+def bench_dedup(workdir):
+    # perceptual hashes and near-duplicate search of 10000 crops, 1% of them re-saved copies
+    import dedup
+    images, subjects, photos = (array[:10000].copy() for array in synthetic_faces(1667))
+    images[::100] = np.clip(images[1::100].astype(int) + 8, 0, 255)
+    filenames = ['m%d-%d.png' % pair for pair in zip(subjects, photos)]
+    return lambda: dedup.find_duplicates(images, filenames, subjects, photos)
+
+
+# -----------------------------
+# Runner
+# -----------------------------
+def time_benchmark(make, number=1, repeat=5, workdir=None):
+    """Milliseconds per call of each of repeat rounds, after one untimed warm-up round."""
+    # the scripts under test print progress; keep the report readable
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        made = make(workdir)
+        run, setup = made if isinstance(made, tuple) else (made, None)
+        times = []
+        for _ in range(repeat + 1):
+            if setup is not None:
+                setup()
+            start = time.perf_counter()
+            for _ in range(number):
+                run()
+            times.append((time.perf_counter() - start) * 1000 / number)
+    return times[1:]
+
+
+def summarize(times, number):
+    return {'median_ms': statistics.median(times), 'min_ms': min(times), 'max_ms': max(times),
+            'repeat': len(times), 'number': number}
+
+
+def environment():
+    return {'python': platform.python_version(), 'numpy': np.__version__, 'opencv': cv2.__version__,
+            'platform': platform.platform(), 'machine': platform.machine(), 'cpus': os.cpu_count(),
+            'date': time.strftime('%Y-%m-%dT%H:%M:%S')}
+
+
+def run_suite(names=None, repeat=5, progress=print):
+    """{'environment': ..., 'results': {name: summary}} for the benchmarks whose name contains one of names."""
+    results = {}
+    workdir = tempfile.mkdtemp(prefix='facerec-bench-')
+    try:
+        for name, make, number in BENCHMARKS:
+            if names and not any(n in name for n in names):
+                continue
+            results[name] = summarize(time_benchmark(make, number, repeat, workdir), number)
+            if progress:
+                progress('%-24s %10.3f ms  (min %.3f, max %.3f)' % (
+                    name, results[name]['median_ms'], results[name]['min_ms'], results[name]['max_ms']))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return {'environment': environment(), 'results': results}
+
+
+def compare(current, baseline, threshold=0.2):
+    """Rows (name, baseline_ms, current_ms, ratio, status) comparing median times.
+
+    status is 'regression' above 1 + threshold times the baseline, 'faster'
+    below 1 / (1 + threshold), 'ok' in between, 'new' / 'missing' when only
+    one side has the benchmark.
+    """
+    current, baseline = current['results'], baseline['results']
+    rows = []
+    for name in list(baseline) + [n for n in current if n not in baseline]:
+        if name not in current:
+            rows.append((name, baseline[name]['median_ms'], None, None, 'missing'))
+            continue
+        if name not in baseline:
+            rows.append((name, None, current[name]['median_ms'], None, 'new'))
+            continue
+        base, now = baseline[name]['median_ms'], current[name]['median_ms']
+        ratio = now / base if base > 0 else float('inf')
+        if ratio > 1 + threshold:
+            status = 'regression'
+        elif ratio < 1 / (1 + threshold):
+            status = 'faster'
+        else:
+            status = 'ok'
+        rows.append((name, base, now, ratio, status))
+    return rows
+
+
+def print_comparison(rows):
+    print('%-24s %12s %12s %8s  %s' % ('benchmark', 'baseline ms', 'current ms', 'ratio', 'status'))
+    for name, base, now, ratio, status in rows:
+        print('%-24s %12s %12s %8s  %s' % (name, '-' if base is None else '%.3f' % base,
+                                           '-' if now is None else '%.3f' % now,
+                                           '-' if ratio is None else '%.2fx' % ratio,
+                                           status.upper() if status == 'regression' else status))
+
+
+def write_json(path, data):
+    with open(path, 'w') as f:
+        json.dump(data, f, indent=2)
+        f.write('\n')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Offline benchmark suite.')
+    parser.add_argument('--only', nargs='+', metavar='NAME', help='run benchmarks whose name contains NAME')
+    parser.add_argument('--repeat', type=int, default=5, help='timed rounds per benchmark')
+    parser.add_argument('--output', default=RESULTS, help='results JSON (default: %(default)s)')
+    parser.add_argument('--save-baseline', action='store_true', help='also write the results as the baseline')
+    parser.add_argument('--compare', nargs='?', const=BASELINE, metavar='BASELINE',
+                        help='compare against a baseline JSON (default: %s)' % BASELINE)
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help='relative slowdown counted as a regression (default: %(default)s)')
+    args = parser.parse_args(argv)
+
+    results = run_suite(args.only, args.repeat)
+    write_json(args.output, results)
+    print('results written to', args.output)
+    if args.save_baseline:
+        write_json(BASELINE, results)
+        print('baseline written to', BASELINE)
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if args.only:
+            baseline['results'] = {name: summary for name, summary in baseline['results'].items()
+                                   if any(n in name for n in args.only)}
+        rows = compare(results, baseline, args.threshold)
+        print_comparison(rows)
+        regressions = [row[0] for row in rows if row[4] == 'regression']
+        if regressions:
+            print('%d regression(s): %s' % (len(regressions), ', '.join(regressions)))
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,131 @@
+import os
+import time
+import atexit
+import threading
+import numpy as np
+
+import model_io
+import profiling
+
+
+class CheckpointWriter:
+    """Writes model checkpoints on a background thread.
+
+    submit() copies the parameters and returns straight away; the writer thread
+    only ever writes the newest pending snapshot (older ones are dropped), at
+    most once per min_interval seconds. Snapshots that do not beat the last
+    accepted loss by at least min_delta are ignored. The newest checkpoint is
+    at path and the keep - 1 before it at path.1, path.2, ... each carrying its
+    loss / accuracy in the model metadata.
+    """
+
+    def __init__(self, path, min_interval=0., min_delta=0., keep=3):
+        self.path = path
+        self.min_interval = min_interval
+        self.min_delta = min_delta
+        self.keep = max(1, keep)
+        self.best_loss = np.inf
+        self.written = 0
+        self.dropped = 0
+        self.error = None
+
+        self._pending = None
+        self._last_write = -np.inf
+        self._busy = False
+        self._flushing = False
+        self._closed = False
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name='checkpoint-writer', daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def submit(self, params, loss, acc=None, **meta):
+        """Queue [(weights, biases), ...] for writing; returns False if the policy skips it."""
+        loss = float(loss)
+        if self.best_loss - loss < self.min_delta:
+            return False
+        snapshot = [(np.array(w), np.array(b)) for w, b in params]
+        meta = dict(meta, loss=loss, time=time.time())
+        if acc is not None:
+            meta['acc'] = float(acc)
+        with self._cond:
+            if self._closed:
+                raise RuntimeError('checkpoint writer is closed')
+            if self._pending is not None:
+                self.dropped += 1
+            self._pending = (snapshot, meta)
+            self.best_loss = loss
+            self._cond.notify_all()
+        return True
+
+    def flush(self):
+        """Block until everything submitted so far is on disk."""
+        with self._cond:
+            self._flushing = True
+            self._cond.notify_all()
+            while self._pending is not None or self._busy:
+                self._cond.wait()
+            self._flushing = False
+
+    def close(self):
+        if self._closed:
+            return
+        self.flush()
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join()
+        if self.error is not None:
+            print('checkpoint failed:', self.error)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def history(self):
+        """[(path, metadata)] of the kept checkpoints, newest first."""
+        kept = []
+        for path in self._paths():
+            if os.path.exists(path):
+                kept.append((path, model_io.read_header(path)['meta']))
+        return kept
+
+    def _paths(self):
+        return [self.path] + ['%s.%d' % (self.path, n) for n in range(1, self.keep)]
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._closed:
+                    wait = 0 if self._flushing else self._last_write + self.min_interval - time.monotonic()
+                    if self._pending is not None and wait <= 0:
+                        break
+                    self._cond.wait(wait if self._pending is not None else None)
+                if self._pending is None:
+                    return
+                (params, meta), self._pending = self._pending, None
+                self._busy = True
+            try:
+                self._write(params, dict(meta, seq=self.written + 1))
+                self.written += 1
+            except Exception as er:
+                self.error = er
+            with self._cond:
+                self._busy = False
+                self._last_write = time.monotonic()
+                self._cond.notify_all()
+
+    @profiling.timed('checkpoint_write')
+    def _write(self, params, meta):
+        if self.keep == 1:
+            model_io.save_model(self.path, params, **meta)
+            return
+        new = self.path + '.new'
+        model_io.save_model(new, params, **meta)
+        paths = self._paths()
+        for older, newer in zip(paths[::-1][:-1], paths[::-1][1:]):
+            if os.path.exists(newer):
+                os.replace(newer, older)
+        os.replace(new, self.path)
@@ -1,10 +1,15 @@
 from flask import Flask, render_template_string
 import os
+import urllib.request
+
+import profiling
 
 app = Flask(__name__)
 
 DEPLOY_LOG = "C:/face_recognition/deploy.log"
 VERSION_FILE = "C:/face_recognition/version.txt"
+# Prometheus text of the recognition service (service.py /metrics)
+METRICS_URL = os.environ.get("FACEREC_METRICS_URL", "http://localhost:5001/metrics")
 
 HTML = """
 <h1>🚀 Face Recognition Deployment Dashboard</h1>
@@ -17,8 +22,42 @@ HTML = """
 
 <h3>❤️ Health</h3>
 <pre>{{ health }}</pre>
+
+<h3>⏱️ Pipeline stages</h3>
+{% if stages %}
+<table border="1" cellpadding="4">
+<tr><th>stage</th><th>calls</th><th>total s</th><th>mean ms</th><th>p50 ≤ ms</th><th>p99 ≤ ms</th></tr>
+{% for name, s in stages %}
+<tr><td>{{ name }}</td><td>{{ s.count }}</td><td>{{ "%.3f"|format(s.total_seconds) }}</td>
+<td>{{ "%.3f"|format(s.mean_ms) }}</td><td>{{ s.p50 }}</td><td>{{ s.p99 }}</td></tr>
+{% endfor %}
+</table>
+{% else %}
+<pre>{{ metrics_error }}</pre>
+{% endif %}
 """
 
+
+def bucket_quantile(buckets, q):
+    """Upper bound (ms) of the histogram bucket holding quantile q of the calls."""
+    total = buckets.get("+Inf", 0)
+    for le, n in buckets.items():
+        if n >= q * total:
+            return le if le == "+Inf" else "%g" % (float(le) * 1000)
+    return "+Inf"
+
+
+def read_stages(url=METRICS_URL):
+    with urllib.request.urlopen(url, timeout=2) as response:
+        stages = profiling.parse_prometheus(response.read().decode())
+    rows = []
+    for name, stage in sorted(stages.items(), key=lambda item: -item[1]["total_seconds"]):
+        count = stage["count"]
+        rows.append((name, dict(stage, mean_ms=stage["total_seconds"] * 1000 / count if count else 0.,
+                                p50=bucket_quantile(stage["buckets"], 0.5),
+                                p99=bucket_quantile(stage["buckets"], 0.99))))
+    return rows
+
 @app.route("/")
 def dashboard():
     version = "Unknown"
@@ -33,11 +72,21 @@ def dashboard():
 
     health = "OK" if os.path.exists("C:/face_recognition/app") else "FAILED"
 
+    stages, metrics_error = [], ""
+    try:
+        stages = read_stages()
+        if not stages:
+            metrics_error = "No stages recorded yet"
+    except OSError as e:
+        metrics_error = f"Metrics unavailable ({METRICS_URL}): {e}"
+
     return render_template_string(
         HTML,
         version=version,
         log=log,
-        health=health
+        health=health,
+        stages=stages,
+        metrics_error=metrics_error
     )
 
 if __name__ == "__main__":
@@ -0,0 +1,194 @@
+import os
+import numpy as np
+import cv2
+
+import profiling
+
+# -----------------------------
+# Settings
+# -----------------------------
+IMAGE_SIZE = 50
+PIXELS = IMAGE_SIZE * IMAGE_SIZE
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg')
+
+
+def parse_name(fname):
+    """Return (subject, photo index) from 'm<subject>-<index>.png' or '<subject>.png'."""
+    stem = os.path.splitext(os.path.basename(fname))[0]
+    if stem[:1].isalpha():
+        stem = stem[1:]
+    parts = stem.split('-')
+    try:
+        if len(parts) == 1:
+            return int(parts[0]), 0
+        return int(parts[0]), int(parts[1])
+    except ValueError:
+        return -1, -1
+
+
+def list_images(folder):
+    """Image files in folder, sorted by (subject, photo index) so subjects are contiguous."""
+    files = [f for f in os.listdir(folder) if f.lower().endswith(IMAGE_EXTENSIONS)]
+    return sorted(files, key=lambda f: parse_name(f) + (f,))
+
+
+def to_face(image, size=IMAGE_SIZE):
+    """Single-channel size x size uint8 crop, taking channel 0 of colour images like training.py."""
+    if image.ndim == 3:
+        image = image[:, :, 0]
+    if image.shape != (size, size):
+        with profiling.stage('resize'):
+            image = cv2.resize(image, (size, size))
+    return image
+
+
+def load_images(folder, size=IMAGE_SIZE):
+    """Decode every image in folder once.
+
+    Returns (images, filenames, subjects, photos) where images is a contiguous
+    uint8 array of shape (N, size, size).
+    """
+    filenames = list_images(folder)
+    images = np.empty((len(filenames), size, size), dtype=np.uint8)
+    keep = np.ones(len(filenames), dtype=bool)
+    for n, fname in enumerate(filenames):
+        with profiling.stage('imread'):
+            image = cv2.imread(os.path.join(folder, fname))
+        if image is None:
+            print('⚠️ Could not read:', fname)
+            keep[n] = False
+            continue
+        images[n] = to_face(image, size)
+
+    filenames = [f for f, k in zip(filenames, keep) if k]
+    names = np.array([parse_name(f) for f in filenames], dtype=np.int64).reshape(-1, 2)
+    return np.ascontiguousarray(images[keep]), filenames, names[:, 0], names[:, 1]
+
+
+def subject_table(subjects):
+    """(start, count) of every subject group in contiguous subjects."""
+    subjects = np.asarray(subjects)
+    group_starts = np.concatenate(([0], np.flatnonzero(np.diff(subjects)) + 1))
+    group_counts = np.diff(np.concatenate((group_starts, [len(subjects)])))
+    return group_starts, group_counts
+
+
+def subject_groups(subjects):
+    """Start offset and size of each image's subject group (subjects must be contiguous)."""
+    starts, counts = subject_table(subjects)
+    group = np.repeat(np.arange(len(starts)), counts)
+    return starts[group], counts[group]
+
+
+def sample_pairs(subjects, n_pairs, rng=None):
+    """Draw (idx1, idx2, y) pair indices; y=1 same subject another photo, y=0 another person.
+
+    Subjects must be contiguous (as returned by load_images). Same-subject pairs are
+    only drawn for subjects with at least two photos.
+    """
+    rng = np.random.default_rng(rng)
+    starts, counts = subject_groups(subjects)
+    n = len(subjects)
+    if n == 0 or counts[0] == n:
+        raise ValueError('need photos of at least two subjects to build pairs')
+
+    y = rng.integers(0, 2, n_pairs)
+    idx1 = rng.integers(0, n, n_pairs)
+
+    # same person needs a second photo: redraw anchors from subjects that have one
+    multi = np.flatnonzero(counts > 1)
+    pos = y == 1
+    if len(multi):
+        idx1[pos] = multi[rng.integers(0, len(multi), pos.sum())]
+    else:
+        y[:] = 0
+        pos[:] = False
+
+    idx2 = np.empty(n_pairs, dtype=np.int64)
+
+    # another photo of the same subject: shift by 1..count-1 inside the group
+    s, c = starts[idx1[pos]], counts[idx1[pos]]
+    offset = rng.integers(1, np.maximum(c, 2))
+    idx2[pos] = s + (idx1[pos] - s + offset) % c
+
+    # another person: uniform over images outside the anchor's group
+    neg = ~pos
+    s, c = starts[idx1[neg]], counts[idx1[neg]]
+    j = rng.integers(0, np.maximum(n - c, 1))
+    idx2[neg] = j + (j >= s) * c
+
+    return idx1, idx2, y
+
+
+def pair_matrix(images, idx1, idx2, out=None):
+    """(pairs, 2 * pixels) float32 matrix of [image1, image2] scaled to 0..1."""
+    images = np.asarray(images)
+    flat = images.reshape(len(images), -1)
+    pixels = flat.shape[1]
+    if out is None:
+        out = np.empty((len(idx1), 2 * pixels), dtype=np.float32)
+    np.multiply(flat[idx1], np.float32(1 / 255), out=out[:, :pixels])
+    np.multiply(flat[idx2], np.float32(1 / 255), out=out[:, pixels:])
+    return out
+
+
+def build_pairs(images, subjects, n_pairs, rng=None):
+    """Sample n_pairs same/different pairs and return (X, y)."""
+    idx1, idx2, y = sample_pairs(subjects, n_pairs, rng)
+    return pair_matrix(images, idx1, idx2), y
+
+
+def sample_balanced_pairs(subjects, n_pairs, rng=None, table=None):
+    """Like sample_pairs() but exactly half same / half different, anchors drawn per subject.
+
+    Every subject is equally likely to be picked whatever its number of photos,
+    and "another person" is a uniformly drawn other subject. Pass table from
+    subject_table() to skip recomputing it on every call.
+    """
+    rng = np.random.default_rng(rng)
+    group_starts, group_counts = subject_table(subjects) if table is None else table
+    n_groups = len(group_starts)
+    multi = np.flatnonzero(group_counts > 1)
+    if n_groups < 2 or not len(multi):
+        raise ValueError('need two subjects and one subject with two photos to build pairs')
+
+    y = np.zeros(n_pairs, dtype=np.int64)
+    y[:n_pairs // 2] = 1
+    rng.shuffle(y)
+    pos = y == 1
+    n_pos = int(pos.sum())
+
+    group1 = rng.integers(0, n_groups, n_pairs)
+    group1[pos] = multi[rng.integers(0, len(multi), n_pos)]
+    counts1 = group_counts[group1]
+    photo1 = rng.integers(0, counts1)
+    idx1 = group_starts[group1] + photo1
+
+    idx2 = np.empty(n_pairs, dtype=np.int64)
+    photo2 = (photo1[pos] + rng.integers(1, counts1[pos])) % counts1[pos]
+    idx2[pos] = group_starts[group1[pos]] + photo2
+
+    neg = ~pos
+    group2 = rng.integers(0, n_groups - 1, n_pairs - n_pos)
+    group2 += group2 >= group1[neg]
+    idx2[neg] = group_starts[group2] + rng.integers(0, group_counts[group2])
+    return idx1, idx2, y
+
+
+def iter_pair_batches(images, subjects, batch_size=64, batches=None, rng=None, reuse=False):
+    """Yield (X, y) float32 pair mini-batches drawn on demand from the decoded image tensor.
+
+    Memory stays at one batch no matter how many pairs an epoch uses; batches=None
+    streams forever. With reuse=True every batch is written into the same buffer,
+    so the consumer must be done with one batch before asking for the next.
+    """
+    rng = np.random.default_rng(rng)
+    table = subject_table(subjects)
+    out = None
+    n = 0
+    while batches is None or n < batches:
+        idx1, idx2, y = sample_balanced_pairs(subjects, batch_size, rng, table)
+        if not reuse or out is None:
+            out = np.empty((batch_size, 2 * np.asarray(images[0]).size), dtype=np.float32)
+        yield pair_matrix(images, idx1, idx2, out=out), y
+        n += 1
@@ -0,0 +1,225 @@
+"""Duplicate and near-duplicate face crops in a photo folder.
+
+    python dedup.py [folder] [--max-distance 16] [--report dedup_report.csv] [--quarantine quarantine.txt]
+
+Every 50x50 crop gets a perceptual hash: the signs of its lowest 16x16 DCT
+frequencies against their median, 256 bits, computed for a whole batch with
+two matrix products. Crops whose hashes differ in at most max_distance bits
+are near-duplicates. Instead of comparing all N^2 pairs, the bits are split
+into bands, each a sorted multi-index of its keys; two hashes that close are
+at most one bit apart on at least one band, so only those pairs are compared.
+Near-duplicate pairs are joined into groups; the first file of each group
+(lowest subject / photo) is kept and the others go to the quarantine list,
+which training.py can leave out (training.quarantine).
+"""
+import csv
+import argparse
+import numpy as np
+
+import dataset
+
+# -----------------------------
+# Settings
+# -----------------------------
+FOLDER = 'data'
+HASH_SIZE = 16
+# bits of 256. Re-lit, blurred or re-encoded copies of a crop measured 12-20
+# bits apart (quality 60 JPEG up to 20); the closest two distinct photos in
+# data/ are 22 apart (m73-6 / m73-7), the next 32. 16 leaves a 6-bit margin
+# and misses some heavy re-encodes; 20 catches those with only 2 bits to spare.
+MAX_DISTANCE = 16
+# images hashed per matrix product
+CHUNK = 4096
+REPORT_FIELDS = ['group', 'filename', 'subject', 'photo', 'keep', 'distance', 'identical', 'cross_subject',
+                 'action']
+
+# set bits per byte, for numpy without bitwise_count
+_POPCOUNT = np.array([bin(n).count('1') for n in range(256)], dtype=np.uint8)
+
+
+def dct_basis(size=dataset.IMAGE_SIZE, hash_size=HASH_SIZE):
+    """(hash_size, size) rows of the DCT-II basis for the lowest frequencies."""
+    k = np.arange(hash_size)[:, None]
+    x = np.arange(size)[None, :]
+    return np.cos(np.pi * (2 * x + 1) * k / (2 * size)).astype(np.float32)
+
+
+def phash(images, hash_size=HASH_SIZE, chunk=CHUNK):
+    """Packed perceptual hashes, uint8 (N, hash_size ** 2 // 8), of a uint8 (N, size, size) stack."""
+    images = np.asarray(images)
+    basis = dct_basis(images.shape[-1], hash_size)
+    hashes = np.zeros((len(images), hash_size * hash_size // 8), dtype=np.uint8)
+    for start in range(0, len(images), chunk):
+        coefficients = basis @ images[start:start + chunk].astype(np.float32) @ basis.T
+        coefficients = coefficients.reshape(len(coefficients), -1)
+        # the DC term only carries the brightness, leave it out of the median
+        median = np.median(coefficients[:, 1:], axis=1, keepdims=True)
+        hashes[start:start + chunk] = np.packbits(coefficients > median, axis=1)
+    return hashes
+
+
+def hamming(hashes, i, j):
+    """Bit distance between hashes[i] and hashes[j], elementwise."""
+    if hashes.shape[1] % 8 == 0:
+        hashes = np.ascontiguousarray(hashes).view(np.uint64)
+    xor = hashes[i] ^ hashes[j]
+    if hasattr(np, 'bitwise_count'):
+        return np.bitwise_count(xor).sum(axis=1, dtype=np.int64)
+    return _POPCOUNT[xor.view(np.uint8)].sum(axis=1, dtype=np.int64)
+
+
+def _spans(starts, counts):
+    """Concatenated ranges(start, start + count), without a Python loop."""
+    offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    return np.repeat(starts, counts) + offsets
+
+
+def _band_pairs(keys, width):
+    """(i, j), i < j, of every two rows whose width-bit keys differ in at most one bit."""
+    order = np.argsort(keys, kind='stable')
+    ordered = keys[order]
+    found = []
+    for flip in [0] + [1 << bit for bit in range(width)]:
+        # sorted probes look up much faster; flipping a bit of sorted keys leaves long sorted runs
+        probe = ordered ^ flip
+        probe_order = np.argsort(probe, kind='stable')
+        probe = probe[probe_order]
+        start = np.searchsorted(ordered, probe, 'left')
+        counts = np.searchsorted(ordered, probe, 'right') - start
+        i, j = order[np.repeat(probe_order, counts)], order[_spans(start, counts)]
+        # both rows find each other, keep one direction
+        found.append((i[i < j], j[i < j]))
+    return np.concatenate([i for i, _ in found]), np.concatenate([j for _, j in found])
+
+
+def near_duplicates(hashes, max_distance=MAX_DISTANCE):
+    """(i, j, distance) of every pair of hashes at most max_distance bits apart, i < j, sorted.
+
+    With max_distance // 2 + 1 bands, two hashes that close differ in at most
+    one bit on some band (pigeonhole), so each band is probed with its key and
+    the keys one bit away.
+    """
+    bits = np.unpackbits(hashes, axis=1)
+    # more bands only make the keys narrower; at most 32 bits keep them in an int64
+    bands = min(max(max_distance // 2 + 1, -(-bits.shape[1] // 32)), bits.shape[1])
+    weights = np.int64(1) << np.arange(-(-bits.shape[1] // bands), dtype=np.int64)
+    found = []
+    for band in range(bands):
+        # every bands-th bit, so each band mixes low and high frequencies
+        columns = bits[:, band::bands]
+        i, j = _band_pairs(columns.astype(np.int64) @ weights[:columns.shape[1]], columns.shape[1])
+        distance = hamming(hashes, i, j)
+        close = distance <= max_distance
+        found.append(np.stack([i[close], j[close], distance[close]], axis=1))
+    # a pair close on several bands is found once per band
+    pairs = np.unique(np.concatenate(found), axis=0) if found else np.zeros((0, 3), dtype=np.int64)
+    return pairs[:, 0], pairs[:, 1], pairs[:, 2]
+
+
+def components(n, i, j):
+    """Group label of each of n items linked by the (i, j) pairs: the smallest index in its group."""
+    labels = np.arange(n)
+    while True:
+        low = np.minimum(labels[i], labels[j])
+        new = labels.copy()
+        np.minimum.at(new, i, low)
+        np.minimum.at(new, j, low)
+        new = new[new]
+        if np.array_equal(new, labels):
+            return labels
+        labels = new
+
+
+def find_duplicates(images, filenames, subjects, photos, max_distance=MAX_DISTANCE):
+    """Report rows (REPORT_FIELDS) of every image that has a near-duplicate, grouped, kept file first.
+
+    images must be in (subject, photo) order, as dataset.list_images returns them.
+    """
+    hashes = phash(images)
+    i, j, _ = near_duplicates(hashes, max_distance)
+    labels = components(len(hashes), i, j)
+    members = np.flatnonzero(labels != np.arange(len(labels)))
+    keep = np.unique(labels[members])
+    members = np.sort(np.concatenate((keep, members)))
+    # keep is the first member of its group, so sorting by label puts it first
+    members = members[np.argsort(labels[members], kind='stable')]
+    kept = labels[members]
+    distance = hamming(hashes, members, kept)
+    identical = np.all(np.asarray(images[members]) == np.asarray(images[kept]), axis=(1, 2))
+    group = np.searchsorted(keep, kept) + 1
+    cross = np.zeros(len(keep) + 1, dtype=bool)
+    cross[group[subjects[members] != subjects[kept]]] = True
+
+    rows = []
+    for n, member in enumerate(members.tolist()):
+        rows.append({'group': int(group[n]), 'filename': filenames[member], 'subject': int(subjects[member]),
+                     'photo': int(photos[member]), 'keep': filenames[kept[n]],
+                     'distance': int(distance[n]), 'identical': bool(identical[n]),
+                     'cross_subject': bool(cross[group[n]]),
+                     'action': 'keep' if member == kept[n] else 'quarantine'})
+    return rows
+
+
+def write_report(path, rows):
+    with open(path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=REPORT_FIELDS)
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def write_quarantine(path, rows):
+    with open(path, 'w') as f:
+        f.writelines(row['filename'] + '\n' for row in rows if row['action'] == 'quarantine')
+
+
+def read_quarantine(path):
+    """Filenames listed by write_quarantine (empty lines and # comments skipped)."""
+    with open(path) as f:
+        return [line.strip() for line in f if line.strip() and not line.startswith('#')]
+
+
+def summary(rows):
+    groups = {row['group'] for row in rows}
+    cross = {row['group'] for row in rows if row['cross_subject']}
+    quarantined = sum(row['action'] == 'quarantine' for row in rows)
+    lines = ['%d duplicate groups, %d files to quarantine, %d groups span several subjects'
+             % (len(groups), quarantined, len(cross))]
+    for row in rows:
+        if row['action'] == 'keep':
+            lines.append('group %d%s: keep %s' % (row['group'], ' (cross-subject)' if row['cross_subject']
+                                                  else '', row['filename']))
+        else:
+            lines.append('    %s  distance %d%s' % (row['filename'], row['distance'],
+                                                    ', identical' if row['identical'] else ''))
+    return lines
+
+
+def dedup(folder=FOLDER, max_distance=MAX_DISTANCE, report=None, quarantine=None):
+    """Find the duplicate groups in folder (through the image cache); returns the report rows."""
+    import image_cache
+    images, filenames, subjects, photos = image_cache.load_images(folder)
+    rows = find_duplicates(images, filenames, subjects, photos, max_distance)
+    print('%d images in %s' % (len(filenames), folder))
+    print('\n'.join(summary(rows)))
+    if report:
+        write_report(report, rows)
+        print('report saved at:', report)
+    if quarantine:
+        write_quarantine(quarantine, rows)
+        print('quarantine list saved at:', quarantine)
+    return rows
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description='Find duplicate and near-duplicate face crops.')
+    parser.add_argument('folder', nargs='?', default=FOLDER)
+    parser.add_argument('--max-distance', type=int, default=MAX_DISTANCE,
+                        help='largest hash distance (bits of %d) counted as a duplicate' % HASH_SIZE ** 2)
+    parser.add_argument('--report', help='CSV with one row per file in a duplicate group')
+    parser.add_argument('--quarantine', help='text file listing the files to leave out of training')
+    return parser
+
+
+if __name__ == '__main__':
+    args = build_parser().parse_args()
+    dedup(args.folder, args.max_distance, args.report, args.quarantine)
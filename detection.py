@@ -0,0 +1,98 @@
+import hashlib
+from collections import OrderedDict
+import numpy as np
+
+import profiling
+
+
+class FaceDetector:
+    """Haar cascade wrapper that reuses what it found last time.
+
+    - ROI search: each face of the previous result is looked for only in a
+      window margin face sizes around it, with minSize / maxSize within
+      size_slack of its old size. A miss on any of them (and every full_every
+      calls, to pick up new faces) falls back to a full scan.
+    - Memo: full-scan results are kept per image content hash and detection
+      arguments, so re-processing the same still image costs one sha1
+      instead of a detection.
+
+    detectMultiScale() takes the same arguments as the cascade's, so a
+    FaceDetector can be passed wherever a cv2.CascadeClassifier is used
+    (extract_face, live.detect_faces).
+    """
+
+    def __init__(self, cascade, margin=0.5, size_slack=0.3, full_every=10, cache_size=256,
+                 track=True, memoize=True):
+        self.cascade = cascade
+        self.margin = margin
+        self.size_slack = size_slack
+        self.full_every = full_every
+        self.cache_size = cache_size
+        self.track = track
+        self.memoize = memoize
+        self.full_scans = 0
+        self.roi_scans = 0
+        self.memo_hits = 0
+        self._memo = OrderedDict()
+        self.reset()
+
+    def reset(self):
+        """Forget the last faces, e.g. when the video source changes."""
+        self.last = []
+        self._since_full = 0
+
+    def detectMultiScale(self, gray, scaleFactor=1.1, minNeighbors=3, **kwargs):
+        key = None
+        if self.memoize:
+            key = (hashlib.sha1(np.ascontiguousarray(gray).data).hexdigest(), gray.shape,
+                   scaleFactor, minNeighbors,
+                   tuple(sorted((name, tuple(value) if isinstance(value, list) else value)
+                                for name, value in kwargs.items())))
+            if key in self._memo:
+                self._memo.move_to_end(key)
+                self.memo_hits += 1
+                self.last = self._memo[key]
+                return list(self.last)
+
+        faces = None
+        if self.track and self.last and self._since_full < self.full_every:
+            faces = self._search_rois(gray, scaleFactor, minNeighbors)
+        if faces is None:
+            faces = self._full_scan(gray, scaleFactor, minNeighbors, **kwargs)
+        else:
+            # an ROI result depends on the previous frame, not only on this one
+            key = None
+
+        self.last = faces
+        if key is not None:
+            self._memo[key] = faces
+            if len(self._memo) > self.cache_size:
+                self._memo.popitem(last=False)
+        return list(faces)
+
+    def _full_scan(self, gray, scaleFactor, minNeighbors, **kwargs):
+        self.full_scans += 1
+        self._since_full = 0
+        with profiling.stage('detect_full'):
+            faces = self.cascade.detectMultiScale(gray, scaleFactor, minNeighbors, **kwargs)
+        return [tuple(int(v) for v in f) for f in faces]
+
+    def _search_rois(self, gray, scaleFactor, minNeighbors):
+        self._since_full += 1
+        height, width = gray.shape[:2]
+        faces = []
+        for x, y, w, h in self.last:
+            self.roi_scans += 1
+            dx, dy = int(w * self.margin), int(h * self.margin)
+            x0, y0 = max(0, x - dx), max(0, y - dy)
+            x1, y1 = min(width, x + w + dx), min(height, y + h + dy)
+            small = max(1, int(min(w, h) * (1 - self.size_slack)))
+            large = int(max(w, h) * (1 + self.size_slack))
+            with profiling.stage('detect_roi'):
+                found = self.cascade.detectMultiScale(gray[y0:y1, x0:x1], scaleFactor, minNeighbors,
+                                                      minSize=(small, small), maxSize=(large, large))
+            if len(found) == 0:
+                return None
+            fx, fy, fw, fh = max(found, key=lambda f: f[2] * f[3])
+            faces.append((x0 + int(fx), y0 + int(fy), int(fw), int(fh)))
+        return faces
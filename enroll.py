@@ -0,0 +1,179 @@
+import os
+import re
+import sys
+import glob
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import cv2
+
+import dataset
+import image_cache
+import profiling
+from detection import FaceDetector
+
+# -----------------------------
+# Settings
+# -----------------------------
+folder = 'subjects_photos'
+cascade_path = 'haarcascade_frontalface_default.xml'
+
+
+def extract_face(image, cascade, size=dataset.IMAGE_SIZE):
+    """size x size grey crop of the largest face in image, or None if there is none."""
+    if image.ndim == 2 or image.shape[2] == 1:
+        gray = image.reshape(image.shape[:2])
+    else:
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    with profiling.stage('detect'):
+        faces = cascade.detectMultiScale(gray, 1.3, 5)
+
+    if len(faces) == 0:
+        return None
+
+    x, y, w, h = max(faces, key=lambda f: f[2] * f[3])
+    roi_gray = gray[y:y+h, x:x+w]
+    with profiling.stage('resize'):
+        return cv2.resize(roi_gray, (size, size))
+
+
+# -----------------------------
+# Worker side
+# -----------------------------
+_cascade = None
+
+
+def _init_worker(path):
+    global _cascade
+    # unrelated photos: no ROI tracking, but repeated files are detected once
+    _cascade = FaceDetector(cv2.CascadeClassifier(path), track=False)
+
+
+def _extract(path):
+    image = cv2.imread(path, cv2.IMREAD_UNCHANGED)
+    if image is None:
+        return None
+    return extract_face(image, _cascade)
+
+
+# -----------------------------
+# Naming
+# -----------------------------
+def expand(sources):
+    """Image files named by sources (directories, files or glob patterns), sorted, no duplicates."""
+    files = []
+    for source in sources:
+        if os.path.isdir(source):
+            for root, dirs, names in os.walk(source):
+                dirs.sort()
+                files += [os.path.join(root, n) for n in sorted(names)
+                          if n.lower().endswith(dataset.IMAGE_EXTENSIONS)]
+        elif os.path.isfile(source):
+            files.append(source)
+        else:
+            files += sorted(p for p in glob.glob(source, recursive=True)
+                            if p.lower().endswith(dataset.IMAGE_EXTENSIONS))
+    return list(dict.fromkeys(os.path.normpath(f) for f in files))
+
+
+def assign_subjects(files, existing=(), subject=None):
+    """Subject id per file.
+
+    A given subject applies to every file. Otherwise files are grouped by their
+    directory: a directory named by a number ('12' or 'm12') is that subject,
+    any other directory becomes a new subject numbered after the largest one in
+    existing, in sorted directory order.
+    """
+    if subject is not None:
+        return [int(subject)] * len(files)
+    directories = sorted(set(os.path.dirname(f) for f in files))
+    numbered = {}
+    for d in directories:
+        match = re.fullmatch(r'[A-Za-z]?(\d+)', os.path.basename(d))
+        if match:
+            numbered[d] = int(match.group(1))
+    next_subject = max([int(s) for s in existing] + list(numbered.values()) + [0]) + 1
+    for d in directories:
+        if d not in numbered:
+            numbered[d] = next_subject
+            next_subject += 1
+    return [numbered[os.path.dirname(f)] for f in files]
+
+
+def target_names(subjects, folder=folder):
+    """'<subject>-<photo>.png' per file, continuing after the photos already in folder."""
+    last = {}
+    if os.path.isdir(folder):
+        for fname in dataset.list_images(folder):
+            s, photo = dataset.parse_name(fname)
+            last[s] = max(last.get(s, -1), photo)
+    names = []
+    for s in subjects:
+        last[s] = last.get(s, -1) + 1
+        names.append('%d-%d.png' % (s, last[s]))
+    return names
+
+
+# -----------------------------
+# Enrollment
+# -----------------------------
+def enroll(sources, folder=folder, subject=None, workers=None, cascade=cascade_path,
+           network=None, chunksize=16):
+    """Detect, crop and store the faces of sources in folder; returns [(source, saved path or None)].
+
+    Face extraction runs on workers processes (0 = in this process). The gallery
+    image cache is then updated for the new files only, and so are the stored
+    gallery embeddings when a network is given.
+    """
+    files = expand(sources)
+    if workers == 0:
+        _init_worker(cascade)
+        faces = [_extract(f) for f in files]
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(cascade,)) as executor:
+            faces = list(executor.map(_extract, files, chunksize=chunksize))
+
+    found = [(f, face) for f, face in zip(files, faces) if face is not None]
+    existing = ()
+    if os.path.isdir(folder):
+        existing = set(dataset.parse_name(f)[0] for f in dataset.list_images(folder))
+    subjects = assign_subjects([f for f, _ in found], existing, subject)
+    names = target_names(subjects, folder)
+
+    os.makedirs(folder, exist_ok=True)
+    saved = {}
+    for (source, face), name in zip(found, names):
+        path = os.path.join(folder, name)
+        cv2.imwrite(path, face)
+        saved[source] = path
+
+    if network is not None:
+        import inference
+        inference.update_embeddings(network, folder)
+    else:
+        image_cache.update(folder)
+    return [(f, saved.get(f)) for f in files]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Add the faces in raw photos to the gallery.')
+    parser.add_argument('sources', nargs='+', help='directories, image files or glob patterns')
+    parser.add_argument('--subject', type=int, help='subject id for all photos (default: per directory)')
+    parser.add_argument('--folder', default=folder, help='gallery folder (default: %(default)s)')
+    parser.add_argument('--workers', type=int, default=None, help='processes (default: all CPUs)')
+    parser.add_argument('--model-folder', default='model')
+    parser.add_argument('--model-name', default='50x50-4l')
+    args = parser.parse_args()
+
+    import inference
+    try:
+        network = inference.load_network(args.model_folder, args.model_name)
+    except OSError as er:
+        print(er, '\n⚠️ Model weights not found. Gallery embeddings are not updated.')
+        network = None
+
+    results = enroll(args.sources, args.folder, args.subject, args.workers, network=network)
+    for source, path in results:
+        print(source, '->', path or 'no face')
+    print('enrolled : ', sum(path is not None for _, path in results), ' / ', len(results))
+    sys.exit(0 if results else 1)
@@ -0,0 +1,186 @@
+"""facerec: command line entry point.
+
+    python facerec.py identify photo.png [-k 3]
+    python facerec.py verify photo.png 12
+    python facerec.py enroll raw_photos/ [--subject 12]
+    python facerec.py train [--trainer adam] [--epochs 20]
+    python facerec.py metadata
+    python facerec.py dedup [data] [--quarantine quarantine.txt]
+
+Only argparse is imported up front; every command imports what it needs when
+it runs, and nothing on the identify / verify path touches a GUI toolkit.
+"""
+import sys
+import argparse
+
+# -----------------------------
+# Settings
+# -----------------------------
+model_folder = 'model'
+model_name = '50x50-4l'
+gallery_folder = 'subjects_photos'
+cascade_path = 'haarcascade_frontalface_default.xml'
+
+
+def read_face(path, size=50):
+    """size x size face from an image file; anything larger goes through extract_face."""
+    import cv2
+    image = cv2.imread(path, cv2.IMREAD_GRAYSCALE)
+    if image is None:
+        raise SystemExit('cannot read %s' % path)
+    if image.shape == (size, size):
+        return image
+    from enroll import extract_face
+    face = extract_face(image, cv2.CascadeClassifier(cascade_path), size)
+    if face is None:
+        raise SystemExit('no face found in %s' % path)
+    return face
+
+
+def _matcher(args):
+    import inference
+    try:
+        network = inference.load_network(args.model_folder, args.model_name)
+    except OSError as er:
+        raise SystemExit('%s\nno model %r in %s, run: facerec train'
+                         % (er, args.model_name, args.model_folder))
+    return inference.FaceMatcher(network, gallery_folder=args.gallery, precision=args.precision,
+                                 index=args.index)
+
+
+def cmd_identify(args):
+    import numpy as np
+    faces = np.stack([read_face(path) for path in args.images])
+    matcher = _matcher(args)
+    for path, matches in zip(args.images, matcher.identify(faces, k=args.k)):
+        print(path, ' '.join('%s:%.4f' % match for match in matches))
+    return 0
+
+
+def cmd_verify(args):
+    face = read_face(args.image)
+    matcher = _matcher(args)
+    try:
+        score = matcher.verify(face, args.subject)
+    except KeyError as er:
+        raise SystemExit(er.args[0])
+    match = score >= args.threshold
+    print('%s subject %d (%s): %.4f %s' % (args.image, args.subject, matcher.name(args.subject), score,
+                                          'match' if match else 'no match'))
+    return 0 if match else 1
+
+
+def cmd_enroll(args):
+    import enroll
+    network = None
+    if not args.no_embeddings:
+        import inference
+        try:
+            network = inference.load_network(args.model_folder, args.model_name)
+        except OSError as er:
+            print(er, '\nmodel not found, gallery embeddings are not updated')
+    results = enroll.enroll(args.sources, args.gallery, args.subject, args.workers, network=network)
+    for source, path in results:
+        print(source, '->', path or 'no face')
+    return 0 if any(path for _, path in results) else 1
+
+
+def cmd_train(args):
+    import training
+    for name in ('trainer', 'epochs', 'batch_size', 'learning_rate', 'stream_pairs', 'folder',
+                 'model_folder'):
+        value = getattr(args, name)
+        if value is not None:
+            setattr(training, name, value)
+    if args.pairs is not None:
+        training.a_data = args.pairs
+    training.model_name = training.model_name_load = args.model_name
+    training.main()
+    return 0
+
+
+def cmd_metadata(args):
+    import generate_image_metadata
+    generate_image_metadata.generate_metadata(args.folder)
+    return 0
+
+
+def cmd_dedup(args):
+    import dedup
+    max_distance = dedup.MAX_DISTANCE if args.max_distance is None else args.max_distance
+    rows = dedup.dedup(args.folder, max_distance, args.report, args.quarantine)
+    return 1 if any(row['action'] == 'quarantine' for row in rows) else 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='facerec', description='Face recognition tools.')
+    parser.add_argument('--model-folder', default=model_folder)
+    parser.add_argument('--model-name', default=model_name)
+    parser.add_argument('--profile', metavar='JSON', help='write per-stage timings of the command to JSON')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    def matching(command):
+        command.add_argument('--gallery', default=gallery_folder, help='subject photos folder')
+        command.add_argument('--precision', default='float32', choices=('float64', 'float32', 'int8'))
+        command.add_argument('--index', action='store_true', help='IVF prefilter for large galleries')
+
+    command = commands.add_parser('identify', help='best matching subjects for face photos')
+    command.add_argument('images', nargs='+')
+    command.add_argument('-k', type=int, default=1)
+    matching(command)
+    command.set_defaults(run=cmd_identify)
+
+    command = commands.add_parser('verify', help='is this photo the given subject (exit code 1 if not)')
+    command.add_argument('image')
+    command.add_argument('subject', type=int)
+    command.add_argument('--threshold', type=float, default=0.5)
+    matching(command)
+    command.set_defaults(run=cmd_verify)
+
+    command = commands.add_parser('enroll', help='add the faces in raw photos to the gallery')
+    command.add_argument('sources', nargs='+', help='directories, image files or glob patterns')
+    command.add_argument('--subject', type=int)
+    command.add_argument('--gallery', default=gallery_folder)
+    command.add_argument('--workers', type=int)
+    command.add_argument('--no-embeddings', action='store_true', help='only update the image cache')
+    command.set_defaults(run=cmd_enroll)
+
+    command = commands.add_parser('train', help='train the pair classifier (training.py settings)')
+    command.add_argument('--trainer', choices=('adam', 'sgd', 'random', 'population'))
+    command.add_argument('--epochs', type=int)
+    command.add_argument('--batch-size', type=int)
+    command.add_argument('--learning-rate', type=float)
+    command.add_argument('--pairs', type=int, help='number of training pairs')
+    command.add_argument('--stream-pairs', type=int)
+    command.add_argument('--folder', help='training photos folder')
+    command.set_defaults(run=cmd_train)
+
+    command = commands.add_parser('metadata', help='update image_metadata.csv for a photo folder')
+    command.add_argument('folder', nargs='?')
+    command.set_defaults(run=cmd_metadata)
+
+    command = commands.add_parser('dedup', help='duplicate and near-duplicate photos (exit code 1 if any)')
+    command.add_argument('folder', nargs='?', default='data')
+    command.add_argument('--max-distance', type=int,
+                         help='hash bits (of 256) that may differ (default dedup.MAX_DISTANCE)')
+    command.add_argument('--report', help='CSV with one row per file in a duplicate group')
+    command.add_argument('--quarantine', help='write the files to leave out of training here')
+    command.set_defaults(run=cmd_dedup)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if not args.profile:
+        return args.run(args)
+    import profiling
+    profiling.enable()
+    try:
+        return args.run(args)
+    finally:
+        with open(args.profile, 'w') as f:
+            f.write(profiling.profiler.to_json(indent=2))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
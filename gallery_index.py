@@ -0,0 +1,75 @@
+import numpy as np
+
+
+def normalize(vectors):
+    """float32 rows scaled to unit length (zero rows stay zero)."""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+    return vectors / norms
+
+
+class IVFIndex:
+    """Inverted-file nearest-neighbour index over gallery feature vectors.
+
+    Vectors are L2-normalized and clustered with spherical k-means into
+    n_lists partitions. search() ranks the centroids against each query, scans
+    only the n_probe closest partitions and returns the best k rows by cosine
+    similarity, so a query touches about N * n_probe / n_lists vectors instead
+    of all N. Rows are stored grouped by partition (order / offsets), the same
+    CSR layout add() rebuilds when faces are enrolled.
+    """
+
+    def __init__(self, vectors, n_lists=None, n_probe=8, iterations=10, sample=20000, seed=0):
+        vectors = normalize(vectors)
+        self.n_probe = n_probe
+        n_lists = n_lists or max(1, int(np.sqrt(len(vectors))))
+        self.centroids = self._train(vectors, min(n_lists, max(1, len(vectors))), iterations,
+                                     sample, np.random.default_rng(seed))
+        self.vectors = np.zeros((0, vectors.shape[1]), dtype=np.float32)
+        self.lists = np.zeros(0, dtype=np.int64)
+        self.add(vectors)
+
+    @staticmethod
+    def _train(vectors, n_lists, iterations, sample, rng):
+        # spherical k-means on a sample; every vector is assigned afterwards
+        if len(vectors) > sample:
+            vectors = vectors[rng.choice(len(vectors), sample, replace=False)]
+        centroids = vectors[rng.choice(len(vectors), n_lists, replace=False)].copy()
+        for _ in range(iterations):
+            assign = np.argmax(vectors @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assign, vectors)
+            empty = np.bincount(assign, minlength=n_lists) == 0
+            sums[empty] = vectors[rng.choice(len(vectors), int(empty.sum()))]
+            centroids = normalize(sums)
+        return centroids
+
+    def __len__(self):
+        return len(self.vectors)
+
+    def add(self, vectors):
+        """Append vectors (row ids continue after the existing ones) to their nearest partitions."""
+        vectors = normalize(vectors)
+        lists = np.argmax(vectors @ self.centroids.T, axis=1) if len(vectors) else np.zeros(0, np.int64)
+        self.vectors = np.concatenate([self.vectors, vectors])
+        self.lists = np.concatenate([self.lists, lists])
+        self.order = np.argsort(self.lists, kind='stable')
+        self.offsets = np.concatenate([[0], np.cumsum(np.bincount(self.lists, minlength=len(self.centroids)))])
+
+    def search(self, queries, k, n_probe=None):
+        """(ids, similarities) of the k nearest rows per query, best first; short rows padded with -1 / -inf."""
+        queries = normalize(np.atleast_2d(queries))
+        n_probe = min(n_probe or self.n_probe, len(self.centroids))
+        probes = np.argsort(-(queries @ self.centroids.T), axis=1)[:, :n_probe]
+        ids = np.full((len(queries), k), -1, dtype=np.int64)
+        similarities = np.full((len(queries), k), -np.inf, dtype=np.float32)
+        for q, (query, lists) in enumerate(zip(queries, probes)):
+            candidates = np.concatenate([self.order[self.offsets[l]:self.offsets[l + 1]] for l in lists])
+            sims = self.vectors[candidates] @ query
+            top = min(k, len(candidates))
+            best = np.argpartition(-sims, top - 1)[:top] if top < len(candidates) else np.arange(top)
+            best = best[np.argsort(-sims[best], kind='stable')]
+            ids[q, :top] = candidates[best]
+            similarities[q, :top] = sims[best]
+        return ids, similarities
@@ -1,45 +1,244 @@
 import os
-import cv2
-import pandas as pd
+import csv
+import struct
+import hashlib
+import itertools
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
 
 IMAGE_DIR = "subjects_photos"
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg")
+FIELDS = ["filename", "width", "height", "size_kb", "format", "channels", "hash"]
+# headers of new or changed files are read on this many threads
+WORKERS = 16
+MANIFEST_SUFFIX = ".manifest.npz"
+MANIFEST_FIELDS = [("mtime", "i8"), ("size", "i8"), ("width", "i4"), ("height", "i4"), ("channels", "i1"),
+                   ("hash", "U32"), ("valid", "?")]
 
-def generate_metadata():
-    records = []
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+# JPEG start-of-frame markers (C4 / C8 / CC are DHT / JPG / DAC)
+JPEG_SOF = set(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
 
-    for root, dirs, files in os.walk(IMAGE_DIR):
-        for file in files:
-            if file.lower().endswith((".jpg", ".jpeg", ".png")):
-                path = os.path.join(root, file)
 
-                try:
-                    img = cv2.imread(path)
-                    if img is None:
-                        continue
+# channels per PNG colour type (palette images decode to BGR)
+PNG_CHANNELS = {0: 1, 2: 3, 3: 3, 4: 2, 6: 4}
 
-                    height, width, _ = img.shape
-                    size_kb = round(os.path.getsize(path) / 1024, 2)
-                    ext = os.path.splitext(file)[1].replace(".", "").upper()
 
-                    records.append({
-                        "filename": file,
-                        "width": width,
-                        "height": height,
-                        "size_kb": size_kb,
-                        "format": ext
-                    })
+def _png_info(data):
+    # signature, IHDR length + type, width / height as big-endian uint32, bit depth, colour type
+    if len(data) < 26 or data[12:16] != b"IHDR":
+        return None
+    width, height, _, colour = struct.unpack_from(">IIBB", data, 16)
+    return width, height, PNG_CHANNELS.get(colour, 0)
 
-                except Exception as e:
-                    print(f"❌ Failed processing {path}: {e}")
 
-    df = pd.DataFrame(records)
+def _jpeg_info(data):
+    # walk the marker segments up to the first start-of-frame
+    i, n = 2, len(data)
+    while i < n:
+        if data[i] != 0xFF:
+            i += 1
+            continue
+        while i < n and data[i] == 0xFF:
+            i += 1
+        if i >= n:
+            return None
+        marker = data[i]
+        i += 1
+        if marker == 0x01 or 0xD0 <= marker <= 0xD8:
+            continue
+        if marker in (0xD9, 0xDA) or i + 2 > n:
+            return None
+        if marker in JPEG_SOF:
+            if i + 8 > n:
+                return None
+            _, height, width, channels = struct.unpack_from(">BHHB", data, i + 2)
+            return width, height, channels
+        i += (data[i] << 8) | data[i + 1]
+    return None
 
+
+def image_info(path):
+    """(width, height, channels, content hash) of an image file, or None if unreadable.
+
+    Sizes come from the PNG / JPEG header without decoding pixels; other
+    formats, or headers this parser does not understand, fall back to a full
+    cv2 decode. The hash is a blake2b digest of the file bytes.
+    """
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+    except OSError:
+        return None
+    info = None
+    if data.startswith(PNG_SIGNATURE):
+        info = _png_info(data)
+    elif data.startswith(b"\xff\xd8"):
+        info = _jpeg_info(data)
+    if info is None or not all(info):
+        import cv2
+        image = cv2.imread(path, cv2.IMREAD_UNCHANGED)
+        if image is None:
+            return None
+        info = image.shape[1], image.shape[0], 1 if image.ndim == 2 else image.shape[2]
+    return info + (hashlib.blake2b(data, digest_size=16).hexdigest(),)
+
+
+def list_files(image_dir):
+    """Manifest rows (path relative to image_dir, mtime, size) of every image file, sorted by path.
+
+    One scandir pass; the other fields are left for refresh_manifest() to fill in.
+    """
+    paths, mtimes, sizes = [], [], []
+
+    def walk(folder, prefix):
+        try:
+            with os.scandir(folder) as it:
+                entries = list(it)
+        except OSError:
+            return
+        for entry in entries:
+            name = entry.name
+            if name.lower().endswith(IMAGE_EXTENSIONS) and entry.is_file():
+                st = entry.stat()
+                paths.append(prefix + name)
+                mtimes.append(st.st_mtime_ns)
+                sizes.append(st.st_size)
+            elif entry.is_dir(follow_symlinks=False):
+                walk(entry.path, prefix + name + "/")
+
+    walk(image_dir, "")
+    paths = np.array(paths) if paths else np.zeros(0, dtype="U1")
+    manifest = np.zeros(len(paths), dtype=[("path", paths.dtype)] + MANIFEST_FIELDS)
+    order = np.argsort(paths, kind="stable")
+    manifest["path"] = paths[order]
+    manifest["mtime"] = np.array(mtimes, dtype=np.int64)[order]
+    manifest["size"] = np.array(sizes, dtype=np.int64)[order]
+    return manifest
+
+
+def _infos(paths):
+    return [image_info(path) for path in paths]
+
+
+def scan(paths, workers=WORKERS, chunk=256):
+    """(path, image_info(path)) for every path, in order.
+
+    Paths are handed to the threads chunk at a time, with at most 2 * workers
+    chunks in flight, so memory does not grow with the number of paths.
+    """
+    paths = iter(paths)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        while True:
+            batch = list(itertools.islice(paths, chunk))
+            if batch:
+                pending.append((batch, executor.submit(_infos, batch)))
+            if pending and (not batch or len(pending) >= 2 * workers):
+                batch, future = pending.popleft()
+                yield from zip(batch, future.result())
+            elif not batch:
+                return
+
+
+# -----------------------------
+# Manifest
+# -----------------------------
+def load_manifest(manifest_path, image_dir):
+    """The saved manifest of image_dir, or None if there is none (or it is for another folder)."""
+    try:
+        with np.load(manifest_path, allow_pickle=False) as saved:
+            files = saved["files"]
+            # another folder, or written before a field was added
+            if str(saved["root"]) != os.path.abspath(image_dir) or \
+                    files.dtype.names[1:] != tuple(name for name, _ in MANIFEST_FIELDS):
+                return None
+            return files
+    except (OSError, KeyError, ValueError):
+        return None
+
+
+def save_manifest(manifest_path, manifest, image_dir):
+    with open(manifest_path + ".tmp", "wb") as f:
+        np.savez(f, files=manifest, root=np.array(os.path.abspath(image_dir)))
+    os.replace(manifest_path + ".tmp", manifest_path)
+
+
+def refresh_manifest(image_dir, manifest_path, workers=WORKERS):
+    """(manifest, changes) with headers read only for files that are new or whose (mtime, size) changed.
+
+    changes counts 'added', 'changed' and 'removed' files since the saved
+    manifest; all zero means the folder is exactly as it was.
+    """
+    current = list_files(image_dir)
+    old = load_manifest(manifest_path, image_dir)
+    changes = {"added": 0, "changed": 0, "removed": 0}
+    if old is not None and len(old) == len(current) and all(
+            np.array_equal(old[field], current[field]) for field in ("path", "mtime", "size")):
+        return old, changes
+
+    same = np.zeros(len(current), dtype=bool)
+    known = same.copy()
+    if old is not None:
+        previous = {path: n for n, path in enumerate(old["path"].tolist())}
+        # row of each current file in old under the same path (-1: new file)
+        found = np.array([previous.pop(path, -1) for path in current["path"].tolist()], dtype=np.int64)
+        changes["removed"] = len(previous)
+        known = found >= 0
+        same[known] = ((old["mtime"][found[known]] == current["mtime"][known])
+                       & (old["size"][found[known]] == current["size"][known]))
+        for field in ("width", "height", "channels", "hash", "valid"):
+            current[field][same] = old[field][found[same]]
+    todo = np.flatnonzero(~same)
+    changes["added"] = int(np.sum(~known))
+    changes["changed"] = len(todo) - changes["added"]
+
+    paths = [os.path.join(image_dir, current["path"][n]) for n in todo]
+    for n, (path, info) in zip(todo, scan(paths, workers)):
+        if info is None:
+            print(f"❌ Failed processing {path}")
+            continue
+        current[n]["width"], current[n]["height"], current[n]["channels"], current[n]["hash"] = info
+        current[n]["valid"] = True
+    return current, changes
+
+
+def rows(manifest):
+    """CSV rows of the readable images in manifest."""
+    valid = manifest[manifest["valid"]]
+    for path, width, height, size, channels, digest in zip(
+            valid["path"].tolist(), valid["width"].tolist(), valid["height"].tolist(), valid["size"].tolist(),
+            valid["channels"].tolist(), valid["hash"].tolist()):
+        file = path.rsplit("/", 1)[-1]
+        yield (file, width, height, round(size / 1024, 2), os.path.splitext(file)[1].replace(".", "").upper(),
+               channels, digest)
+
+
+def generate_metadata(image_dir=None, csv_path=None, workers=WORKERS, manifest_path=None):
+    image_dir = image_dir or IMAGE_DIR
     # ✅ Force CSV to be saved in project root
     BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-    CSV_PATH = os.path.join(BASE_DIR, "image_metadata.csv")
+    CSV_PATH = csv_path or os.path.join(BASE_DIR, "image_metadata.csv")
+    # (path, mtime, size, width, height) of every file the CSV was built from
+    manifest_path = manifest_path or CSV_PATH + MANIFEST_SUFFIX
+
+    manifest, changes = refresh_manifest(image_dir, manifest_path, workers)
+    count = int(manifest["valid"].sum())
+    if not any(changes.values()) and os.path.exists(CSV_PATH) and os.path.exists(manifest_path):
+        print(f" image_metadata.csv up to date: {CSV_PATH} ({count} images)")
+        return count
 
-    df.to_csv(CSV_PATH, index=False)
-    print(f" image_metadata.csv saved at: {CSV_PATH}")
+    # the old CSV is only replaced once the new one is complete, the manifest after it
+    with open(CSV_PATH + ".tmp", "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(FIELDS)
+        writer.writerows(rows(manifest))
+    os.replace(CSV_PATH + ".tmp", CSV_PATH)
+    save_manifest(manifest_path, manifest, image_dir)
+    print(f" image_metadata.csv saved at: {CSV_PATH} ({count} images; {changes['added']} added, "
+          f"{changes['changed']} changed, {changes['removed']} removed)")
+    return count
 
 
 if __name__ == "__main__":
@@ -0,0 +1,147 @@
+import os
+import hashlib
+import numpy as np
+import cv2
+
+import dataset
+import profiling
+
+# -----------------------------
+# Settings
+# -----------------------------
+CACHE_FOLDER = 'cache'
+# fewer changed files than this are decoded in-process, worker start-up would cost more
+PARALLEL_MIN = 256
+
+
+def cache_paths(folder, cache_folder=None):
+    """(images .npy, index .npy) paths of the cache for folder."""
+    cache_folder = cache_folder or CACHE_FOLDER
+    folder = os.path.abspath(folder)
+    key = hashlib.sha1(folder.encode('utf-8')).hexdigest()[:8]
+    base = os.path.join(cache_folder, os.path.basename(folder) + '-' + key)
+    return base + '.npy', base + '.index.npy'
+
+
+def index_dtype(name_len):
+    return np.dtype([
+        ('filename', 'U%d' % max(name_len, 1)),
+        ('subject', 'i8'),
+        ('photo', 'i8'),
+        ('mtime', 'i8'),
+        ('size', 'i8'),
+        ('height', 'i4'),
+        ('width', 'i4'),
+        ('valid', '?'),
+    ])
+
+
+def scan(folder):
+    """Index of the images currently in folder; height/width/valid are filled on decode."""
+    filenames = dataset.list_images(folder)
+    index = np.zeros(len(filenames), dtype=index_dtype(max(map(len, filenames), default=1)))
+    for n, fname in enumerate(filenames):
+        st = os.stat(os.path.join(folder, fname))
+        index[n]['filename'] = fname
+        index[n]['subject'], index[n]['photo'] = dataset.parse_name(fname)
+        index[n]['mtime'] = st.st_mtime_ns
+        index[n]['size'] = st.st_size
+    return index
+
+
+def _save_atomic(path, array):
+    tmp = path + '.tmp'
+    with open(tmp, 'wb') as f:
+        np.save(f, array, allow_pickle=False)
+    os.replace(tmp, path)
+
+
+def _load_cache(folder, cache_folder, size):
+    images_path, index_path = cache_paths(folder, cache_folder)
+    try:
+        index = np.load(index_path, allow_pickle=False)
+        images = np.load(images_path, mmap_mode='r', allow_pickle=False)
+    except (OSError, ValueError):
+        return None, None
+    if images.shape[1:] != (size, size) or len(images) != len(index):
+        return None, None
+    return images, index
+
+
+def update(folder, cache_folder=None, size=dataset.IMAGE_SIZE, workers=0):
+    """Bring the cache of folder up to date, decoding only new or changed files.
+
+    Returns (images, index) where images is the memory-mapped uint8 (N, size, size)
+    tensor and index the matching structured array. workers > 0 decodes the
+    changed files in that many processes.
+    """
+    current = scan(folder)
+    images, index = _load_cache(folder, cache_folder, size)
+
+    if index is not None and len(index) == len(current):
+        same = (np.array_equal(index['filename'], current['filename'])
+                and np.array_equal(index['mtime'], current['mtime'])
+                and np.array_equal(index['size'], current['size']))
+        if same:
+            return images, index
+
+    # reuse rows whose (filename, mtime, size) did not change
+    previous = {}
+    if index is not None:
+        for n, row in enumerate(index):
+            previous[str(row['filename'])] = (row['mtime'], row['size'], n)
+
+    packed = np.zeros((len(current), size, size), dtype=np.uint8)
+    todo = []
+    for n, row in enumerate(current):
+        old = previous.get(str(row['filename']))
+        if old is not None and old[0] == row['mtime'] and old[1] == row['size']:
+            packed[n] = images[old[2]]
+            for field in ('height', 'width', 'valid'):
+                row[field] = index[old[2]][field]
+        else:
+            todo.append(n)
+    del images
+
+    paths = [os.path.join(folder, str(current[n]['filename'])) for n in todo]
+    if workers and len(todo) >= PARALLEL_MIN:
+        # spread the decoding over worker processes (see loader.py)
+        import loader
+        decoded, dims = loader.decode_files(paths, workers, size)
+    else:
+        decoded, dims = np.zeros((len(todo), size, size), dtype=np.uint8), []
+        for k, path in enumerate(paths):
+            with profiling.stage('imread'):
+                image = cv2.imread(path)
+            dims.append((0, 0) if image is None else image.shape[:2])
+            if image is not None:
+                decoded[k] = dataset.to_face(image, size)
+    for k, n in enumerate(todo):
+        if dims[k] == (0, 0):
+            print('⚠️ Could not read:', current[n]['filename'])
+            continue
+        current[n]['height'], current[n]['width'] = dims[k]
+        current[n]['valid'] = True
+        packed[n] = decoded[k]
+
+    images_path, index_path = cache_paths(folder, cache_folder)
+    os.makedirs(os.path.dirname(images_path) or '.', exist_ok=True)
+    _save_atomic(images_path, packed)
+    _save_atomic(index_path, current)
+    return np.load(images_path, mmap_mode='r', allow_pickle=False), current
+
+
+def load_images(folder, cache_folder=None, size=dataset.IMAGE_SIZE, workers=0):
+    """Cached drop-in for dataset.load_images: (images, filenames, subjects, photos)."""
+    images, index = update(folder, cache_folder, size, workers)
+    if not index['valid'].all():
+        images = images[index['valid']]
+        index = index[index['valid']]
+    return images, index['filename'].tolist(), index['subject'], index['photo']
+
+
+if __name__ == '__main__':
+    import sys
+    for folder in sys.argv[1:] or ['data', 'subjects_photos']:
+        images, index = update(folder)
+        print(folder, ':', images.shape, '->', cache_paths(folder)[0])
@@ -0,0 +1,342 @@
+import os
+import hashlib
+import numpy as np
+
+import dataset
+import image_cache
+import model_io
+import profiling
+import quantize
+import result_cache
+from gallery_index import IVFIndex
+from network import Layer, Network
+
+
+def to_vectors(faces):
+    """(n, pixels) float32 rows scaled to 0..1 from uint8 faces of shape (n, 50, 50) or (50, 50)."""
+    faces = np.asarray(faces)
+    faces = faces.reshape(-1, faces.shape[-2] * faces.shape[-1])
+    return np.multiply(faces, np.float32(1 / 255), dtype=np.float32)
+
+
+def first_layer_dot(layer, inputs, start, stop):
+    """inputs @ layer.weights[start:stop]; quantized layers do it without dequantizing."""
+    with profiling.stage('layer_forward_%dx%d', (stop - start, layer.biases.shape[-1])):
+        if hasattr(layer, 'dot'):
+            return layer.dot(inputs, start, stop)
+        return np.dot(inputs, layer.weights[start:stop])
+
+
+class GalleryEngine:
+    """Pair classifier with the gallery half of the first layer precomputed.
+
+    The network sees [subject photo, query] concatenated, so the first layer
+    splits into subject @ W1[:2500] + query @ W1[2500:]. The subject part is
+    computed once per gallery image; each query only needs its own 2500-row
+    product, broadcast-added to every gallery row.
+    """
+
+    def __init__(self, network, gallery, gallery_part=None):
+        self.network = network
+        self.set_gallery(gallery, gallery_part)
+
+    def set_gallery(self, gallery, gallery_part=None):
+        """gallery_part may come precomputed, e.g. from update_embeddings()."""
+        self.split = int(np.prod(np.shape(gallery)[1:]))
+        if gallery_part is None:
+            gallery_part = gallery_embeddings(self.network, gallery)
+        self.gallery_part = gallery_part
+
+    def query_part(self, queries):
+        layer1 = self.network.layers[0]
+        return first_layer_dot(layer1, to_vectors(queries), self.split, 2 * self.split)
+
+    def query_features(self, queries):
+        """Queries through the gallery half of the first layer, comparable to gallery_part rows."""
+        layer1 = self.network.layers[0]
+        return first_layer_dot(layer1, to_vectors(queries), 0, self.split) + layer1.biases
+
+    def scores(self, queries):
+        """Softmax outputs of shape (queries, gallery, 2); a single (50, 50) query gives (gallery, 2)."""
+        single = np.ndim(queries) == 2
+        query_part = self.query_part(queries)
+        hidden = self.gallery_part[None, :, :] + query_part[:, None, :]
+        out = self._head(hidden)
+        return out[0] if single else out
+
+    def pair_scores(self, queries, ids):
+        """Softmax outputs (queries, k, 2) for query q against gallery rows ids[q] only."""
+        query_part = self.query_part(queries)
+        hidden = self.gallery_part[ids] + query_part[:, None, :]
+        return self._head(hidden)
+
+    def _head(self, hidden):
+        # ReLU of the summed first layer, then the remaining layers on every pair
+        n_queries, n_gallery = hidden.shape[:2]
+        out = hidden.reshape(n_queries * n_gallery, -1)
+        network = self.network
+        network.activations[0].forward(out)
+        out = network.activations[0].output
+        for layer, act in zip(network.layers[1:], network.activations[1:]):
+            layer.forward(out)
+            act.forward(layer.output)
+            out = act.output
+        return out.reshape(n_queries, n_gallery, -1)
+
+
+def gallery_embeddings(network, gallery, chunk=4096):
+    """Gallery half of the first layer (plus its bias) for uint8 faces or to_vectors() rows."""
+    layer1 = network.layers[0]
+    gallery = np.asarray(gallery)
+    rows = gallery.reshape(len(gallery), int(np.prod(gallery.shape[1:])))
+    parts = []
+    # chunk by chunk, so a large gallery is never held as float32 vectors in full
+    for first in range(0, max(1, len(rows)), chunk):
+        inputs = rows[first:first + chunk]
+        if inputs.dtype == np.uint8:
+            inputs = np.multiply(inputs, np.float32(1 / 255), dtype=np.float32)
+        parts.append(first_layer_dot(layer1, inputs, 0, rows.shape[1]))
+    return np.concatenate(parts) + layer1.biases
+
+
+# -----------------------------
+# Persistent gallery embeddings
+# -----------------------------
+def embeddings_path(folder, cache_folder=None):
+    return image_cache.cache_paths(folder, cache_folder)[0][:-len('.npy')] + '.embed.npz'
+
+
+def model_key(network, split=dataset.PIXELS):
+    """Fingerprint of the weights the gallery half of the first layer depends on."""
+    layer1 = network.layers[0]
+    if hasattr(layer1, 'q'):
+        arrays = (layer1.q[:split], layer1.scale, layer1.biases)
+    else:
+        arrays = (layer1.weights[:split], layer1.biases)
+    return _digest(arrays)
+
+
+def parameters_key(network):
+    """Fingerprint of every parameter of the network, for caching its outputs."""
+    arrays = []
+    for layer in network.layers:
+        arrays.extend((layer.q, layer.scale) if hasattr(layer, 'q') else (layer.weights,))
+        arrays.append(layer.biases)
+    return _digest(arrays)
+
+
+def _digest(arrays):
+    digest = hashlib.sha1()
+    for array in arrays:
+        array = np.ascontiguousarray(array)
+        digest.update(array.dtype.str.encode() + str(array.shape).encode())
+        digest.update(array.data)
+    return digest.hexdigest()
+
+
+def update_embeddings(network, folder, cache_folder=None, workers=0):
+    """Bring the gallery image cache and its stored embeddings up to date.
+
+    Only photos that are new or changed since the last call (or all of them if
+    the model changed) go through the first layer. Returns (images, index,
+    gallery_part) for the readable photos of folder.
+    """
+    images, index = image_cache.update(folder, cache_folder, workers=workers)
+    if not index['valid'].all():
+        images, index = images[index['valid']], index[index['valid']]
+    key = model_key(network, images.shape[1] * images.shape[2])
+    path = embeddings_path(folder, cache_folder)
+
+    previous = {}
+    try:
+        with np.load(path, allow_pickle=False) as stored:
+            if str(stored['key']) == key:
+                old_part = stored['part']
+                for n, row in enumerate(stored['index']):
+                    previous[str(row['filename'])] = (row['mtime'], row['size'], n)
+    except (OSError, ValueError, KeyError):
+        pass
+
+    todo = []
+    reused = []
+    for n, row in enumerate(index):
+        old = previous.get(str(row['filename']))
+        if old is not None and old[0] == row['mtime'] and old[1] == row['size']:
+            reused.append((n, old[2]))
+        else:
+            todo.append(n)
+    new = gallery_embeddings(network, images[todo])
+    part = np.empty((len(index), new.shape[1]), dtype=new.dtype)
+    part[todo] = new
+    if reused:
+        rows, old_rows = np.array(reused).T
+        part[rows] = old_part[old_rows]
+
+    if todo or len(previous) != len(index):
+        tmp = path + '.tmp.npz'
+        np.savez(tmp, part=part, index=index, key=np.array(key))
+        os.replace(tmp, path)
+    return images, index, part
+
+
+def load_network(model_folder='model', model_name='50x50-4l', mmap=True):
+    """Network from the single-file model, or the old eight best_layerN .npy files."""
+    layers = []
+    for weights, biases in model_io.load(model_folder, model_name, mmap=mmap)[0]:
+        layer = Layer.__new__(Layer)
+        layer.weights, layer.biases = weights, biases
+        layers.append(layer)
+    return Network(layers)
+
+
+def _pad_rows(rows):
+    """(len(rows), longest) int64 gallery ids, each row padded with its own first id."""
+    ids = np.empty((len(rows), max(len(r) for r in rows)), dtype=np.int64)
+    for n, r in enumerate(rows):
+        ids[n, :len(r)] = r
+        ids[n, len(r):] = r[0]
+    return ids
+
+
+class FaceMatcher:
+    """One-vs-many face matching against the subject photos.
+
+    The model is loaded once; score() and identify() take uint8 faces of shape
+    (50, 50) or (n, 50, 50) and run every query x gallery pair in one batched
+    forward pass.
+    """
+
+    def __init__(self, network=None, gallery=None, subjects=None, names=None,
+                 model_folder='model', model_name='50x50-4l', gallery_folder='subjects_photos',
+                 precision='float64', index=False, candidates=64, n_probe=8, cache=None):
+        network = network if network is not None else load_network(model_folder, model_name)
+        # 'float32' halves memory and matmul cost, 'int8' also quantizes layer1 (see quantize.py)
+        self.network = quantize.convert(network, precision)
+        # cached verify() results depend on every layer, not just the gallery half model_key covers
+        self.model_version = parameters_key(self.network)
+        gallery_part = None
+        if gallery is None:
+            # gallery faces and their first-layer half come from the incremental caches
+            gallery, cached, gallery_part = update_embeddings(self.network, gallery_folder)
+            subjects = cached['subject']
+        self.names = dict(names or {})
+        # IVF prefilter: only the nearest candidates per query go through the full pair classifier
+        self.use_index = index
+        self.candidates = candidates
+        self.n_probe = n_probe
+        # optional result_cache.ResultCache for verify()
+        self.cache = cache
+        self.engine = None
+        self.set_gallery(gallery, subjects, gallery_part)
+
+    def set_gallery(self, gallery, subjects=None, gallery_part=None):
+        """Swap in a new gallery (e.g. after enrollment); cached verify() results are invalidated."""
+        self.subjects = np.arange(len(gallery)) if subjects is None else np.asarray(subjects)
+        if self.engine is None:
+            self.engine = GalleryEngine(self.network, gallery, gallery_part)
+        else:
+            self.engine.set_gallery(gallery, gallery_part)
+        self.index = None
+        if self.use_index and len(self.subjects) > self.candidates:
+            self.index = IVFIndex(self.engine.gallery_part, n_probe=self.n_probe)
+
+        digest = hashlib.sha1(self.model_version.encode())
+        digest.update(np.ascontiguousarray(self.engine.gallery_part).data)
+        digest.update(np.ascontiguousarray(self.subjects, dtype=np.int64).data)
+        self.version = digest.hexdigest()
+        if self.cache is not None:
+            self.cache.validate(self.version)
+
+    def name(self, subject):
+        return self.names.get(int(subject), str(subject))
+
+    def score(self, queries, gallery=None):
+        """Match probability (class 1 = same person) for every query x gallery photo.
+
+        Returns shape (queries, gallery), or (gallery,) for a single (50, 50) query.
+        Passing gallery scores against those photos instead of the loaded subjects.
+        """
+        engine = self.engine if gallery is None else GalleryEngine(self.network, gallery)
+        return engine.scores(queries)[..., 1]
+
+    def subject_scores(self, queries):
+        """(unique subjects, (queries, subjects) best match probability over each subject's photos)."""
+        scores = np.atleast_2d(self.score(queries))
+        order = np.argsort(self.subjects, kind='stable')
+        unique, starts = np.unique(self.subjects[order], return_index=True)
+        return unique, np.maximum.reduceat(scores[:, order], starts, axis=1)
+
+    @profiling.timed('verify')
+    def verify(self, queries, subject):
+        """Best match probability of each query against the photos of subject.
+
+        Returns a float for a single (50, 50) query, else one per query. With a
+        cache, the probability per (query crop hash, gallery photo) is kept and
+        only uncached photos go through the network.
+        """
+        single = np.ndim(queries) == 2
+        queries = np.asarray(queries).reshape((-1,) + np.shape(queries)[-2:])
+        best = self.verify_many(queries, [subject] * len(queries))
+        return float(best[0]) if single else best
+
+    def verify_many(self, queries, subjects):
+        """Best match probability of queries[n] against the photos of subjects[n], in one batched pass.
+
+        Each query is scored against its own subject's gallery rows, padded to
+        the largest subject by repeating the subject's first row (which leaves
+        the maximum unchanged). With a cache, only (query crop hash, gallery
+        photo) pairs not already stored are scored, then stored.
+        """
+        queries = np.asarray(queries).reshape((-1,) + np.shape(queries)[-2:])
+        rows = []
+        for subject in subjects:
+            subject_rows = np.flatnonzero(self.subjects == subject)
+            if not len(subject_rows):
+                raise KeyError('unknown subject %r' % (subject,))
+            rows.append(subject_rows)
+        if not rows:
+            return np.zeros(0)
+        if self.cache is None:
+            return self.engine.pair_scores(queries, _pad_rows(rows))[..., 1].max(axis=1)
+
+        self.cache.validate(self.version)
+        keys = [result_cache.face_key(query) for query in queries]
+        scores = [np.array([self.cache.get((key, int(r)), np.nan) for r in subject_rows])
+                  for key, subject_rows in zip(keys, rows)]
+        missing = [n for n, row_scores in enumerate(scores) if np.isnan(row_scores).any()]
+        if missing:
+            todo = [rows[n][np.isnan(scores[n])] for n in missing]
+            computed = self.engine.pair_scores(queries[missing], _pad_rows(todo))[..., 1]
+            for n, todo_rows, row_scores in zip(missing, todo, computed):
+                scores[n][np.isnan(scores[n])] = row_scores[:len(todo_rows)]
+                for r, score in zip(todo_rows, row_scores):
+                    self.cache.put((keys[n], int(r)), float(score))
+        return np.array([row_scores.max() for row_scores in scores])
+
+    @profiling.timed('identify')
+    def identify(self, queries, k=1):
+        """Top-k (name, probability) per query, best first."""
+        if self.index is not None:
+            return self._identify_candidates(queries, k)
+        unique, scores = self.subject_scores(queries)
+        k = min(k, len(unique))
+        top = np.argsort(-scores, axis=1, kind='stable')[:, :k]
+        return [[(self.name(unique[j]), float(row[j])) for j in best]
+                for row, best in zip(scores, top)]
+
+    def _identify_candidates(self, queries, k):
+        queries = np.asarray(queries).reshape((-1,) + np.shape(queries)[-2:])
+        ids, _ = self.index.search(self.engine.query_features(queries), self.candidates)
+        found = ids >= 0
+        scores = self.engine.pair_scores(queries, np.where(found, ids, 0))[..., 1]
+        scores[~found] = -np.inf
+        results = []
+        for row, id_row in zip(scores, ids):
+            # one entry per subject, like subject_scores(); names may repeat
+            best = {}
+            for j in np.argsort(-row, kind='stable'):
+                if row[j] == -np.inf or len(best) == k:
+                    break
+                best.setdefault(self.subjects[id_row[j]], float(row[j]))
+            results.append([(self.name(subject), score) for subject, score in best.items()])
+        return results
@@ -0,0 +1,265 @@
+import sys
+import time
+import threading
+import numpy as np
+import cv2
+
+import dataset
+import profiling
+from detection import FaceDetector
+
+# -----------------------------
+# Settings
+# -----------------------------
+# camera index, or a video file standing in for the webcam
+source = 0
+cascade_path = 'haarcascade_frontalface_default.xml'
+# run the Haar cascade on every Nth frame, on a copy shrunk by detect_scale
+detect_every = 5
+detect_scale = 0.5
+# faces whose best match is below this are labelled unknown
+min_score = 0.5
+
+
+class FrameGrabber:
+    """Reads frames on a background thread and keeps only the newest one.
+
+    A slow consumer never works through a backlog of stale frames: read()
+    returns the latest frame it has not seen yet and every frame captured in
+    between is dropped. Video files are paced at their own frame rate so they
+    behave like a camera; realtime=False reads them as fast as possible.
+    """
+
+    def __init__(self, source=0, realtime=None):
+        self.capture = cv2.VideoCapture(source)
+        if not self.capture.isOpened():
+            raise OSError('cannot open video source %r' % (source,))
+        if realtime is None:
+            realtime = isinstance(source, str)
+        fps = self.capture.get(cv2.CAP_PROP_FPS) if realtime else 0
+        self.interval = 1. / fps if fps and fps > 0 else 0.
+        self.captured = 0
+        self.dropped = 0
+
+        self._frame = None
+        self._index = -1
+        self._seen = -1
+        self._ended = False
+        self._stop = threading.Event()
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name='frame-grabber', daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        next_time = time.monotonic()
+        while not self._stop.is_set():
+            check, frame = self.capture.read()
+            if not check:
+                break
+            with self._cond:
+                if self._index > self._seen:
+                    self.dropped += 1
+                self._frame = frame
+                self._index = self.captured
+                self.captured += 1
+                self._cond.notify_all()
+            if self.interval:
+                next_time += self.interval
+                time.sleep(max(0., next_time - time.monotonic()))
+        with self._cond:
+            self._ended = True
+            self._cond.notify_all()
+
+    def read(self, timeout=None):
+        """(index, frame) of the newest unseen frame, or None once the source has ended."""
+        with self._cond:
+            while self._index <= self._seen and not self._ended:
+                if not self._cond.wait(timeout):
+                    return None
+            if self._index <= self._seen:
+                return None
+            self._seen = self._index
+            return self._index, self._frame
+
+    def close(self):
+        self._stop.set()
+        self._thread.join()
+        self.capture.release()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# -----------------------------
+# Detection / tracking
+# -----------------------------
+def to_gray(frame):
+    if frame.ndim == 2 or frame.shape[2] == 1:
+        return frame.reshape(frame.shape[:2])
+    return cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+
+
+def detect_faces(gray, cascade, scale=detect_scale):
+    """Haar detection on a downscaled copy; boxes (x, y, w, h) in full-frame pixels."""
+    small = gray
+    if scale != 1:
+        small = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    with profiling.stage('detect'):
+        faces = cascade.detectMultiScale(small, 1.3, 5)
+    return [tuple(int(round(v / scale)) for v in face) for face in faces]
+
+
+def iou(a, b):
+    ax, ay, aw, ah = a
+    bx, by, bw, bh = b
+    w = min(ax + aw, bx + bw) - max(ax, bx)
+    h = min(ay + ah, by + bh) - max(ay, by)
+    if w <= 0 or h <= 0:
+        return 0.
+    inter = w * h
+    return inter / float(aw * ah + bw * bh - inter)
+
+
+def crop(gray, box, size=dataset.IMAGE_SIZE):
+    x, y, w, h = box
+    x, y = max(0, x), max(0, y)
+    return dataset.to_face(gray[y:y + h, x:x + w], size)
+
+
+class Track:
+    """A face box followed between detections by template matching."""
+
+    def __init__(self, box, gray):
+        self.box = box
+        self.name = None
+        self.score = 0.
+        self.refresh(box, gray)
+
+    def refresh(self, box, gray):
+        x, y, w, h = self.box = box
+        self.template = gray[max(0, y):y + h, max(0, x):x + w].copy()
+
+    def follow(self, gray, margin=0.5):
+        """Move the box to the best template match within margin box sizes of the old one."""
+        x, y, w, h = self.box
+        th, tw = self.template.shape[:2]
+        if not th or not tw:
+            return
+        dx, dy = int(w * margin), int(h * margin)
+        x0, y0 = max(0, x - dx), max(0, y - dy)
+        window = gray[y0:y + h + dy, x0:x + w + dx]
+        if window.shape[0] < th or window.shape[1] < tw:
+            return
+        result = cv2.matchTemplate(window, self.template, cv2.TM_CCOEFF_NORMED)
+        _, _, _, (mx, my) = cv2.minMaxLoc(result)
+        self.box = (x0 + mx, y0 + my, w, h)
+
+
+class LivePipeline:
+    """Detect every Nth frame, track in between, identify all tracked faces in one batch.
+
+    matcher is an inference.FaceMatcher (anything with identify(faces, k)).
+    Identities are refreshed on detection frames only; tracks keep their
+    label in between.
+    """
+
+    def __init__(self, matcher, cascade, detect_every=detect_every, detect_scale=detect_scale,
+                 min_score=min_score, min_iou=0.3):
+        self.matcher = matcher
+        self.cascade = cascade
+        self.detect_every = max(1, detect_every)
+        self.detect_scale = detect_scale
+        self.min_score = min_score
+        self.min_iou = min_iou
+        self.tracks = []
+        self.frames = 0
+        self.detections = 0
+        self.fps = 0.
+        self._last = None
+
+    def process(self, frame):
+        """Update the tracks for frame; returns them."""
+        gray = to_gray(frame)
+        if self.frames % self.detect_every == 0:
+            self._detect(gray)
+        else:
+            for track in self.tracks:
+                track.follow(gray)
+        self.frames += 1
+
+        now = time.perf_counter()
+        if self._last is not None and now > self._last:
+            rate = 1. / (now - self._last)
+            self.fps = rate if not self.fps else 0.9 * self.fps + 0.1 * rate
+        self._last = now
+        return self.tracks
+
+    def _detect(self, gray):
+        self.detections += 1
+        boxes = detect_faces(gray, self.cascade, self.detect_scale)
+        tracks = []
+        unused = list(self.tracks)
+        for box in boxes:
+            best = max(unused, key=lambda t: iou(t.box, box), default=None)
+            if best is not None and iou(best.box, box) >= self.min_iou:
+                unused.remove(best)
+                best.refresh(box, gray)
+                tracks.append(best)
+            else:
+                tracks.append(Track(box, gray))
+        self.tracks = tracks
+        if tracks:
+            faces = np.stack([crop(gray, t.box) for t in tracks])
+            for track, matches in zip(tracks, self.matcher.identify(faces, k=1)):
+                name, score = matches[0]
+                track.name = name if score >= self.min_score else 'unknown'
+                track.score = score
+
+    def draw(self, frame):
+        for track in self.tracks:
+            x, y, w, h = track.box
+            cv2.rectangle(frame, (x, y), (x + w, y + h), (255, 0, 0), 2)
+            label = '%s %.2f' % (track.name, track.score)
+            cv2.putText(frame, label, (x, max(12, y - 6)), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 0, 0), 1)
+        cv2.putText(frame, 'FPS %.1f' % self.fps, (8, 20), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 0), 2)
+        return frame
+
+    def run(self, grabber, show=True, max_frames=None):
+        """Process frames from a FrameGrabber until it ends, 'q' is pressed or max_frames."""
+        while max_frames is None or self.frames < max_frames:
+            item = grabber.read()
+            if item is None:
+                break
+            _, frame = item
+            self.process(frame)
+            if show:
+                cv2.imshow('Recognition', self.draw(frame))
+                if cv2.waitKey(1) == ord('q'):
+                    break
+        if show:
+            cv2.destroyAllWindows()
+        return self.frames
+
+
+if __name__ == '__main__':
+    import inference
+    from network import Network
+    if len(sys.argv) > 1:
+        source = int(sys.argv[1]) if sys.argv[1].isdigit() else sys.argv[1]
+    try:
+        network = inference.load_network()
+    except OSError as er:
+        print(er, '\n⚠️ Model weights not found. Using random weights.')
+        np.random.seed(0)
+        network = Network()
+    matcher = inference.FaceMatcher(network, precision='float32')
+    # searches around the last faces first, full frame only on a miss
+    detector = FaceDetector(cv2.CascadeClassifier(cascade_path), memoize=False)
+    pipeline = LivePipeline(matcher, detector)
+    with FrameGrabber(source) as grabber:
+        pipeline.run(grabber)
+        print('frames : ', pipeline.frames, ' dropped : ', grabber.dropped,
+              ' detections : ', pipeline.detections)
@@ -0,0 +1,138 @@
+import queue
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+import cv2
+
+import dataset
+
+
+def _decode_chunk(shm_name, shape, first, paths, size):
+    """Worker: decode paths into rows first.. of the shared (N, size, size) uint8 array.
+
+    Only the file names go to the worker and only the (height, width) of each
+    file come back (0, 0 for unreadable files); the pixels stay in shared memory.
+    """
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        out = np.ndarray(shape, dtype=np.uint8, buffer=shm.buf)
+        dims = []
+        for n, path in enumerate(paths):
+            image = cv2.imread(path)
+            if image is None:
+                out[first + n] = 0
+                dims.append((0, 0))
+                continue
+            dims.append(image.shape[:2])
+            out[first + n] = dataset.to_face(image, size)
+        del out
+        return dims
+    finally:
+        shm.close()
+
+
+def _chunks(n, chunk_size):
+    return [(first, min(first + chunk_size, n)) for first in range(0, n, chunk_size)]
+
+
+class _Slot:
+    """A shared-memory uint8 block of shape (rows, size, size)."""
+
+    def __init__(self, rows, size):
+        self.shape = (rows, size, size)
+        self.shm = shared_memory.SharedMemory(create=True, size=max(1, rows * size * size))
+        self.array = np.ndarray(self.shape, dtype=np.uint8, buffer=self.shm.buf)
+
+    def release(self):
+        self.array = None
+        try:
+            self.shm.close()
+        except BufferError:
+            # a consumer still holds a view; the mapping goes away with it
+            pass
+        self.shm.unlink()
+
+
+def decode_files(paths, workers=None, size=dataset.IMAGE_SIZE, chunk_size=64, executor=None):
+    """Decode paths across worker processes into a (N, size, size) uint8 array.
+
+    Returns (images, dims) where dims[n] is the (height, width) of the source
+    file, or (0, 0) if it could not be read.
+    """
+    paths = list(paths)
+    if not paths:
+        return np.zeros((0, size, size), dtype=np.uint8), []
+    slot = _Slot(len(paths), size)
+    own = executor is None
+    executor = executor or ProcessPoolExecutor(max_workers=workers)
+    try:
+        futures = [executor.submit(_decode_chunk, slot.shm.name, slot.shape, first,
+                                   paths[first:last], size)
+                   for first, last in _chunks(len(paths), chunk_size)]
+        dims = [d for f in futures for d in f.result()]
+        return slot.array.copy(), dims
+    finally:
+        if own:
+            executor.shutdown()
+        slot.release()
+
+
+class Prefetcher:
+    """Runs an iterator on a background thread, keeping up to depth items ready.
+
+    Use it around dataset.iter_pair_batches() (without reuse=True) so pair
+    building overlaps with the forward / backward pass; close() it, or use it
+    as a context manager, to stop the thread.
+    """
+
+    _done = object()
+
+    def __init__(self, iterable, depth=4):
+        self._queue = queue.Queue(maxsize=depth)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, args=(iter(iterable),), daemon=True)
+        self._thread.start()
+
+    def _put(self, item):
+        # False once close() was called; a full queue must not keep the thread alive
+        while not self._stop.is_set():
+            try:
+                self._queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _run(self, iterator):
+        try:
+            for item in iterator:
+                if not self._put(item):
+                    return
+        except Exception as er:
+            self._put(er)
+            return
+        self._put(self._done)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        item = self._queue.get()
+        if item is self._done:
+            raise StopIteration
+        if isinstance(item, Exception):
+            raise item
+        return item
+
+    def close(self):
+        self._stop.set()
+        self._thread.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
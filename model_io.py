@@ -0,0 +1,134 @@
+import os
+import sys
+import json
+import struct
+import numpy as np
+
+import profiling
+
+# -----------------------------
+# Single-file model format
+# -----------------------------
+# magic | uint32 version | uint32 header length | JSON header | raw C-order blobs
+# Every blob starts on an ALIGN boundary so it can be memory-mapped in place;
+# the header lists name, dtype, shape and offset of each array plus metadata
+# such as the loss.
+MAGIC = b'FRMODEL\0'
+VERSION = 1
+ALIGN = 64
+EXTENSION = '.model'
+
+
+def model_path(model_folder, model_name):
+    return os.path.join(model_folder, model_name + EXTENSION)
+
+
+def legacy_paths(model_folder, model_name):
+    """The eight best_layerN_{weights,biases} .npy files and best_loss .txt of the old layout."""
+    arrays = [os.path.join(model_folder, 'best_layer%d_%s%s.npy' % (n, kind, model_name))
+              for n in range(1, 5) for kind in ('weights', 'biases')]
+    return arrays, os.path.join(model_folder, 'best_loss' + model_name + '.txt')
+
+
+def _aligned(n):
+    return (n + ALIGN - 1) // ALIGN * ALIGN
+
+
+def save_model(path, params, **meta):
+    """Atomically write [(weights, biases), ...] plus metadata (e.g. loss=...) to path."""
+    arrays = []
+    for n, (weights, biases) in enumerate(params, 1):
+        arrays.append(('layer%d_weights' % n, np.ascontiguousarray(weights)))
+        arrays.append(('layer%d_biases' % n, np.ascontiguousarray(biases)))
+
+    entries = []
+    offset = 0
+    for name, array in arrays:
+        entries.append({'name': name, 'dtype': array.dtype.str, 'shape': list(array.shape),
+                        'offset': offset})
+        offset = _aligned(offset + array.nbytes)
+    header = json.dumps({'version': VERSION, 'meta': meta, 'arrays': entries}).encode('utf-8')
+    data_start = _aligned(len(MAGIC) + 8 + len(header))
+
+    tmp = path + '.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(MAGIC + struct.pack('<II', VERSION, len(header)) + header)
+        for entry, (name, array) in zip(entries, arrays):
+            f.seek(data_start + entry['offset'])
+            f.write(array.tobytes())
+        f.truncate(data_start + offset)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def read_header(path):
+    with open(path, 'rb') as f:
+        magic = f.read(len(MAGIC))
+        if magic != MAGIC:
+            raise ValueError('%s is not a model file' % path)
+        version, length = struct.unpack('<II', f.read(8))
+        if version > VERSION:
+            raise ValueError('%s has model format version %d, newest supported is %d'
+                             % (path, version, VERSION))
+        header = json.loads(f.read(length).decode('utf-8'))
+    header['data_start'] = _aligned(len(MAGIC) + 8 + length)
+    return header
+
+
+def load_model(path, mmap=True):
+    """Return ([(weights, biases), ...], meta).
+
+    With mmap=True the arrays are read-only memory maps, so the 20 MB first
+    layer is only paged in when it is used.
+    """
+    header = read_header(path)
+    arrays = {}
+    for entry in header['arrays']:
+        dtype, shape = np.dtype(entry['dtype']), tuple(entry['shape'])
+        offset = header['data_start'] + entry['offset']
+        if mmap and int(np.prod(shape)):
+            arrays[entry['name']] = np.memmap(path, dtype=dtype, mode='r', offset=offset, shape=shape)
+        else:
+            with open(path, 'rb') as f:
+                f.seek(offset)
+                count = int(np.prod(shape))
+                arrays[entry['name']] = np.fromfile(f, dtype=dtype, count=count).reshape(shape)
+    n_layers = len(arrays) // 2
+    params = [(arrays['layer%d_weights' % n], arrays['layer%d_biases' % n]) for n in range(1, n_layers + 1)]
+    return params, header.get('meta', {})
+
+
+def load_legacy(model_folder, model_name):
+    """Read the old eight-file layout; returns (params, meta) like load_model()."""
+    array_paths, loss_path = legacy_paths(model_folder, model_name)
+    arrays = [np.load(p) for p in array_paths]
+    params = list(zip(arrays[0::2], arrays[1::2]))
+    meta = {}
+    if os.path.exists(loss_path):
+        with open(loss_path) as f:
+            meta['loss'] = float(f.read())
+    return params, meta
+
+
+@profiling.timed('checkpoint_read')
+def load(model_folder, model_name, mmap=True):
+    """Load the single-file model if there is one, else the old eight-file layout."""
+    path = model_path(model_folder, model_name)
+    if os.path.exists(path):
+        return load_model(path, mmap=mmap)
+    return load_legacy(model_folder, model_name)
+
+
+def convert_legacy(model_folder, model_name, path=None):
+    """Write the old eight .npy files + best_loss .txt as one model file; returns its path."""
+    params, meta = load_legacy(model_folder, model_name)
+    path = path or model_path(model_folder, model_name)
+    save_model(path, params, **meta)
+    return path
+
+
+if __name__ == '__main__':
+    model_folder = sys.argv[1] if len(sys.argv) > 1 else 'model'
+    model_name = sys.argv[2] if len(sys.argv) > 2 else '50x50-4l'
+    print('converted :', convert_legacy(model_folder, model_name))
@@ -0,0 +1,265 @@
+import time
+import itertools
+import numpy as np
+
+import profiling
+
+
+class Layer :
+    def __init__(self,n_inputs,n_neurons):
+        self.weights = 0.1 * np.random.rand(n_inputs,n_neurons)-0.05
+        self.biases = np.zeros((1,n_neurons))
+    def forward(self,inputs):
+        with profiling.stage('layer_forward_%dx%d', self.weights.shape):
+            if not isinstance(inputs, np.ndarray):
+                # lists (training.py test()) would otherwise be converted inside np.dot
+                with profiling.stage('to_array'):
+                    inputs = np.asarray(inputs)
+            self.inputs = inputs
+            self.output = np.dot(inputs, self.weights) + self.biases
+    def backward(self,dvalues,input_gradient=True):
+        self.dweights = np.dot(np.asarray(self.inputs).T, dvalues)
+        self.dbiases = np.sum(dvalues, axis=0, keepdims=True)
+        # the first layer has nothing to pass the gradient on to
+        if input_gradient:
+            self.dinputs = np.dot(dvalues, self.weights.T)
+class activation :
+    def forward(self,inputs):
+        self.inputs = inputs
+        self.output = np.maximum(0, inputs)
+    def backward(self,dvalues):
+        self.dinputs = dvalues.copy()
+        self.dinputs[self.inputs <= 0] = 0
+class activation_softmax:
+    def forward(self,inputs):
+        exp_values = np.exp(inputs - np.max(inputs, axis=1,keepdims=True))
+        probabilities = exp_values/np.sum(exp_values, axis=1,keepdims=True)
+        self.output = probabilities
+    def backward(self,dvalues):
+        # row-wise Jacobian-vector product without building the Jacobians
+        dot = np.sum(dvalues * self.output, axis=1, keepdims=True)
+        self.dinputs = self.output * (dvalues - dot)
+class Loss:
+
+    def calculate (self,output,y):
+        sample_losses = self.forward(output,y)
+        data_loss=np.mean(sample_losses)
+        return data_loss
+class Loss_C(Loss):
+    def forward(self,y_pred,y_true):
+        samples = len(y_pred)
+        y_pred_clipped = np.clip(y_pred, 1e-7,1-1e-7)
+        if len(y_true.shape)==1:
+            correct_confidences = y_pred_clipped[range(samples),y_true]
+        elif len(y_true.shape)==2:
+            correct_confidences = np.sum(y_pred_clipped*y_true, axis=1)
+        negetive_log_likelhoods = -np.log(correct_confidences)
+        #negetive_log_likelhoods = correct_confidences
+        return negetive_log_likelhoods
+    def backward(self,dvalues,y_true):
+        samples = len(dvalues)
+        if len(y_true.shape)==1:
+            y_true = np.eye(dvalues.shape[1])[y_true]
+        self.dinputs = -y_true / np.clip(dvalues, 1e-7, 1-1e-7) / samples
+
+class Loss_C2(Loss):
+    def forward(self,y_pred,y_true):
+        samples = len(y_pred)
+        outputlen = len(y_pred[0])
+        loss_n = 0
+        for i in range (samples):
+            for j in range (outputlen):
+                loss_n += abs(y_pred[i][j]-y_true[i][j])**2
+
+
+        return loss_n / samples
+
+class activation_softmax_Loss_C:
+    # softmax + cross-entropy together: the gradient collapses to (p - y) / n
+    def __init__(self):
+        self.activation = activation_softmax()
+        self.loss = Loss_C()
+    def forward(self,inputs,y_true):
+        self.activation.forward(inputs)
+        self.output = self.activation.output
+        return self.loss.calculate(self.output, y_true)
+    def backward(self,dvalues,y_true):
+        samples = len(dvalues)
+        if len(y_true.shape)==2:
+            y_true = np.argmax(y_true, axis=1)
+        self.dinputs = dvalues.copy()
+        self.dinputs[np.arange(samples), y_true] -= 1
+        self.dinputs = self.dinputs / samples
+
+# names used by test.py
+ActivationReLU = activation
+ActivationSoftmax = activation_softmax
+
+
+# -----------------------------
+# Optimizers
+# -----------------------------
+class Optimizer_SGD:
+    def __init__(self, learning_rate=0.1, decay=0., momentum=0.):
+        self.learning_rate = learning_rate
+        self.current_learning_rate = learning_rate
+        self.decay = decay
+        self.iterations = 0
+        self.momentum = momentum
+    def pre_update_params(self):
+        if self.decay:
+            self.current_learning_rate = self.learning_rate * (1. / (1. + self.decay * self.iterations))
+    def update_params(self, layer):
+        if self.momentum:
+            if not hasattr(layer, 'weight_momentums'):
+                layer.weight_momentums = np.zeros_like(layer.weights)
+                layer.bias_momentums = np.zeros_like(layer.biases)
+            layer.weight_momentums *= self.momentum
+            layer.weight_momentums -= self.current_learning_rate * layer.dweights
+            layer.bias_momentums *= self.momentum
+            layer.bias_momentums -= self.current_learning_rate * layer.dbiases
+            layer.weights += layer.weight_momentums
+            layer.biases += layer.bias_momentums
+        else:
+            layer.weights -= self.current_learning_rate * layer.dweights
+            layer.biases -= self.current_learning_rate * layer.dbiases
+    def post_update_params(self):
+        self.iterations += 1
+
+class Optimizer_Adam:
+    def __init__(self, learning_rate=0.001, decay=0., epsilon=1e-7, beta_1=0.9, beta_2=0.999):
+        self.learning_rate = learning_rate
+        self.current_learning_rate = learning_rate
+        self.decay = decay
+        self.iterations = 0
+        self.epsilon = epsilon
+        self.beta_1 = beta_1
+        self.beta_2 = beta_2
+    def pre_update_params(self):
+        if self.decay:
+            self.current_learning_rate = self.learning_rate * (1. / (1. + self.decay * self.iterations))
+    def update_params(self, layer):
+        if not hasattr(layer, 'weight_cache'):
+            layer.weight_momentums = np.zeros_like(layer.weights)
+            layer.weight_cache = np.zeros_like(layer.weights)
+            layer.bias_momentums = np.zeros_like(layer.biases)
+            layer.bias_cache = np.zeros_like(layer.biases)
+        step = self.iterations + 1
+        for param, grad, momentums, cache in (
+                (layer.weights, layer.dweights, layer.weight_momentums, layer.weight_cache),
+                (layer.biases, layer.dbiases, layer.bias_momentums, layer.bias_cache)):
+            momentums *= self.beta_1
+            momentums += (1 - self.beta_1) * grad
+            cache *= self.beta_2
+            cache += (1 - self.beta_2) * grad ** 2
+            corrected = momentums / (1 - self.beta_1 ** step)
+            param -= self.current_learning_rate * corrected / (
+                np.sqrt(cache / (1 - self.beta_2 ** step)) + self.epsilon)
+    def post_update_params(self):
+        self.iterations += 1
+
+
+# -----------------------------
+# Network
+# -----------------------------
+class Network:
+    """Stack of Layers with ReLU between them and softmax on top (5000-500-50-10-2 by default)."""
+
+    def __init__(self, layers=None, sizes=(5000, 500, 50, 10, 2)):
+        if layers is None:
+            layers = [Layer(n_in, n_out) for n_in, n_out in zip(sizes[:-1], sizes[1:])]
+        self.layers = list(layers)
+        self.activations = [activation() for _ in self.layers[:-1]] + [activation_softmax()]
+        self.loss_activation = activation_softmax_Loss_C()
+        self.loss_function = Loss_C()
+
+    def forward(self, X):
+        out = X
+        for layer, act in zip(self.layers, self.activations):
+            layer.forward(out)
+            act.forward(layer.output)
+            out = act.output
+        return out
+
+    def loss(self, X, y):
+        output = self.forward(X)
+        loss = self.loss_function.calculate(output, y)
+        acc = np.mean(np.argmax(output, axis=1) == y)
+        return loss, acc
+
+    def train_step(self, X, y, optimizer):
+        """One forward/backward pass and parameter update on a mini-batch; returns (loss, acc)."""
+        out = X
+        for layer, act in zip(self.layers[:-1], self.activations[:-1]):
+            layer.forward(out)
+            act.forward(layer.output)
+            out = act.output
+        self.layers[-1].forward(out)
+        loss = self.loss_activation.forward(self.layers[-1].output, y)
+        acc = np.mean(np.argmax(self.loss_activation.output, axis=1) == y)
+
+        self.loss_activation.backward(self.loss_activation.output, y)
+        dvalues = self.loss_activation.dinputs
+        for n in range(len(self.layers) - 1, -1, -1):
+            self.layers[n].backward(dvalues, input_gradient=n > 0)
+            if n > 0:
+                self.activations[n - 1].backward(self.layers[n].dinputs)
+                dvalues = self.activations[n - 1].dinputs
+
+        optimizer.pre_update_params()
+        for layer in self.layers:
+            optimizer.update_params(layer)
+        optimizer.post_update_params()
+        return loss, acc
+
+    def fit(self, X, y, epochs=10, batch_size=64, optimizer=None, target_loss=None,
+            callback=None, rng=None, print_every=1):
+        """Mini-batch training; returns a list of (epoch, loss, acc, seconds) per epoch.
+
+        callback(epoch, loss, acc) runs after every epoch and may return True to stop.
+        Training also stops once the epoch loss reaches target_loss.
+        """
+        rng = np.random.default_rng(rng)
+        y = np.asarray(y)
+        samples = len(y)
+
+        def epoch_batches():
+            order = rng.permutation(samples)
+            for first in range(0, samples, batch_size):
+                batch = order[first:first + batch_size]
+                yield X[batch], y[batch]
+
+        return self._fit(epoch_batches, epochs, optimizer, target_loss, callback, print_every)
+
+    def fit_generator(self, batches, steps_per_epoch, epochs=10, optimizer=None, target_loss=None,
+                      callback=None, print_every=1):
+        """fit() on an iterator of (X, y) mini-batches, e.g. dataset.iter_pair_batches()."""
+        batches = iter(batches)
+        return self._fit(lambda: itertools.islice(batches, steps_per_epoch), epochs, optimizer,
+                         target_loss, callback, print_every)
+
+    def _fit(self, epoch_batches, epochs, optimizer, target_loss, callback, print_every):
+        optimizer = optimizer or Optimizer_Adam()
+        history = []
+        start = time.perf_counter()
+
+        for epoch in range(1, epochs + 1):
+            losses, accs, weights = [], [], []
+            for X, y in epoch_batches():
+                loss, acc = self.train_step(X, y, optimizer)
+                losses.append(loss)
+                accs.append(acc)
+                weights.append(len(y))
+            if not weights:
+                break
+            loss = float(np.average(losses, weights=weights))
+            acc = float(np.average(accs, weights=weights))
+            history.append((epoch, loss, acc, time.perf_counter() - start))
+
+            if print_every and epoch % print_every == 0:
+                print('epoch : ', epoch, ' loss : ', loss, ' acc : ', round(acc*100000)/1000)
+            if callback is not None and callback(epoch, loss, acc):
+                break
+            if target_loss is not None and loss <= target_loss:
+                break
+        return history
@@ -0,0 +1,159 @@
+"""Per-stage timing: call counts, total seconds and latency histograms.
+
+    import profiling
+    profiling.enable()
+    with profiling.stage('detect'):
+        faces = cascade.detectMultiScale(gray, 1.3, 5)
+    print(profiling.profiler.to_prometheus())
+
+Recording is off unless FACEREC_PROFILE=1 is set or enable() is called. While
+it is off, stage() returns a shared no-op context manager and timed()
+functions call straight through, so the hooks can stay in hot paths.
+Stages nest and each one counts its own wall time, so an outer stage includes
+the inner ones.
+"""
+import os
+import time
+import json
+import bisect
+import functools
+import threading
+
+# -----------------------------
+# Settings
+# -----------------------------
+enabled = os.environ.get('FACEREC_PROFILE', '0') not in ('', '0')
+# histogram upper bounds in seconds (Prometheus 'le'); +Inf is implicit
+BUCKETS = (0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1., 2.5, 5., 10.)
+METRIC = 'facerec_stage_seconds'
+
+
+class Profiler:
+    """Thread-safe store of per-stage counts, totals, maxima and histograms."""
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = tuple(buckets)
+        self._stages = {}
+        self._lock = threading.Lock()
+
+    def record(self, name, seconds):
+        with self._lock:
+            stage = self._stages.get(name)
+            if stage is None:
+                # count, total, max, per-bucket counts (last one is +Inf)
+                stage = self._stages[name] = [0, 0., 0., [0] * (len(self.buckets) + 1)]
+            stage[0] += 1
+            stage[1] += seconds
+            stage[2] = max(stage[2], seconds)
+            stage[3][bisect.bisect_left(self.buckets, seconds)] += 1
+
+    def stage(self, name):
+        return _Timer(self, name)
+
+    def reset(self):
+        with self._lock:
+            self._stages.clear()
+
+    def snapshot(self):
+        """{stage: {'count', 'total_seconds', 'mean_seconds', 'max_seconds', 'buckets'}}, buckets cumulative."""
+        with self._lock:
+            stages = {name: (count, total, peak, list(counts))
+                      for name, (count, total, peak, counts) in self._stages.items()}
+        result = {}
+        for name in sorted(stages):
+            count, total, peak, counts = stages[name]
+            cumulative, buckets = 0, {}
+            for le, n in zip([str(b) for b in self.buckets] + ['+Inf'], counts):
+                cumulative += n
+                buckets[le] = cumulative
+            result[name] = {'count': count, 'total_seconds': total, 'mean_seconds': total / count,
+                            'max_seconds': peak, 'buckets': buckets}
+        return result
+
+    def to_json(self, **kwargs):
+        return json.dumps({'stages': self.snapshot()}, **kwargs)
+
+    def to_prometheus(self, metric=METRIC):
+        """Prometheus text exposition format: one histogram, labelled by stage."""
+        lines = ['# HELP %s Wall time per pipeline stage.' % metric, '# TYPE %s histogram' % metric]
+        for name, stage in self.snapshot().items():
+            for le, n in stage['buckets'].items():
+                lines.append('%s_bucket{stage="%s",le="%s"} %d' % (metric, name, le, n))
+            lines.append('%s_sum{stage="%s"} %r' % (metric, name, stage['total_seconds']))
+            lines.append('%s_count{stage="%s"} %d' % (metric, name, stage['count']))
+        return '\n'.join(lines) + '\n'
+
+
+class _Timer:
+    __slots__ = ('profiler', 'name', 'start')
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.profiler.record(self.name, time.perf_counter() - self.start)
+        return False
+
+
+class _Off:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_OFF = _Off()
+profiler = Profiler()
+
+
+def enable(on=True):
+    global enabled
+    enabled = on
+
+
+def stage(name, args=None):
+    """Context manager timing its block as stage name (name % args, only formatted when enabled)."""
+    if not enabled:
+        return _OFF
+    return _Timer(profiler, name if args is None else name % args)
+
+
+def timed(name):
+    """Decorator timing every call of the function as stage name."""
+    def decorate(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not enabled:
+                return function(*args, **kwargs)
+            with _Timer(profiler, name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def parse_prometheus(text, metric=METRIC):
+    """{stage: {'count', 'total_seconds', 'buckets'}} back from to_prometheus() text."""
+    stages = {}
+    for line in text.splitlines():
+        if not line.startswith(metric + '_'):
+            continue
+        head, value = line.rsplit(' ', 1)
+        kind, labels = head[len(metric) + 1:].split('{', 1)
+        labels = dict(item.split('=', 1) for item in labels.rstrip('}').split(','))
+        labels = {key: value.strip('"') for key, value in labels.items()}
+        stage = stages.setdefault(labels['stage'], {'count': 0, 'total_seconds': 0., 'buckets': {}})
+        if kind == 'bucket':
+            stage['buckets'][labels['le']] = int(float(value))
+        elif kind == 'sum':
+            stage['total_seconds'] = float(value)
+        elif kind == 'count':
+            stage['count'] = int(float(value))
+    return stages
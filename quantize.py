@@ -0,0 +1,133 @@
+import sys
+import time
+import numpy as np
+
+import dataset
+import image_cache
+import profiling
+from network import Network
+
+
+class QuantizedLayer:
+    """int8 per-output-channel quantized Layer.
+
+    weights ~= q * scale with one float32 scale per output neuron. Because the
+    scale is per column, x @ (q * scale) == (x @ q) * scale, so the int8 matrix
+    is widened to float32 one block of rows at a time and never held
+    dequantized in full.
+    """
+
+    block_rows = 512
+
+    def __init__(self, layer):
+        weights = np.asarray(layer.weights, dtype=np.float32)
+        scale = np.abs(weights).max(axis=0) / 127
+        scale[scale == 0] = 1
+        self.q = np.round(weights / scale).astype(np.int8)
+        self.scale = scale.astype(np.float32)
+        self.biases = np.asarray(layer.biases, dtype=np.float32)
+
+    @property
+    def weights(self):
+        # dequantized copy, for code that needs the plain matrix
+        return self.q.astype(np.float32) * self.scale
+
+    @property
+    def nbytes(self):
+        return self.q.nbytes + self.scale.nbytes + self.biases.nbytes
+
+    def dot(self, inputs, start=0, stop=None):
+        """inputs @ weights[start:stop] without the bias."""
+        inputs = np.asarray(inputs, dtype=np.float32)
+        stop = len(self.q) if stop is None else stop
+        out = np.zeros((len(inputs), self.q.shape[1]), dtype=np.float32)
+        for first in range(start, stop, self.block_rows):
+            last = min(first + self.block_rows, stop)
+            out += np.dot(inputs[:, first - start:last - start], self.q[first:last].astype(np.float32))
+        out *= self.scale
+        return out
+
+    def forward(self, inputs):
+        with profiling.stage('layer_forward_%dx%d', self.q.shape):
+            self.output = self.dot(inputs) + self.biases
+
+
+def to_float32(network):
+    """Copy of network with every weight and bias in float32."""
+    layers = []
+    for layer in network.layers:
+        copy = type(layer).__new__(type(layer))
+        copy.weights = np.asarray(layer.weights, dtype=np.float32)
+        copy.biases = np.asarray(layer.biases, dtype=np.float32)
+        layers.append(copy)
+    return Network(layers)
+
+
+def to_int8(network):
+    """float32 copy of network with the first (5000x500) layer int8-quantized."""
+    quantized = to_float32(network)
+    quantized.layers[0] = QuantizedLayer(quantized.layers[0])
+    return quantized
+
+
+def convert(network, precision='float64'):
+    if precision == 'float64':
+        return network
+    if precision == 'float32':
+        return to_float32(network)
+    if precision == 'int8':
+        return to_int8(network)
+    raise ValueError('unknown precision: %r' % (precision,))
+
+
+def model_bytes(network):
+    return sum(getattr(layer, 'nbytes', None) or (layer.weights.nbytes + layer.biases.nbytes)
+               for layer in network.layers)
+
+
+# -----------------------------
+# Accuracy / speed report
+# -----------------------------
+def report(network, folder='data', pairs=1400, repeat=20):
+    import inference
+    images, _, subjects, _ = image_cache.load_images(folder)
+    idx1, idx2, y = dataset.sample_pairs(subjects, pairs, rng=0)
+    X = dataset.pair_matrix(images, idx1, idx2)
+
+    reference = network.forward(X).copy()
+    rows = []
+    for precision in ('float64', 'float32', 'int8'):
+        net = convert(network, precision)
+        probabilities = net.forward(X)
+        accuracy = np.mean(np.argmax(probabilities, axis=1) == y)
+        agreement = np.mean(np.argmax(probabilities, axis=1) == np.argmax(reference, axis=1))
+        drift = np.abs(probabilities - reference).max()
+
+        engine = inference.GalleryEngine(net, images)
+        engine.scores(images[0])
+        start = time.perf_counter()
+        for n in range(repeat):
+            engine.scores(images[n % len(images)])
+        latency = (time.perf_counter() - start) / repeat
+
+        rows.append((precision, model_bytes(net), accuracy, agreement, drift, latency))
+
+    print('%-8s %10s %9s %10s %10s %14s' % ('mode', 'model MB', 'accuracy', 'agreement', 'max drift',
+                                            'ms/query (1:%d)' % len(images)))
+    for precision, nbytes, accuracy, agreement, drift, latency in rows:
+        print('%-8s %10.2f %8.2f%% %9.2f%% %10.2e %14.2f' % (precision, nbytes / 1e6, accuracy * 100,
+                                                           agreement * 100, drift, latency * 1000))
+    return rows
+
+
+if __name__ == '__main__':
+    import inference
+    model_folder = sys.argv[1] if len(sys.argv) > 1 else 'model'
+    model_name = sys.argv[2] if len(sys.argv) > 2 else '50x50-4l'
+    try:
+        network = inference.load_network(model_folder, model_name)
+    except OSError as er:
+        print(er, '\n⚠️ Model weights not found. Using random weights.')
+        np.random.seed(0)
+        network = Network()
+    report(network)
@@ -0,0 +1,264 @@
+import os
+import ctypes
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+import numpy as np
+
+from network import Network
+
+
+def _bind(layers, params):
+    """Copy the layers' weights and biases into the flat params buffer and make them views of it."""
+    offset = 0
+    for layer in layers:
+        for name in ('weights', 'biases'):
+            value = np.asarray(getattr(layer, name))
+            view = params[offset:offset + value.size].reshape(value.shape)
+            view[...] = value
+            setattr(layer, name, view)
+            offset += value.size
+
+
+def _size(layers):
+    return sum(np.size(layer.weights) + np.size(layer.biases) for layer in layers)
+
+
+class RandomSearch:
+    """Allocation-free random-perturbation step for the derivative-free trainers.
+
+    All weights and biases of the layers are moved into one flat parameter buffer
+    and the layers get reshaped views into it, so a step is a single in-place add
+    of a preallocated noise buffer and a rejected step is undone by subtracting
+    the same noise again - no fresh random arrays and no restore copies.
+    """
+
+    def __init__(self, layers, seed=0, dtype=np.float32):
+        self.layers = list(layers)
+        total = _size(self.layers)
+        self.params = np.empty(total, dtype=dtype)
+        self.noise = np.zeros(total, dtype=dtype)
+        self.rng = np.random.default_rng(seed)
+        _bind(self.layers, self.params)
+
+    def perturb(self, rv):
+        """Add uniform noise in [-rv/2, rv/2) to every parameter."""
+        self.rng.random(out=self.noise, dtype=self.noise.dtype)
+        self.noise *= rv
+        self.noise -= rv / 2
+        self.params += self.noise
+
+    def undo(self):
+        """Reject the last perturb() step."""
+        self.params -= self.noise
+
+    def run(self, network, X, y, iterations, lr=0.1, decay=10, best_loss=np.inf,
+            on_improve=None, print_every=0):
+        """The training.py hill-climbing loop on top of perturb()/undo(); returns the best loss.
+
+        on_improve(i, loss, acc) is called every time a step is kept.
+        """
+        rv = 0
+        for i in range(iterations):
+            self.perturb(rv)
+            loss, acc = network.loss(X, y)
+            if loss < best_loss:
+                rv = lr
+                best_loss = loss
+                if on_improve is not None:
+                    on_improve(i, loss, acc)
+            else:
+                rv -= rv / decay
+                self.undo()
+            if print_every and i % print_every == 0:
+                print(i, 'loss : ', best_loss, 'rv : ', rv)
+        return best_loss
+
+
+# -----------------------------
+# Population search
+# -----------------------------
+def _shared(array):
+    shm = shared_memory.SharedMemory(create=True, size=max(1, array.nbytes))
+    np.ndarray(array.shape, dtype=array.dtype, buffer=shm.buf)[...] = array
+    return shm
+
+
+class _Evaluator:
+    """Scores candidate number k of a generation against the shared dataset.
+
+    Candidate (generation, k) is params + sigma * N(0, 1) noise drawn from
+    default_rng((seed, generation, k)), so any process can rebuild it from
+    those three integers alone.
+    """
+
+    def __init__(self, blocks, sizes, sigma, seed):
+        self.shms = [shared_memory.SharedMemory(name=name) for name, _, _ in blocks]
+        # numpy keeps only a reference to the mmap, which close() unmaps under any view; a ctypes
+        # array holds a buffer export for as long as the arrays (and their views) use it as base
+        (self.params, self.X, self.y) = [
+            np.ndarray(shape, dtype=dtype, buffer=(ctypes.c_char * shm.size).from_buffer(shm.buf))
+            for shm, (_, shape, dtype) in zip(self.shms, blocks)]
+        self.sigma = sigma
+        self.seed = seed
+        self.network = Network(sizes=sizes)
+        self.candidate = np.empty_like(self.params)
+        _bind(self.network.layers, self.candidate)
+        self.noise_buffer = np.empty_like(self.params)
+
+    def noise(self, generation, k):
+        rng = np.random.default_rng((self.seed, generation, k))
+        rng.standard_normal(out=self.noise_buffer, dtype=self.noise_buffer.dtype)
+        return self.noise_buffer
+
+    def evaluate(self, generation, k):
+        np.add(self.params, self.sigma * self.noise(generation, k), out=self.candidate)
+        loss, acc = self.network.loss(self.X, self.y)
+        return float(loss), float(acc)
+
+    def close(self):
+        self.params = self.X = self.y = None
+        for shm in self.shms:
+            _close_shared(shm)
+
+
+# blocks that still had numpy views when closed; retried on every later close
+_lingering = []
+
+
+def _close_shared(shm):
+    """Close shm, or keep it mapped (retried later) while views of it are still alive."""
+    for pending in [shm] + _lingering:
+        try:
+            pending.close()
+        except BufferError:
+            if pending not in _lingering:
+                _lingering.append(pending)
+        else:
+            if pending in _lingering:
+                _lingering.remove(pending)
+
+
+_evaluator = None
+
+
+def _init_worker(blocks, sizes, sigma, seed):
+    global _evaluator
+    _evaluator = _Evaluator(blocks, sizes, sigma, seed)
+
+
+def _evaluate(task):
+    return _evaluator.evaluate(*task)
+
+
+class PopulationSearch:
+    """Evaluates population perturbations of the weights per generation in worker processes.
+
+    The flat float32 parameter buffer (the layers become views of it, as with
+    RandomSearch) and the X / y pair data are placed in shared memory once;
+    after that a task is just (generation, k), from which the worker rebuilds
+    the candidate's noise. update='best' keeps the best candidate if it beats
+    the current loss, update='es' moves the weights along the rank-weighted
+    sum of all noise vectors (evolution strategies). Results depend only on
+    seed, never on the number of workers. With workers=0 everything runs in
+    this process.
+    """
+
+    def __init__(self, layers, X, y, population=8, workers=None, sigma=0.01, seed=0,
+                 update='best', lr=0.01, dtype=np.float32):
+        if update not in ('best', 'es'):
+            raise ValueError('unknown update: %r' % (update,))
+        self.layers = list(layers)
+        self.population = population
+        self.update = update
+        self.lr = lr
+        self.generation = 0
+
+        params = np.empty(_size(self.layers), dtype=dtype)
+        _bind(self.layers, params)
+        arrays = (params, np.ascontiguousarray(X, dtype=dtype), np.ascontiguousarray(y, dtype=np.int64))
+        self._shms = [_shared(a) for a in arrays]
+        blocks = [(shm.name, a.shape, a.dtype.str) for shm, a in zip(self._shms, arrays)]
+        sizes = [np.shape(self.layers[0].weights)[0]] + [np.shape(l.weights)[1] for l in self.layers]
+
+        self._local = _Evaluator(blocks, sizes, sigma, seed)
+        self.params = self._local.params
+        _bind(self.layers, self.params)
+        self._executor = None
+        if workers != 0:
+            self._executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                                 initargs=(blocks, sizes, sigma, seed))
+            self._chunksize = max(1, -(-population // (workers or os.cpu_count())))
+
+    def evaluate(self):
+        """Loss and accuracy of the current weights."""
+        loss, acc = Network(self.layers).loss(self._local.X, self._local.y)
+        return float(loss), float(acc)
+
+    def step(self, best_loss=np.inf):
+        """Run one generation; returns the (loss, acc) of the weights it leaves behind.
+
+        With update='best' the weights only change when a candidate beats
+        best_loss, otherwise (best_loss, None) comes back.
+        """
+        tasks = [(self.generation, k) for k in range(self.population)]
+        if self._executor is None:
+            results = [self._local.evaluate(*task) for task in tasks]
+        else:
+            results = list(self._executor.map(_evaluate, tasks, chunksize=self._chunksize))
+        losses = np.array([loss for loss, _ in results])
+
+        if self.update == 'best':
+            k = int(np.argmin(losses))
+            if losses[k] < best_loss:
+                self.params += self._local.sigma * self._local.noise(self.generation, k)
+                result = results[k]
+            else:
+                result = (best_loss, None)
+        else:
+            # centred ranks in [-0.5, 0.5], lowest loss weighted highest
+            ranks = np.empty(self.population)
+            ranks[np.argsort(-losses, kind='stable')] = np.arange(self.population)
+            weights = ranks / max(1, self.population - 1) - 0.5
+            step = np.zeros_like(self.params)
+            for k, weight in enumerate(weights):
+                step += weight * self._local.noise(self.generation, k)
+            self.params += self.lr / (self.population * self._local.sigma) * step
+            result = self.evaluate()
+        self.generation += 1
+        return result
+
+    def run(self, generations, best_loss=np.inf, on_improve=None, print_every=0):
+        """step() generations times; on_improve(generation, loss, acc) when the loss improves."""
+        for g in range(generations):
+            loss, acc = self.step(best_loss)
+            if loss < best_loss:
+                best_loss = loss
+                if on_improve is not None:
+                    on_improve(g, loss, acc)
+            if print_every and g % print_every == 0:
+                print(g, 'loss : ', best_loss)
+        return best_loss
+
+    def close(self):
+        """Stop the workers and move the layers back into private memory.
+
+        Views of the old layer arrays taken before close() stay readable: their
+        block is unlinked, but only unmapped once they are collected.
+        """
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+        if self._shms:
+            self.params = self.params.copy()
+            _bind(self.layers, self.params)
+            self._local.close()
+            for shm in self._shms:
+                shm.close()
+                shm.unlink()
+            self._shms = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,82 @@
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+import numpy as np
+
+
+def face_key(face):
+    """Content hash of a uint8 face crop (shape included)."""
+    face = np.ascontiguousarray(face, dtype=np.uint8)
+    digest = hashlib.blake2b(str(face.shape).encode(), digest_size=16)
+    digest.update(face.data)
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """Thread-safe LRU cache with an optional time-to-live per entry.
+
+    Entries belong to a version (e.g. FaceMatcher.version, which changes when
+    the weights or the gallery change); validate() with a new version drops
+    everything. hits / misses / evictions (LRU) / expirations (TTL) /
+    invalidations are counted; stats() returns them.
+    """
+
+    def __init__(self, max_size=100000, ttl=None, clock=time.monotonic):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.clock = clock
+        self.version = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def validate(self, version):
+        """Drop every entry if version differs from the one they were computed for."""
+        with self._lock:
+            if version != self.version:
+                if self._entries:
+                    self.invalidations += 1
+                self._entries.clear()
+                self.version = version
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            value, expires = entry
+            if expires is not None and self.clock() >= expires:
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        expires = None if self.ttl is None else self.clock() + self.ttl
+        with self._lock:
+            self._entries[key] = (value, expires)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        return {'size': len(self._entries), 'hits': self.hits, 'misses': self.misses,
+                'evictions': self.evictions, 'expirations': self.expirations,
+                'invalidations': self.invalidations}
@@ -0,0 +1,228 @@
+import sys
+import time
+import queue
+import threading
+from concurrent.futures import Future, TimeoutError
+import numpy as np
+import cv2
+from flask import Flask, Response, request, jsonify
+
+import dataset
+import profiling
+from enroll import extract_face
+from detection import FaceDetector
+from result_cache import ResultCache
+
+# -----------------------------
+# Settings
+# -----------------------------
+port = 5001
+# a batch is run when it has max_batch faces or its first face has waited max_wait seconds
+max_batch = 32
+max_wait = 0.005
+# uploads accepted but not yet matched; beyond this requests get 503
+max_queue = 256
+request_timeout = 10.
+verify_threshold = 0.5
+# cached /verify results per (face crop, gallery photo); dropped on retrain / enrollment
+cache_size = 100000
+cache_ttl = 3600.
+cascade_path = 'haarcascade_frontalface_default.xml'
+# per-stage timings at /metrics (Prometheus text) and /metrics.json
+profile = True
+
+
+class MicroBatcher:
+    """Merges items submitted from many threads into batched calls of function.
+
+    function takes a list of items and returns one result per item. A worker
+    thread takes the first waiting item, keeps collecting until it has
+    max_batch of them or max_wait seconds have passed, and runs them as one
+    call. At most max_queue items wait at a time; submit() raises queue.Full
+    beyond that.
+    """
+
+    _stop = object()
+
+    def __init__(self, function, max_batch=max_batch, max_wait=max_wait, max_queue=max_queue):
+        self.function = function
+        self.max_batch = max(1, max_batch)
+        self.max_wait = max_wait
+        self.batches = 0
+        self.items = 0
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._thread = threading.Thread(target=self._run, name='micro-batcher', daemon=True)
+        self._thread.start()
+
+    def submit(self, item):
+        """Queue item; returns a Future with its result."""
+        future = Future()
+        self._queue.put_nowait((item, future))
+        return future
+
+    def __call__(self, item, timeout=None):
+        return self.submit(item).result(timeout)
+
+    def _collect(self):
+        first = self._queue.get()
+        if first is self._stop:
+            return None
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is self._stop:
+                self._queue.put(self._stop)
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            if batch is None:
+                return
+            items, futures = zip(*batch)
+            self.batches += 1
+            self.items += len(items)
+            try:
+                results = self.function(list(items))
+            except Exception as er:
+                for future in futures:
+                    future.set_exception(er)
+                continue
+            for future, result in zip(futures, results):
+                future.set_result(result)
+
+    def close(self):
+        self._queue.put(self._stop)
+        self._thread.join()
+
+
+# -----------------------------
+# Service
+# -----------------------------
+def decode_face(data, detector=None, size=dataset.IMAGE_SIZE):
+    """size x size uint8 face from encoded image bytes; photos that are not a crop go through extract_face."""
+    with profiling.stage('imdecode'):
+        image = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_GRAYSCALE)
+    if image is None:
+        raise ValueError('not an image')
+    if image.shape == (size, size) or detector is None:
+        return dataset.to_face(image, size)
+    face = extract_face(image, detector, size)
+    if face is None:
+        raise ValueError('no face found')
+    return face
+
+
+def create_app(matcher, detector=None, max_batch=max_batch, max_wait=max_wait, max_queue=max_queue,
+               threshold=verify_threshold, timeout=request_timeout):
+    """Flask app with POST /identify and /verify around a resident inference.FaceMatcher.
+
+    Faces of concurrent requests are matched in one batched forward pass. The
+    batcher is app.batcher.
+    """
+    app = Flask(__name__)
+
+    @profiling.timed('match_batch')
+    def match(items):
+        # items are (face, None) for /identify, (face, subject) for /verify
+        results = [None] * len(items)
+        identify = [n for n, (_, subject) in enumerate(items) if subject is None]
+        if identify:
+            unique, scores = matcher.subject_scores(np.stack([items[n][0] for n in identify]))
+            for n, row in zip(identify, scores):
+                results[n] = (unique, row)
+        verify = [n for n, (_, subject) in enumerate(items) if subject is not None]
+        if verify:
+            # one pass over every (face, photo of its subject) pair; matcher.cache skips stored pairs
+            scores = matcher.verify_many(np.stack([items[n][0] for n in verify]),
+                                         [items[n][1] for n in verify])
+            for n, score in zip(verify, scores):
+                results[n] = float(score)
+        return results
+
+    batcher = MicroBatcher(match, max_batch, max_wait, max_queue)
+    app.batcher = batcher
+    # the detector's memo / last faces are not shared safely between request threads
+    detector_lock = threading.Lock()
+
+    def match_upload(subject=None):
+        upload = request.files.get('image')
+        data = upload.read() if upload is not None else request.get_data()
+        with detector_lock:
+            face = decode_face(data, detector)
+        return batcher((face, subject), timeout)
+
+    def handle(view):
+        def wrapped():
+            try:
+                return view()
+            except queue.Full:
+                return jsonify(error='too many requests in flight'), 503
+            except TimeoutError:
+                return jsonify(error='timed out waiting for a batch'), 504
+            except ValueError as er:
+                return jsonify(error=str(er)), 400
+        wrapped.__name__ = view.__name__
+        return wrapped
+
+    @app.route('/identify', methods=['POST'])
+    @handle
+    def identify():
+        k = int(request.args.get('k', 1))
+        unique, row = match_upload()
+        top = np.argsort(-row, kind='stable')[:k]
+        return jsonify(matches=[{'subject': int(unique[j]), 'name': matcher.name(unique[j]),
+                                 'score': float(row[j])} for j in top])
+
+    @app.route('/verify', methods=['POST'])
+    @handle
+    def verify():
+        subject = request.args.get('subject', request.form.get('subject'))
+        if subject is None:
+            raise ValueError('subject is required')
+        subject = int(subject)
+        if not np.any(matcher.subjects == subject):
+            return jsonify(error='unknown subject %d' % subject), 404
+        score = match_upload(subject)
+        return jsonify(subject=subject, name=matcher.name(subject), score=score,
+                       match=score >= threshold)
+
+    @app.route('/stats')
+    def stats():
+        cache = matcher.cache.stats() if matcher.cache is not None else None
+        return jsonify(batches=batcher.batches, items=batcher.items,
+                       queued=batcher._queue.qsize(), cache=cache)
+
+    @app.route('/metrics')
+    def metrics():
+        return Response(profiling.profiler.to_prometheus(), mimetype='text/plain; version=0.0.4')
+
+    @app.route('/metrics.json')
+    def metrics_json():
+        return jsonify(stages=profiling.profiler.snapshot())
+
+    return app
+
+
+if __name__ == '__main__':
+    import inference
+    from network import Network
+    try:
+        network = inference.load_network()
+    except OSError as er:
+        print(er, '\n⚠️ Model weights not found. Using random weights.')
+        np.random.seed(0)
+        network = Network()
+    profiling.enable(profile)
+    matcher = inference.FaceMatcher(network, precision='float32',
+                                    cache=ResultCache(cache_size, cache_ttl))
+    detector = FaceDetector(cv2.CascadeClassifier(cascade_path), track=False)
+    app = create_app(matcher, detector)
+    app.run(port=int(sys.argv[1]) if len(sys.argv) > 1 else port, threaded=True)
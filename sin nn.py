@@ -1,6 +1,7 @@
 import numpy as np
 import random ,math
 import matplotlib.pyplot as plt
+from random_search import RandomSearch
 
 random.seed(0)
 np.random.seed(0)
@@ -103,12 +104,9 @@ loss_function = Loss_C2()
 
 
 best_loss =99999
-best_layer1_weights = layer1.weights.copy()
-best_layer1_biases  = layer1.biases.copy()
-best_layer2_weights = layer2.weights.copy()
-best_layer2_biases  = layer2.biases.copy() 
-best_layer3_weights = layer3.weights.copy()
-best_layer3_biases  = layer3.biases.copy() 
+# one float32 buffer for all weights; rejected steps are undone in place
+search = RandomSearch([layer1, layer2, layer3], seed=0)
+data = np.array(data, dtype=np.float32)
 
 
 lr = 0.5
@@ -117,12 +115,7 @@ train_count = 1000
 
 for i in range(train_count):
     
-    layer1.weights += rv * np.random.rand(1,10)-rv/2
-    layer1.biases  += rv * np.random.rand(1,10)-rv/2
-    layer2.weights += rv * np.random.rand(10,10)-rv/2
-    layer2.biases  += rv * np.random.rand(1,10)-rv/2
-    layer3.weights += rv * np.random.rand(10,1)-rv/2
-    layer3.biases  += rv * np.random.rand(1,1)-rv/2
+    search.perturb(rv)
     
     layer1.forward(data)
     activation1.forward(layer1.output)
@@ -145,21 +138,10 @@ for i in range(train_count):
         print('rv : ' , rv,'\n')
         rv= lr
         #print('acc:',acc)
-        best_layer1_weights = layer1.weights.copy()
-        best_layer1_biases  = layer1.biases.copy()
-        best_layer2_weights = layer2.weights.copy()
-        best_layer2_biases  = layer2.biases.copy()         
-        best_layer3_weights = layer3.weights.copy()
-        best_layer3_biases  = layer3.biases.copy()         
         best_loss = loss
     else:
         rv -= rv/40
-        layer1.weights = best_layer1_weights.copy()
-        layer1.biases  = best_layer1_biases.copy()
-        layer2.weights = best_layer2_weights.copy()
-        layer2.biases  = best_layer2_biases.copy()
-        layer3.weights = best_layer3_weights.copy()
-        layer3.biases  = best_layer3_biases.copy()
+        search.undo()
 
 
 
@@ -1,20 +1,13 @@
 import cv2
 import tkinter.filedialog
-def extract_face(image, cascade):
-    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-    faces = cascade.detectMultiScale(gray, 1.3, 5)
-
-    if len(faces) == 0:
-        return None
-
-    x, y, w, h = max(faces, key=lambda f: f[2] * f[3])
-    roi_gray = gray[y:y+h, x:x+w]
-    return cv2.resize(roi_gray, (50, 50))
+# headless / batch enrollment: python enroll.py <folder or glob>
+from enroll import extract_face
+from detection import FaceDetector
 
 
 camera_input = False
 
-face_cascade = cv2.CascadeClassifier('haarcascade_frontalface_default.xml')
+face_cascade = FaceDetector(cv2.CascadeClassifier('haarcascade_frontalface_default.xml'))
 
 if not camera_input:
     filename = tkinter.filedialog.askopenfilename()
@@ -31,20 +24,12 @@ if not camera_input:
 
     # Process the image
     try:
-        if len(frame.shape) == 2 or (len(frame.shape) == 3 and frame.shape[2] == 1):
-            gray = frame
-        else:
-            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-        faces = face_cascade.detectMultiScale(gray, 1.3, 5)
+        # largest face in the picture
+        output = extract_face(frame, face_cascade)
 
-        if len(faces) == 0:
+        if output is None:
             print('no face')
         else:
-            for (x, y, w, h) in faces:
-                roi_gray = gray[y:y+h, x:x+w]
-
-            # resize image
-            output = cv2.resize(roi_gray, (50, 50))
             cv2.imwrite(filename='subjects_photos/' + input('file number (1~100)?') + '.png', img=output)
             print("Image saved.")
     except Exception as er:
@@ -79,14 +64,10 @@ else:
 
             if key == ord('s'):
                 try:
-                    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-                    faces = face_cascade.detectMultiScale(gray, 1.3, 5)
-
-                    for (x, y, w, h) in faces:
-                        roi_gray = gray[y:y+h, x:x+w]
-
-                    # resize image
-                    output = cv2.resize(roi_gray, (50, 50))
+                    output = extract_face(frame, face_cascade)
+                    if output is None:
+                        print('no face')
+                        continue
                     cv2.imwrite(filename='subjects_photos/' + input('file number (1~100)?') + '.png', img=output)
                     print("Image saved.")
                 except Exception as er:
@@ -1,6 +1,7 @@
-import matplotlib.pyplot as plt
 import numpy as np
-import random, os, cv2, time, pygame, tkinter.filedialog
+import random, os, cv2, time, tkinter.filedialog
+import image_cache, inference
+from network import Network
 
 np.random.seed(0)
 random.seed(0)
@@ -22,7 +23,7 @@ if not os.path.exists(folder):
     print("❌ Folder not found:", folder)
     exit()
 
-list_dir = os.listdir(folder)
+gallery, list_dir, subjects, photos = image_cache.load_images(folder, workers=os.cpu_count())
 print("Photos:", list_dir)
 print("Total photos:", len(list_dir))
 
@@ -51,20 +52,13 @@ if not os.path.exists(cascade_path):
 
 face_cascade = cv2.CascadeClassifier(cascade_path)
 
-# -----------------------------
-# Data containers
-# -----------------------------
-data = []
-y = []
+query = None
 
 # -----------------------------
 # Load photos function
 # -----------------------------
 def load_photos():
-    global data, y, frame
-
-    data = []
-    labels = []
+    global frame, query
 
     # Reload frame
     if camera_input:
@@ -81,36 +75,7 @@ def load_photos():
         face_roi = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
     else:
         face_roi = frame
-    face_roi = cv2.resize(face_roi, (50, 50))
-
-    # -----------------------------
-    # Build dataset
-    # -----------------------------
-    for fname in list_dir:
-        img_path = os.path.join(folder, fname)
-        image1 = cv2.imread(img_path)
-
-        if image1 is None:
-            print("⚠️ Could not read:", fname)
-            continue
-
-        image1 = cv2.resize(image1, (50, 50))
-        photodata = []
-
-        # Subject image pixels
-        for j in range(50):
-            for k in range(50):
-                photodata.append(image1[j][k][0] / 255.0)
-
-        # Detected face pixels
-        for j in range(50):
-            for k in range(50):
-                photodata.append(face_roi[j][k] / 255.0)
-
-        data.append(photodata)
-        labels.append(0)
-
-    y = np.array(labels)
+    query = cv2.resize(face_roi, (50, 50))
     return True
 
 # Initial load
@@ -118,91 +83,28 @@ if not load_photos():
     print("❌ Cannot continue without face detection.")
     exit()
 
-print("Dataset size:", len(data))
-
-def predict(model_layers, X):
-    l1, a1, l2, a2, l3, a3, l4, a4 = model_layers
-
-    l1.forward(X)
-    a1.forward(l1.output)
-
-    l2.forward(a1.output)
-    a2.forward(l2.output)
-
-    l3.forward(a2.output)
-    a3.forward(l3.output)
-
-    l4.forward(a3.output)
-    a4.forward(l4.output)
-
-    return a4.output
-# -----------------------------
-# Neural Network
-# -----------------------------
-class Layer:
-    def __init__(self, n_inputs, n_neurons):
-        self.weights = 0.1 * np.random.rand(n_inputs, n_neurons) - 0.05
-        self.biases = np.zeros((1, n_neurons))
-
-    def forward(self, inputs):
-        self.output = np.dot(inputs, self.weights) + self.biases
-
-
-class ActivationReLU:
-    def forward(self, inputs):
-        self.output = np.maximum(0, inputs)
-
-
-class ActivationSoftmax:
-    def forward(self, inputs):
-        exp_values = np.exp(inputs - np.max(inputs, axis=1, keepdims=True))
-        self.output = exp_values / np.sum(exp_values, axis=1, keepdims=True)
-
-
-# -----------------------------
-# Build network
-# -----------------------------
-layer1 = Layer(5000, 500)
-layer2 = Layer(500, 50)
-layer3 = Layer(50, 10)
-layer4 = Layer(10, 2)
-
-activation1 = ActivationReLU()
-activation2 = ActivationReLU()
-activation3 = ActivationReLU()
-activation4 = ActivationSoftmax()
+# subject photos come decoded from the memory-mapped cache; the query is paired with them in the matcher
+print("Gallery size:", len(gallery))
 
 # -----------------------------
 # Load saved weights (optional)
 # -----------------------------
 try:
-    layer1.weights = np.load(model_folder + '/best_layer1_weights'+model_name_load+'.npy')
-    layer1.biases  = np.load(model_folder + '/best_layer1_biases'+model_name_load+'.npy')
-    layer2.weights = np.load(model_folder + '/best_layer2_weights'+model_name_load+'.npy')
-    layer2.biases  = np.load(model_folder + '/best_layer2_biases'+model_name_load+'.npy')
-    layer3.weights = np.load(model_folder + '/best_layer3_weights'+model_name_load+'.npy')
-    layer3.biases  = np.load(model_folder + '/best_layer3_biases'+model_name_load+'.npy')
-    layer4.weights = np.load(model_folder + '/best_layer4_weights'+model_name_load+'.npy')
-    layer4.biases  = np.load(model_folder + '/best_layer4_biases'+model_name_load+'.npy')
+    # memory-mapped: the first layer is only paged in when it is used
+    network = inference.load_network(model_folder, model_name_load)
     print("✅ Model weights loaded.")
-except:
+except Exception:
     print("⚠️ Model weights not found. Using random weights.")
+    network = Network()
 
 # -----------------------------
 # Single prediction
 # -----------------------------
-layer1.forward(data)
-activation1.forward(layer1.output)
-
-layer2.forward(activation1.output)
-activation2.forward(layer2.output)
-
-layer3.forward(activation2.output)
-activation3.forward(layer3.output)
-
-layer4.forward(activation3.output)
-activation4.forward(layer4.output)
+# the subject half of layer1 is computed once per gallery photo
+matcher = inference.FaceMatcher(network, gallery, subjects, names)
+probabilities = matcher.engine.scores(query)
 
-predictions = np.argmax(activation4.output, axis=1)
+predictions = np.argmax(probabilities, axis=1)
 print("Predictions for each subject:", predictions)
+print("Best matches:", matcher.identify(query, k=3)[0])
 print("Program completed.")
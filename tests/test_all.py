@@ -1,11 +1,17 @@
 import importlib.util
+import io
 import os
+import queue
+import time
+import sys
 import numpy as np
 import builtins
+import tempfile
 import cv2
 import tkinter.filedialog
 
 ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, ROOT)
 
 # -----------------------------
 # SAFETY PATCHES
@@ -34,6 +40,11 @@ def safe_range(*args):
 builtins.range = safe_range
 
 
+# Keep the image cache of the fake images out of the project cache
+import image_cache
+image_cache.CACHE_FOLDER = tempfile.mkdtemp()
+
+
 # -----------------------------
 # Safe module loader
 # -----------------------------
@@ -86,9 +97,1127 @@ def test_training_build_dataset_shape():
     assert X.shape == (1, 5000)
 
 
+# =============================
+# dataset.py tests
+# =============================
+import dataset
+
+
+def test_dataset_parse_name():
+    assert dataset.parse_name("m12-3.png") == (12, 3)
+    assert dataset.parse_name("7.png") == (7, 0)
+    assert dataset.parse_name("image_metadata.csv") == (-1, -1)
+
+
+def test_dataset_sample_pairs_labels_match_subjects():
+    subjects = np.repeat(np.arange(10), 7)
+    idx1, idx2, y = dataset.sample_pairs(subjects, 500, rng=0)
+    assert np.all(idx1 != idx2)
+    assert np.array_equal(subjects[idx1] == subjects[idx2], y == 1)
+
+
+def test_dataset_pair_matrix_matches_per_pixel_loop():
+    images = np.random.randint(0, 256, (4, 50, 50), dtype=np.uint8)
+    X = dataset.pair_matrix(images, np.array([0, 2]), np.array([1, 3]))
+    assert X.shape == (2, 5000) and X.dtype == np.float32
+    expected = np.concatenate([images[2].ravel(), images[3].ravel()]) / 255
+    assert np.allclose(X[1], expected)
+
+
+def test_dataset_balanced_pair_batches_stream_on_demand():
+    subjects = np.repeat([1, 2, 3, 5], [3, 1, 4, 2])
+    images = np.arange(10, dtype=np.uint8)[:, None, None] * np.ones((1, 50, 50), dtype=np.uint8)
+    batches = dataset.iter_pair_batches(images, subjects, batch_size=8, batches=5, rng=0, reuse=True)
+
+    buffers = set()
+    for X, y in batches:
+        assert X.shape == (8, 5000) and X.dtype == np.float32
+        assert y.sum() == 4
+        first, second = np.rint(X[:, 0] * 255).astype(int), np.rint(X[:, 2500] * 255).astype(int)
+        assert np.array_equal(subjects[first] == subjects[second], y == 1)
+        assert np.all(first != second)
+        buffers.add(id(X))
+    assert len(buffers) == 1
+
+
+# =============================
+# image_cache.py tests
+# =============================
+def test_image_cache_decodes_only_changed_files(tmp_path, monkeypatch):
+    folder = tmp_path / "photos"
+    folder.mkdir()
+    for name in ("m1-1.png", "m1-2.png", "m2-1.png"):
+        (folder / name).write_bytes(b"png")
+
+    calls = []
+    def fake_imread(path, *args):
+        calls.append(os.path.basename(path))
+        return np.full((60, 60, 3), len(calls), dtype=np.uint8)
+    monkeypatch.setattr(cv2, "imread", fake_imread)
+
+    images, files, subjects, photos = image_cache.load_images(str(folder), str(tmp_path / "cache"))
+    assert images.shape == (3, 50, 50) and images.dtype == np.uint8
+    assert list(subjects) == [1, 1, 2] and list(photos) == [1, 2, 1]
+    assert len(calls) == 3
+
+    images, _, _, _ = image_cache.load_images(str(folder), str(tmp_path / "cache"))
+    assert isinstance(images, np.memmap)
+    assert len(calls) == 3
+
+    (folder / "m1-2.png").write_bytes(b"changed png")
+    images, index = image_cache.update(str(folder), str(tmp_path / "cache"))
+    assert calls[3:] == ["m1-2.png"]
+    assert index["width"][1] == 60 and images[1, 0, 0] == 4 and images[0, 0, 0] == 1
+
+
+# =============================
+# network.py tests
+# =============================
+import network
+
+
+def test_network_backward_matches_numerical_gradient():
+    np.random.seed(0)
+    net = network.Network(sizes=(6, 5, 4, 2))
+    X = np.random.rand(8, 6)
+    y = np.random.randint(0, 2, 8)
+    net.train_step(X, y, network.Optimizer_SGD(learning_rate=0))
+
+    W = net.layers[1].weights
+    i, j, eps = 2, 1, 1e-6
+    W[i, j] += eps
+    loss_plus, _ = net.loss(X, y)
+    W[i, j] -= 2 * eps
+    loss_minus, _ = net.loss(X, y)
+    W[i, j] += eps
+    assert np.isclose(net.layers[1].dweights[i, j], (loss_plus - loss_minus) / (2 * eps), atol=1e-8)
+
+
+def test_network_fit_learns_separable_pairs():
+    np.random.seed(0)
+    X = np.random.rand(200, 20)
+    y = (X[:, 0] > X[:, 1]).astype(int)
+    net = network.Network(sizes=(20, 16, 2))
+    history = net.fit(X, y, epochs=60, batch_size=32, optimizer=network.Optimizer_Adam(0.01),
+                      rng=0, print_every=0)
+    assert history[-1][1] < history[0][1]
+    assert net.loss(X, y)[1] > 0.9
+
+
+def test_network_fit_generator_consumes_steps_per_epoch():
+    np.random.seed(0)
+    X = np.random.rand(64, 20)
+    y = (X[:, 0] > X[:, 1]).astype(int)
+    drawn = []
+
+    def batches():
+        while True:
+            drawn.append(1)
+            yield X[:16], y[:16]
+
+    net = network.Network(sizes=(20, 8, 2))
+    history = net.fit_generator(batches(), steps_per_epoch=3, epochs=4, print_every=0)
+    assert len(history) == 4 and len(drawn) == 12
+
+
+# =============================
+# random_search.py tests
+# =============================
+import subprocess
+from random_search import RandomSearch, PopulationSearch
+
+
+def test_random_search_layers_are_views_of_one_buffer():
+    net = network.Network(sizes=(6, 5, 2))
+    weights = net.layers[0].weights.copy()
+    search = RandomSearch(net.layers, seed=0)
+    assert net.layers[0].weights.dtype == np.float32
+    assert np.shares_memory(net.layers[0].weights, search.params)
+    assert np.shares_memory(net.layers[1].biases, search.params)
+    assert np.allclose(net.layers[0].weights, weights)
+
+
+def test_random_search_undo_restores_parameters_in_place():
+    net = network.Network(sizes=(6, 5, 2))
+    search = RandomSearch(net.layers, seed=0)
+    before = search.params.copy()
+    noise = search.noise
+    search.perturb(0.1)
+    assert not np.allclose(search.params, before)
+    assert np.all(np.abs(search.params - before) <= 0.05 + 1e-6)
+    search.undo()
+    assert np.allclose(search.params, before, atol=1e-6)
+    assert search.noise is noise
+
+
+def _population_run(workers, update):
+    np.random.seed(0)
+    net = network.Network(sizes=(6, 5, 2))
+    rng = np.random.default_rng(0)
+    X = rng.random((40, 6))
+    y = (X[:, 0] > 0.5).astype(int)
+    with PopulationSearch(net.layers, X, y, population=4, workers=workers, sigma=0.05,
+                          seed=3, update=update, lr=0.05) as search:
+        start, _ = search.evaluate()
+        best = search.run(5)
+    return start, best, net.layers[0].weights
+
+
+def test_population_search_is_deterministic_across_worker_counts():
+    for update in ("best", "es"):
+        start, best, weights = _population_run(0, update)
+        _, best2, weights2 = _population_run(2, update)
+        assert best == best2 and np.array_equal(weights, weights2)
+        assert best <= start
+    # close() moved the layers out of the unlinked shared memory
+    assert np.isfinite(weights).all()
+
+
+def test_population_search_close_keeps_earlier_views_readable():
+    # a dangling view used to crash the interpreter, so read it in a child process
+    code = (
+        "import sys; sys.path.insert(0, %r)\n"
+        "import gc, numpy as np, network, random_search\n"
+        "net = network.Network(sizes=(6, 5, 2))\n"
+        "X = np.random.rand(20, 6); y = (X[:, 0] > 0.5).astype(int)\n"
+        "search = random_search.PopulationSearch(net.layers, X, y, population=2, workers=0)\n"
+        "view = net.layers[0].weights\n"
+        "search.close()\n"
+        "assert np.array_equal(view, net.layers[0].weights) and len(random_search._lingering) == 1\n"
+        "del view; gc.collect()\n"
+        "random_search.PopulationSearch(net.layers, X, y, population=2, workers=0).close()\n"
+        "assert not random_search._lingering\n" % ROOT)
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
+
+
+# =============================
+# inference.py tests
+# =============================
+import inference
+
+
+def test_gallery_engine_matches_full_pair_forward():
+    np.random.seed(0)
+    net = network.Network(sizes=(5000, 40, 10, 2))
+    gallery = np.random.randint(0, 256, (7, 50, 50), dtype=np.uint8)
+    queries = np.random.randint(0, 256, (3, 50, 50), dtype=np.uint8)
+    engine = inference.GalleryEngine(net, gallery)
+
+    scores = engine.scores(queries)
+    assert scores.shape == (3, 7, 2)
+    for q in range(3):
+        faces = np.concatenate([gallery, queries[q][None]])
+        X = dataset.pair_matrix(faces, np.arange(7), np.full(7, 7))
+        expected = net.forward(X)
+        assert np.allclose(scores[q], expected, rtol=0, atol=1e-12)
+        assert np.allclose(engine.scores(queries[q]), expected, rtol=0, atol=1e-12)
+
+
+def test_face_matcher_identify_top_k_by_subject():
+    np.random.seed(0)
+    net = network.Network(sizes=(5000, 20, 2))
+    gallery = np.random.randint(0, 256, (5, 50, 50), dtype=np.uint8)
+    matcher = inference.FaceMatcher(net, gallery, subjects=[1, 1, 2, 3, 3], names={1: "a", 2: "b"})
+
+    queries = np.random.randint(0, 256, (4, 50, 50), dtype=np.uint8)
+    scores = matcher.score(queries)
+    assert scores.shape == (4, 5)
+    assert matcher.score(queries[0]).shape == (5,)
+
+    results = matcher.identify(queries, k=2)
+    assert len(results) == 4 and all(len(r) == 2 for r in results)
+    per_subject = {"a": scores[0, :2].max(), "b": scores[0, 2], "3": scores[0, 3:].max()}
+    best = max(per_subject, key=per_subject.get)
+    assert results[0][0] == (best, per_subject[best])
+
+
+# =============================
+# quantize.py tests
+# =============================
+import quantize
+
+
+def test_quantized_layer_matches_float_layer():
+    np.random.seed(0)
+    layer = network.Layer(1200, 30)
+    X = np.random.rand(4, 1200)
+    layer.forward(X)
+    qlayer = quantize.QuantizedLayer(layer)
+    qlayer.forward(X)
+    assert qlayer.q.dtype == np.int8 and qlayer.nbytes < layer.weights.nbytes / 4
+    assert np.allclose(qlayer.output, layer.output, atol=0.01)
+    assert np.allclose(qlayer.dot(X[:, 600:], 600, 1200), X[:, 600:] @ qlayer.weights[600:], atol=1e-4)
+
+
+def test_face_matcher_reduced_precision_tracks_float64():
+    np.random.seed(0)
+    net = network.Network(sizes=(5000, 20, 2))
+    gallery = np.random.randint(0, 256, (5, 50, 50), dtype=np.uint8)
+    queries = np.random.randint(0, 256, (3, 50, 50), dtype=np.uint8)
+    reference = inference.FaceMatcher(net, gallery).score(queries)
+    for precision in ("float32", "int8"):
+        matcher = inference.FaceMatcher(net, gallery, precision=precision)
+        assert matcher.score(queries).dtype == np.float32
+        assert np.allclose(matcher.score(queries), reference, atol=1e-3)
+
+
+# =============================
+# model_io.py tests
+# =============================
+import model_io
+
+
+def _params():
+    np.random.seed(0)
+    return [(np.random.rand(6, 4), np.random.rand(1, 4)), (np.random.rand(4, 2), np.zeros((1, 2)))]
+
+
+def test_model_io_round_trip_is_memory_mapped(tmp_path):
+    path = str(tmp_path / "m.model")
+    params = _params()
+    model_io.save_model(path, params, loss=0.25)
+    assert os.listdir(tmp_path) == ["m.model"]
+
+    loaded, meta = model_io.load_model(path)
+    assert meta == {"loss": 0.25}
+    assert isinstance(loaded[0][0], np.memmap)
+    for (w, b), (lw, lb) in zip(params, loaded):
+        assert np.array_equal(w, lw) and np.array_equal(b, lb)
+
+    loaded, _ = model_io.load_model(path, mmap=False)
+    loaded[0][0][0, 0] = 1.0
+
+
+def test_model_io_converts_legacy_layout(tmp_path):
+    params = _params() * 2
+    arrays, loss_path = model_io.legacy_paths(str(tmp_path), "x")
+    for path, array in zip(arrays, [a for pair in params for a in pair]):
+        np.save(path, array)
+    with open(loss_path, "w") as f:
+        f.write("7.5")
+
+    loaded, meta = model_io.load(str(tmp_path), "x")
+    assert meta["loss"] == 7.5 and len(loaded) == 4
+    path = model_io.convert_legacy(str(tmp_path), "x")
+    assert path == model_io.model_path(str(tmp_path), "x")
+    converted, meta = model_io.load(str(tmp_path), "x")
+    assert isinstance(converted[0][0], np.memmap) and meta["loss"] == 7.5
+    assert all(np.array_equal(a[0], b[0]) for a, b in zip(loaded, converted))
+
+
+# =============================
+# checkpoint.py tests
+# =============================
+from checkpoint import CheckpointWriter
+
+
+def test_checkpoint_writer_collapses_queued_snapshots(tmp_path):
+    path = str(tmp_path / "m.model")
+    params = _params()
+    with CheckpointWriter(path, min_interval=60, keep=3) as writer:
+        for n in range(5):
+            params[0][0][0, 0] = n
+            assert writer.submit(params, loss=1.0 - n / 10, acc=n / 10)
+        writer.flush()
+        assert writer.written <= 2 and writer.written + writer.dropped == 5
+
+    loaded, meta = model_io.load_model(path)
+    assert loaded[0][0][0, 0] == 4
+    assert meta["loss"] == 0.6 and meta["acc"] == 0.4
+
+
+def test_checkpoint_writer_policy_and_rotation(tmp_path):
+    path = str(tmp_path / "m.model")
+    params = _params()
+    with CheckpointWriter(path, min_delta=0.05, keep=2) as writer:
+        for loss in (0.9, 0.88, 0.8, 0.7, 0.6):
+            writer.submit(params, loss=loss)
+            writer.flush()
+        assert not writer.submit(params, loss=0.59)
+        history = writer.history()
+    assert [meta["loss"] for _, meta in history] == [0.6, 0.7]
+    assert sorted(os.listdir(tmp_path)) == ["m.model", "m.model.1"]
+
+
+# =============================
+# loader.py tests
+# =============================
+import loader
+
+
+def test_loader_decode_files_into_shared_memory(monkeypatch):
+    # workers are forked, so they see the patched cv2.imread
+    monkeypatch.setattr(loader.cv2, "imread",
+                        lambda path: None if path.endswith("bad.png")
+                        else np.full((60, 40, 3), int(path[0]), dtype=np.uint8))
+    paths = ["%d.png" % (n % 10) for n in range(10)] + ["bad.png"]
+    images, dims = loader.decode_files(paths, workers=2, chunk_size=3)
+    assert images.shape == (11, 50, 50) and images.dtype == np.uint8
+    assert [int(im[0, 0]) for im in images] == [n % 10 for n in range(10)] + [0]
+    assert dims == [(60, 40)] * 10 + [(0, 0)]
+
+
+def test_loader_prefetcher_yields_items_then_errors():
+    def items():
+        yield from range(5)
+        raise ValueError("boom")
+
+    prefetched = loader.Prefetcher(items(), depth=2)
+    assert [next(prefetched) for _ in range(5)] == list(range(5))
+    try:
+        next(prefetched)
+    except ValueError as er:
+        assert str(er) == "boom"
+    else:
+        raise AssertionError("error was not re-raised")
+
+
+def test_loader_prefetcher_context_manager_stops_the_thread():
+    def forever():
+        n = 0
+        while True:
+            yield n
+            n += 1
+
+    with loader.Prefetcher(forever(), depth=2) as prefetched:
+        assert next(prefetched) == 0
+    assert not prefetched._thread.is_alive()
+
+
+def test_loader_prefetcher_closes_when_the_queue_is_full_at_the_end():
+    def then_fail():
+        yield from range(2)
+        raise ValueError("boom")
+
+    # depth items fill the queue, so the end marker (or the error) cannot be queued
+    for items in (range(2), then_fail()):
+        prefetched = loader.Prefetcher(items, depth=2)
+        time.sleep(0.3)
+        closer = threading.Thread(target=prefetched.close, daemon=True)
+        closer.start()
+        closer.join(2)
+        assert not closer.is_alive()
+
+
+# =============================
+# live.py tests
+# =============================
+import live
+
+
+def _video(path, frames=12):
+    writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*"MJPG"), 30, (160, 120))
+    for n in range(frames):
+        frame = np.zeros((120, 160, 3), dtype=np.uint8)
+        frame[20 + n:80 + n, 40:100] = 200
+        writer.write(frame)
+    writer.release()
+    return str(path)
+
+
+class _CountingMatcher:
+    def __init__(self):
+        self.batches = []
+
+    def identify(self, faces, k=1):
+        self.batches.append(faces.shape)
+        return [[("sol", 0.9)] for _ in faces]
+
+
+def test_live_grabber_reads_video_file_in_place_of_camera(tmp_path):
+    path = _video(tmp_path / "clip.avi")
+    with live.FrameGrabber(path, realtime=False) as grabber:
+        indices = []
+        while True:
+            item = grabber.read(timeout=5)
+            if item is None:
+                break
+            indices.append(item[0])
+            assert item[1].shape == (120, 160, 3)
+    assert indices == sorted(set(indices)) and indices[-1] == 11
+    assert grabber.captured == 12 and grabber.dropped == 12 - len(indices)
+
+
+def test_live_pipeline_detects_every_nth_frame_and_batches_crops(tmp_path):
+    path = _video(tmp_path / "clip.avi")
+    matcher = _CountingMatcher()
+
+    class TwoFaces:
+        def detectMultiScale(self, gray, *args):
+            assert gray.shape == (60, 80)  # detection runs on the half-size copy
+            return [(20, 10, 30, 30), (0, 0, 10, 10)]
+
+    pipeline = live.LivePipeline(matcher, TwoFaces(), detect_every=4, detect_scale=0.5)
+    with live.FrameGrabber(path, realtime=True) as grabber:
+        frames = pipeline.run(grabber, show=False, max_frames=9)
+    assert frames == 9 and pipeline.detections == 3
+    assert matcher.batches == [(2, 50, 50)] * 3
+    assert [t.box[2:] for t in pipeline.tracks] == [(60, 60), (20, 20)]
+    assert [t.name for t in pipeline.tracks] == ["sol", "sol"]
+    assert pipeline.draw(np.zeros((120, 160, 3), dtype=np.uint8)).any()
+
+
+def test_live_track_follows_moving_face():
+    gray = np.zeros((120, 160), dtype=np.uint8)
+    gray[30:60, 40:70] = np.arange(30, dtype=np.uint8)[:, None] * 8
+    track = live.Track((40, 30, 30, 30), gray)
+    moved = np.roll(np.roll(gray, 6, axis=0), -4, axis=1)
+    track.follow(moved)
+    assert track.box == (36, 36, 30, 30)
+
+
+# =============================
+# enroll.py tests
+# =============================
+import enroll
+
+
+def test_enroll_names_are_deterministic():
+    files = ["raw/bob/1.jpg", "raw/alice/2.jpg", "raw/m7/3.jpg", "raw/alice/1.jpg"]
+    assert enroll.assign_subjects(files, existing={1, 4}) == [9, 8, 7, 8]
+    assert enroll.assign_subjects(files, subject=3) == [3] * 4
+    assert enroll.target_names([5, 5, 2], folder="no-such-folder") == ["5-0.png", "5-1.png", "2-0.png"]
+
+
+def test_enroll_batch_updates_gallery_and_embeddings_incrementally(tmp_path, monkeypatch):
+    gallery = tmp_path / "gallery"
+    gallery.mkdir()
+    cv2.imwrite(str(gallery / "1.png"), np.zeros((50, 50), dtype=np.uint8))
+    for person, photos in (("alice", 2), ("bob", 1)):
+        (tmp_path / "raw" / person).mkdir(parents=True)
+        for n in range(photos):
+            (tmp_path / "raw" / person / ("%d.jpg" % n)).write_bytes(b"raw")
+
+    computed = []
+    embed = inference.gallery_embeddings
+    monkeypatch.setattr(inference, "gallery_embeddings",
+                        lambda net, faces: computed.append(len(faces)) or embed(net, faces))
+    np.random.seed(0)
+    net = network.Network()
+
+    results = enroll.enroll([str(tmp_path / "raw")], str(gallery), workers=0, network=net)
+    assert [os.path.basename(p) for _, p in results] == ["2-0.png", "2-1.png", "3-0.png"]
+    assert computed == [4]
+
+    (tmp_path / "raw2").mkdir()
+    (tmp_path / "raw2" / "c.jpg").write_bytes(b"raw")
+    results = enroll.enroll([str(tmp_path / "raw2" / "*.jpg")], str(gallery), subject=2,
+                            workers=0, network=net)
+    assert os.path.basename(results[0][1]) == "2-2.png"
+    assert computed == [4, 1]
+
+    matcher = inference.FaceMatcher(net, gallery_folder=str(gallery))
+    assert list(matcher.subjects) == [1, 2, 2, 2, 3]
+    assert computed == [4, 1, 0]
+    assert np.allclose(matcher.engine.gallery_part, embed(net, np.zeros((5, 50, 50), dtype=np.uint8)))
+
+
+# =============================
+# detection.py tests
+# =============================
+from detection import FaceDetector
+
+
+class _RecordingCascade:
+    def __init__(self, faces):
+        self.faces = faces
+        self.calls = []
+
+    def detectMultiScale(self, gray, scale, neighbors, **kwargs):
+        self.calls.append((gray.shape, kwargs))
+        return list(self.faces)
+
+
+def test_detector_searches_around_last_face_then_falls_back():
+    cascade = _RecordingCascade([(200, 100, 80, 80)])
+    detector = FaceDetector(cascade, memoize=False, full_every=3)
+    frame = np.zeros((480, 640), dtype=np.uint8)
+    assert detector.detectMultiScale(frame, 1.3, 5) == [(200, 100, 80, 80)]
+    assert cascade.calls[-1] == ((480, 640), {})
+
+    # ROI of the old box +-40 px, face size hinted to 56..104 px
+    cascade.faces = [(10, 5, 70, 70)]
+    assert detector.detectMultiScale(frame, 1.3, 5) == [(170, 65, 70, 70)]
+    assert cascade.calls[-1] == ((160, 160), {"minSize": (56, 56), "maxSize": (104, 104)})
+
+    cascade.faces = []
+    assert detector.detectMultiScale(frame, 1.3, 5) == []
+    assert [shape for shape, _ in cascade.calls[2:]] == [(140, 140), (480, 640)]
+    assert detector.full_scans == 2 and detector.roi_scans == 2
+
+
+def test_detector_memoizes_repeated_still_images():
+    cascade = _RecordingCascade([(0, 0, 50, 50)])
+    detector = FaceDetector(cascade, track=False, cache_size=1)
+    image = np.zeros((200, 200, 3), dtype=np.uint8)
+    faces = [enroll.extract_face(image, detector) for _ in range(3)]
+    assert all(face.shape == (50, 50) for face in faces)
+    assert len(cascade.calls) == 1 and detector.memo_hits == 2
+    enroll.extract_face(image + 1, detector)
+    enroll.extract_face(image, detector)
+    assert len(cascade.calls) == 3
+
+
+def test_detector_memo_keys_on_kwargs_and_skips_roi_results():
+    cascade = _RecordingCascade([(200, 100, 80, 80)])
+    detector = FaceDetector(cascade, track=False)
+    frame = np.zeros((480, 640), dtype=np.uint8)
+    detector.detectMultiScale(frame, 1.3, 5, minSize=(30, 30))
+    detector.detectMultiScale(frame, 1.3, 5, minSize=[30, 30])
+    assert len(cascade.calls) == 1
+    cascade.faces = []
+    assert detector.detectMultiScale(frame, 1.3, 5, minSize=(90, 90)) == []
+    assert cascade.calls[-1] == ((480, 640), {"minSize": (90, 90)})
+
+    # the ROI hit on the second frame is not stored, so a full scan of it later is not skipped
+    cascade.faces = [(200, 100, 80, 80)]
+    detector = FaceDetector(cascade)
+    other = frame + 1
+    detector.detectMultiScale(frame, 1.3, 5)
+    detector.detectMultiScale(other, 1.3, 5)
+    assert detector.roi_scans == 1
+    detector.reset()
+    detector.detectMultiScale(other, 1.3, 5)
+    assert detector.full_scans == 2 and detector.memo_hits == 0
+
+
+# =============================
+# gallery_index.py tests
+# =============================
+from gallery_index import IVFIndex
+
+
+def test_ivf_index_full_probe_matches_brute_force():
+    rng = np.random.default_rng(0)
+    centres = rng.normal(size=(8, 16))
+    vectors = centres[rng.integers(0, 8, 400)] + 0.1 * rng.normal(size=(400, 16))
+    index = IVFIndex(vectors[:300], n_lists=8, seed=0)
+    index.add(vectors[300:])
+    queries = rng.normal(size=(5, 16))
+
+    ids, sims = index.search(queries, 10, n_probe=8)
+    unit = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    exact = np.argsort(-(queries @ unit.T), axis=1)[:, :10]
+    assert np.array_equal(ids, exact)
+    assert np.all(np.diff(sims, axis=1) <= 0)
+
+    ids, _ = index.search(queries, 10, n_probe=1)
+    assert len(index) == 400 and ids.shape == (5, 10)
+
+
+def test_face_matcher_index_scores_only_candidates():
+    np.random.seed(0)
+    net = network.Network(sizes=(5000, 20, 10, 2))
+    rng = np.random.default_rng(0)
+    gallery = rng.integers(0, 256, (120, 50, 50), dtype=np.uint8)
+    subjects = np.arange(120) // 3
+    matcher = inference.FaceMatcher(net, gallery, subjects, index=True, candidates=12, n_probe=4)
+    assert matcher.index is not None and len(matcher.index) == 120
+
+    queries = gallery[[5, 50]]
+    ids, _ = matcher.index.search(matcher.engine.query_features(queries), 12)
+    pair = matcher.engine.pair_scores(queries, ids)
+    full = matcher.engine.scores(queries)
+    assert np.allclose(pair, np.take_along_axis(full, ids[..., None], axis=1))
+
+    for result, q_ids, q_pair in zip(matcher.identify(queries, k=3), ids, pair[..., 1]):
+        best = q_ids[np.argmax(q_pair)]
+        assert result[0] == (str(subjects[best]), float(q_pair.max()))
+        assert len(result) == len(set(name for name, _ in result)) == 3
+
+
+def test_face_matcher_index_keeps_subjects_that_share_a_name():
+    np.random.seed(0)
+    net = network.Network(sizes=(5000, 20, 10, 2))
+    gallery = np.random.default_rng(0).integers(0, 256, (120, 50, 50), dtype=np.uint8)
+    subjects = np.arange(120) // 3
+    queries = gallery[[5, 50]]
+    distinct = inference.FaceMatcher(net, gallery, subjects, index=True, candidates=12, n_probe=4)
+    shared = inference.FaceMatcher(net, gallery, subjects, names={int(s): "mml" for s in subjects},
+                                   index=True, candidates=12, n_probe=4)
+    for one, other in zip(distinct.identify(queries, k=3), shared.identify(queries, k=3)):
+        assert [score for _, score in one] == [score for _, score in other]
+        assert [name for name, _ in other] == ["mml"] * 3
+
+
+# =============================
+# service.py tests
+# =============================
+import threading
+import service
+
+
+def test_micro_batcher_merges_concurrent_requests():
+    sizes = []
+    batcher = service.MicroBatcher(lambda items: sizes.append(len(items)) or [x * 2 for x in items],
+                                   max_batch=4, max_wait=0.2, max_queue=16)
+    futures = [batcher.submit(n) for n in range(6)]
+    assert [f.result(5) for f in futures] == [0, 2, 4, 6, 8, 10]
+    assert sizes == [4, 2]
+    batcher.close()
+
+
+def test_micro_batcher_bounds_queue_and_forwards_errors():
+    release = threading.Event()
+
+    def slow(items):
+        release.wait(5)
+        raise RuntimeError("model failed")
+
+    batcher = service.MicroBatcher(slow, max_batch=1, max_wait=0, max_queue=1)
+    first = batcher.submit(1)
+    deadline = time.time() + 5
+    while batcher._queue.qsize() and time.time() < deadline:
+        time.sleep(0.01)
+    second = batcher.submit(2)
+    try:
+        batcher.submit(3)
+    except queue.Full:
+        pass
+    else:
+        raise AssertionError("queue was not bounded")
+    release.set()
+    for future in (first, second):
+        try:
+            future.result(5)
+        except RuntimeError as er:
+            assert str(er) == "model failed"
+    batcher.close()
+
+
+def test_service_identify_and_verify_endpoints():
+    np.random.seed(0)
+    gallery = np.random.default_rng(0).integers(0, 256, (4, 50, 50), dtype=np.uint8)
+    matcher = inference.FaceMatcher(network.Network(), gallery, [1, 1, 2, 3], names={2: "sol"})
+    app = service.create_app(matcher, max_wait=0.001)
+    client = app.test_client()
+    png = cv2.imencode(".png", gallery[2])[1].tobytes()
+    expected = matcher.subject_scores(gallery[2])[1][0]
+
+    reply = client.post("/identify?k=2", data=png).get_json()
+    assert [m["subject"] for m in reply["matches"]] == list(np.array([1, 2, 3])[np.argsort(-expected)[:2]])
+    assert np.isclose(reply["matches"][0]["score"], expected.max())
+
+    reply = client.post("/verify?subject=2", data={"image": (io.BytesIO(png), "face.png")}).get_json()
+    assert reply["name"] == "sol" and np.isclose(reply["score"], expected[1])
+    assert client.post("/verify?subject=9", data=png).status_code == 404
+    assert client.post("/identify", data=b"not an image").status_code == 400
+    assert client.get("/stats").get_json()["items"] == 2
+    app.batcher.close()
+
+
+# =============================
+# result_cache.py tests
+# =============================
+import copy
+from result_cache import ResultCache, face_key
+
+
+def test_result_cache_lru_ttl_and_counters():
+    now = [0.0]
+    cache = ResultCache(max_size=2, ttl=10, clock=lambda: now[0])
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+    cache.put("c", 3)  # evicts b, the least recently used
+    assert cache.get("b") is None and cache.get("c") == 3
+    now[0] = 11
+    assert cache.get("a") is None
+    cache.put("d", 4)
+    cache.validate("v2")
+    assert len(cache) == 0
+    assert cache.stats() == {"size": 0, "hits": 2, "misses": 2, "evictions": 1,
+                             "expirations": 1, "invalidations": 1}
+    assert face_key(np.zeros((50, 50), np.uint8)) != face_key(np.ones((50, 50), np.uint8))
+
+
+def test_face_matcher_verify_cache_invalidates_on_new_gallery():
+    np.random.seed(0)
+    rng = np.random.default_rng(0)
+    gallery = rng.integers(0, 256, (6, 50, 50), dtype=np.uint8)
+    subjects = [1, 1, 2, 2, 2, 3]
+    plain = inference.FaceMatcher(network.Network(), gallery, subjects)
+    cache = ResultCache()
+    cached = inference.FaceMatcher(plain.network, gallery, subjects, cache=cache)
+    queries = gallery[[0, 3]]
+
+    expected = plain.subject_scores(queries)[1][:, 1]
+    assert np.allclose(plain.verify(queries, 2), expected)
+    assert np.allclose(cached.verify(queries, 2), expected)
+    assert cache.stats()["misses"] == 6 and len(cache) == 6
+    assert np.isclose(cached.verify(queries[1], 2), expected[1])
+    assert cache.stats()["hits"] == 3
+
+    version = cached.version
+    cached.set_gallery(gallery[::-1], subjects)
+    assert cached.version != version and len(cache) == 0
+    plain.set_gallery(gallery[::-1], subjects)
+    assert np.isclose(cached.verify(queries[1], 2), plain.verify(queries[1], 2))
+    try:
+        cached.verify(queries[0], 9)
+    except KeyError:
+        pass
+    else:
+        raise AssertionError("unknown subject accepted")
+
+
+def test_face_matcher_verify_many_scores_new_pairs_in_one_pass():
+    np.random.seed(0)
+    gallery = np.random.default_rng(0).integers(0, 256, (6, 50, 50), dtype=np.uint8)
+    subjects = [1, 1, 2, 2, 2, 3]
+    cache = ResultCache()
+    matcher = inference.FaceMatcher(network.Network(), gallery, subjects, cache=cache)
+    queries = gallery[[0, 3, 5]]
+    expected = matcher.subject_scores(queries)[1]
+    matcher.verify(queries[0], 2)
+
+    calls = []
+    pair_scores = matcher.engine.pair_scores
+    matcher.engine.pair_scores = lambda q, ids: calls.append(ids.shape) or pair_scores(q, ids)
+    best = matcher.verify_many(queries, [2, 1, 3])
+    assert np.allclose(best, [expected[0, 1], expected[1, 0], expected[2, 2]])
+    # query 0 against subject 2 was cached; the other two are padded to subject 1's two photos
+    assert calls == [(2, 2)] and len(cache) == 3 + 2 + 1
+    assert np.allclose(matcher.verify_many(queries, [2, 1, 3]), best) and len(calls) == 1
+
+
+def test_face_matcher_cache_version_covers_every_layer():
+    np.random.seed(0)
+    gallery = np.random.default_rng(0).integers(0, 256, (4, 50, 50), dtype=np.uint8)
+    base = network.Network()
+    versions = [inference.FaceMatcher(base, gallery, [1, 1, 2, 2]).version]
+    for index, part in [(0, 'weights'), (2, 'biases')]:
+        changed = copy.deepcopy(base)
+        # the query half of layer1 and the later layers do not feed the embeddings key
+        getattr(changed.layers[index], part)[-1] += 0.01
+        assert inference.model_key(changed) == inference.model_key(base)
+        versions.append(inference.FaceMatcher(changed, gallery, [1, 1, 2, 2]).version)
+    assert len(set(versions)) == 3
+
+
+# =============================
+# facerec.py tests
+# =============================
+import subprocess
+
+
+def _run_python(code, cwd=ROOT):
+    result = subprocess.run([sys.executable, "-c", code], cwd=cwd, capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
+    return result.stdout.split()
+
+
+def test_facerec_import_is_light():
+    loaded = _run_python("import sys, facerec; facerec.build_parser(); "
+                         "print(*[m in sys.modules for m in ('numpy', 'cv2', 'tkinter', 'inference')])")
+    assert loaded == ["False"] * 4
+
+
+def test_facerec_verify_path_never_imports_gui(tmp_path):
+    np.random.seed(0)
+    params = [(l.weights, l.biases) for l in network.Network().layers]
+    model_io.save_model(str(tmp_path / "m.model"), params, loss=1.0)
+    gallery = tmp_path / "gallery"
+    gallery.mkdir()
+    face = np.random.default_rng(0).integers(0, 256, (50, 50), dtype=np.uint8)
+    cv2.imwrite(str(gallery / "4.png"), face)
+    cv2.imwrite(str(tmp_path / "query.png"), face)
+
+    out = _run_python(
+        "import sys, facerec\n"
+        "sys.path.insert(0, %r)\n"
+        "import image_cache; image_cache.CACHE_FOLDER = %r\n"
+        "code = facerec.main(['--model-folder', %r, '--model-name', 'm', 'verify', %r, '4',"
+        " '--gallery', %r, '--threshold', '0'])\n"
+        "print(code, *[m in sys.modules for m in ('tkinter', 'matplotlib', 'pygame')])"
+        % (ROOT, str(tmp_path / "cache"), str(tmp_path), str(tmp_path / "query.png"), str(gallery)))
+    assert out[-4:] == ["0", "False", "False", "False"]
+
+
+def test_facerec_dedup_defaults_to_dedup_max_distance(monkeypatch):
+    import dedup
+    import facerec
+    calls = []
+    monkeypatch.setattr(dedup, "dedup", lambda *args: calls.append(args) or [])
+    assert facerec.main(["dedup", "photos"]) == 0
+    assert facerec.main(["dedup", "photos", "--max-distance", "3"]) == 0
+    assert [args[:2] for args in calls] == [("photos", dedup.MAX_DISTANCE), ("photos", 3)]
+
+
+# =============================
+# benchmark suite tests
+# =============================
+from benchmarks import suite
+
+
+def test_benchmark_suite_times_rounds_after_warm_up():
+    calls = []
+
+    def make(workdir):
+        return (lambda: calls.append("run")), (lambda: calls.append("setup"))
+
+    times = suite.time_benchmark(make, number=2, repeat=3)
+    assert len(times) == 3 and all(t >= 0 for t in times)
+    assert calls == ["setup", "run", "run"] * 4
+    summary = suite.summarize([3.0, 1.0, 2.0], 2)
+    assert summary["median_ms"] == 2.0 and summary["min_ms"] == 1.0 and summary["number"] == 2
+
+
+def test_benchmark_suite_flags_regressions_against_baseline():
+    def results(**medians):
+        return {"results": {name: {"median_ms": ms} for name, ms in medians.items()}}
+
+    rows = suite.compare(results(a=10.0, b=13.0, c=5.0, new=1.0), results(a=10.0, b=10.0, c=10.0, gone=1.0),
+                         threshold=0.2)
+    status = {name: row_status for name, _, _, _, row_status in rows}
+    assert status == {"a": "ok", "b": "regression", "c": "faster", "gone": "missing", "new": "new"}
+    assert [row for row in rows if row[0] == "b"][0][3] == 1.3
+
+
+# =============================
+# profiling tests
+# =============================
+import profiling
+
+
+def test_profiling_disabled_records_nothing(monkeypatch):
+    monkeypatch.setattr(profiling, "enabled", False)
+    profiling.profiler.reset()
+    assert profiling.stage("detect") is profiling.stage("resize")
+    with profiling.stage("detect"):
+        pass
+    assert profiling.timed("identify")(lambda x: x + 1)(1) == 2
+    assert profiling.profiler.snapshot() == {}
+
+
+def test_profiling_counts_totals_and_histograms():
+    profiler = profiling.Profiler(buckets=(0.001, 0.01))
+    for seconds in (0.0005, 0.001, 0.005, 0.5):
+        profiler.record("detect", seconds)
+    with profiler.stage("resize"):
+        pass
+    stage = profiler.snapshot()["detect"]
+    assert stage["count"] == 4 and stage["max_seconds"] == 0.5
+    assert abs(stage["total_seconds"] - 0.5065) < 1e-12
+    assert stage["buckets"] == {"0.001": 2, "0.01": 3, "+Inf": 4}
+
+    text = profiler.to_prometheus()
+    assert 'facerec_stage_seconds_bucket{stage="detect",le="0.01"} 3' in text
+    assert 'facerec_stage_seconds_count{stage="resize"} 1' in text
+    parsed = profiling.parse_prometheus(text)
+    assert parsed["detect"]["count"] == 4 and parsed["detect"]["buckets"] == stage["buckets"]
+    assert abs(parsed["detect"]["total_seconds"] - stage["total_seconds"]) < 1e-12
+
+
+def test_profiling_hooks_in_layer_forward_and_service(monkeypatch):
+    monkeypatch.setattr(profiling, "enabled", True)
+    profiling.profiler.reset()
+    np.random.seed(0)
+    layer = network.Layer(4, 3)
+    layer.forward([[1, 2, 3, 4]])
+    stages = profiling.profiler.snapshot()
+    assert stages["layer_forward_4x3"]["count"] == 1 and stages["to_array"]["count"] == 1
+
+    import service
+    matcher = inference.FaceMatcher(network.Network(), np.zeros((2, 50, 50), np.uint8), np.array([1, 2]))
+    app = service.create_app(matcher, max_wait=0)
+    try:
+        client = app.test_client()
+        _, data = cv2.imencode(".png", np.zeros((50, 50), np.uint8))
+        assert client.post("/identify", data=data.tobytes()).status_code == 200
+        text = client.get("/metrics").get_data(as_text=True)
+        assert 'facerec_stage_seconds_count{stage="match_batch"} 1' in text
+        assert 'stage="imdecode"' in text and 'stage="layer_forward_2500x500"' in text
+        assert client.get("/metrics.json").get_json()["stages"]["match_batch"]["count"] == 1
+    finally:
+        app.batcher.close()
+        profiling.profiler.reset()
+
+
+# =============================
+# generate_image_metadata.py tests
+# =============================
+import csv
+import generate_image_metadata
+
+
+def test_metadata_reads_png_and_jpeg_headers_without_decoding(tmp_path, monkeypatch):
+    image = np.random.default_rng(0).integers(0, 256, (30, 70, 3), dtype=np.uint8)
+    for ext in (".png", ".jpg"):
+        _, data = cv2.imencode(ext, image)
+        (tmp_path / ("a" + ext)).write_bytes(data.tobytes())
+    monkeypatch.setattr(cv2, "imread", lambda *args: None)
+    png = generate_image_metadata.image_info(str(tmp_path / "a.png"))
+    jpg = generate_image_metadata.image_info(str(tmp_path / "a.jpg"))
+    assert png[:3] == (70, 30, 3) and jpg[:3] == (70, 30, 3) and png[3] != jpg[3]
+    gray = tmp_path / "gray.png"
+    gray.write_bytes(cv2.imencode(".png", image[:, :, 0])[1].tobytes())
+    assert generate_image_metadata.image_info(str(gray))[2] == 1
+
+
+def test_metadata_streams_rows_to_csv(tmp_path, monkeypatch):
+    monkeypatch.setattr(cv2, "imread", lambda *args: None)
+    photos = tmp_path / "photos"
+    (photos / "sub").mkdir(parents=True)
+    for name in ("m1-1.png", "m1-2.png", "sub/m2-1.jpg"):
+        _, data = cv2.imencode(os.path.splitext(name)[1], np.zeros((40, 60), np.uint8))
+        (photos / name).write_bytes(data.tobytes())
+    (photos / "broken.png").write_bytes(b"not an image")
+    (photos / "notes.txt").write_text("skipped")
+
+    out = tmp_path / "metadata.csv"
+    assert generate_image_metadata.generate_metadata(str(photos), str(out), workers=2) == 3
+    with open(out, newline="") as f:
+        rows = list(csv.DictReader(f))
+    assert [r["filename"] for r in rows] == ["m1-1.png", "m1-2.png", "m2-1.jpg"]
+    assert all(r["width"] == "60" and r["height"] == "40" for r in rows)
+    assert [r["format"] for r in rows] == ["PNG", "PNG", "JPG"]
+    assert not os.path.exists(str(out) + ".tmp")
+
+
+def test_metadata_manifest_reads_only_new_or_changed_files(tmp_path, monkeypatch):
+    photos = tmp_path / "photos"
+    photos.mkdir()
+    for n, name in enumerate(("m1-1.png", "m1-2.png", "m2-1.png")):
+        _, data = cv2.imencode(".png", np.zeros((20 + n, 30), np.uint8))
+        (photos / name).write_bytes(data.tobytes())
+    read = []
+    image_info = generate_image_metadata.image_info
+    monkeypatch.setattr(generate_image_metadata, "image_info",
+                        lambda path: read.append(os.path.basename(path)) or image_info(path))
+    out = str(tmp_path / "metadata.csv")
+
+    assert generate_image_metadata.generate_metadata(str(photos), out) == 3
+    assert sorted(read) == ["m1-1.png", "m1-2.png", "m2-1.png"]
+    written = os.stat(out).st_mtime_ns
+    del read[:]
+    manifest, changes = generate_image_metadata.refresh_manifest(str(photos), out + ".manifest.npz")
+    assert changes == {"added": 0, "changed": 0, "removed": 0} and read == []
+    assert generate_image_metadata.generate_metadata(str(photos), out) == 3
+    assert read == [] and os.stat(out).st_mtime_ns == written
+
+    _, data = cv2.imencode(".png", np.zeros((40, 41), np.uint8))
+    (photos / "m1-2.png").write_bytes(data.tobytes())
+    (photos / "m2-1.png").unlink()
+    (photos / "m3-1.png").write_bytes(data.tobytes())
+    manifest, changes = generate_image_metadata.refresh_manifest(str(photos), out + ".manifest.npz")
+    assert changes == {"added": 1, "changed": 1, "removed": 1}
+    assert sorted(read) == ["m1-2.png", "m3-1.png"]
+    generate_image_metadata.generate_metadata(str(photos), out)
+    with open(out, newline="") as f:
+        rows = [(r["filename"], r["width"], r["height"]) for r in csv.DictReader(f)]
+    assert rows == [("m1-1.png", "30", "20"), ("m1-2.png", "41", "40"), ("m3-1.png", "41", "40")]
+
+
+# =============================
+# validation.py tests
+# =============================
+import validation
+import run_ge_checkpoint
+
+
+def test_validation_reports_unexpected_rows_and_warnings():
+    table = {"filename": np.array(["a.png", "", "c.png", "d.png"]),
+             "width": np.array([50., 0., 60., 50.]), "height": np.array([50., 50., 50., np.nan]),
+             "channels": np.array([1., 1., 3., 1.]), "hash": np.array(["x", "y", "x", "z"])}
+    result = validation.validate(table)
+    failed = {(r["expectation_type"], r["kwargs"]["column"]): r["unexpected_rows"]
+              for r in result["results"] if not r["success"]}
+    assert not result["success"]
+    assert failed == {("expect_column_values_to_not_be_null", "filename"): [1],
+                      ("expect_column_values_to_be_between", "width"): [1],
+                      ("expect_column_values_to_be_in_set", "width"): [1, 2],
+                      ("expect_column_values_to_be_in_set", "channels"): [2],
+                      ("expect_column_values_to_be_unique", "hash"): [0, 2]}
+    assert any(line.startswith("⚠️") for line in validation.report(table, result))
+
+    del table["channels"]
+    table["width"][:] = 50
+    table["filename"][1] = "b.png"
+    result = validation.validate(table, warnings=[])
+    assert [r.get("error") for r in result["results"] if not r["success"]] == ["missing column 'channels'"]
+
+
+def test_validation_native_checkpoint_runs_without_great_expectations(tmp_path, monkeypatch):
+    monkeypatch.setattr(cv2, "imread", lambda *args: None)
+    photos = tmp_path / "photos"
+    photos.mkdir()
+    for n in range(3):
+        _, data = cv2.imencode(".png", np.full((50, 50), n, np.uint8))
+        (photos / ("m1-%d.png" % (n + 1))).write_bytes(data.tobytes())
+    monkeypatch.setattr(generate_image_metadata, "IMAGE_DIR", str(photos))
+    monkeypatch.setitem(sys.modules, "great_expectations", None)
+    out = str(tmp_path / "metadata.csv")
+
+    run_ge_checkpoint.main(backend="native", csv_file=out)
+    table = validation.read_table(out)
+    assert table["width"].dtype == float and list(table["channels"]) == [1, 1, 1]
+
+    _, data = cv2.imencode(".png", np.zeros((60, 50, 3), np.uint8))
+    (photos / "m2-1.png").write_bytes(data.tobytes())
+    try:
+        run_ge_checkpoint.main(backend="native", csv_file=out)
+    except Exception as error:
+        assert "validation failed" in str(error).lower()
+    else:
+        raise AssertionError("expected the checkpoint to fail")
+
+
+# =============================
+# dedup.py tests
+# =============================
+import dedup
+
+
+def test_dedup_multi_index_finds_the_same_pairs_as_brute_force():
+    rng = np.random.default_rng(0)
+    hashes = rng.integers(0, 256, (300, 32), dtype=np.uint8)
+    bits = np.unpackbits(hashes[:60], axis=1)
+    for flips in (1, 5, 12, 16, 25):
+        near = bits.copy()
+        cols = rng.random(near.shape).argsort(axis=1)[:, :flips]
+        np.put_along_axis(near, cols, 1 - np.take_along_axis(near, cols, axis=1), axis=1)
+        hashes = np.concatenate([hashes, np.packbits(near, axis=1)])
+
+    i, j, distance = dedup.near_duplicates(hashes, dedup.MAX_DISTANCE)
+    a, b = np.triu_indices(len(hashes), 1)
+    brute = dedup.hamming(hashes, a, b)
+    close = brute <= dedup.MAX_DISTANCE
+    assert len(i) >= 4 * 60 and np.all(distance <= dedup.MAX_DISTANCE)
+    assert np.array_equal(np.stack([i, j, distance]), np.stack([a[close], b[close], brute[close]]))
+
+
+def test_dedup_groups_copies_and_writes_quarantine(tmp_path):
+    rng = np.random.default_rng(1)
+    images = cv2.resize(rng.integers(0, 256, (6 * 10, 10), dtype=np.uint8), (50, 300)).reshape(6, 50, 50)
+    _, data = cv2.imencode(".jpg", images[0], [cv2.IMWRITE_JPEG_QUALITY, 70])
+    copies = np.stack([images[0], cv2.imdecode(data, cv2.IMREAD_GRAYSCALE),
+                       np.clip(images[2].astype(int) + 12, 0, 255).astype(np.uint8)])
+    images = np.concatenate([images, copies])
+    filenames = ["m1-1.png", "m1-2.png", "m2-1.png", "m2-2.png", "m3-1.png", "m3-2.png",
+                 "m4-1.png", "m1-3.png", "m2-3.png"]
+    subjects = np.array([1, 1, 2, 2, 3, 3, 4, 1, 2])
+    photos = np.array([1, 2, 1, 2, 1, 2, 1, 3, 3])
+
+    rows = dedup.find_duplicates(images, filenames, subjects, photos)
+    groups = [[r["filename"] for r in rows if r["group"] == g] for g in (1, 2)]
+    assert groups == [["m1-1.png", "m4-1.png", "m1-3.png"], ["m2-1.png", "m2-3.png"]]
+    by_name = {r["filename"]: r for r in rows}
+    assert by_name["m4-1.png"]["identical"] and by_name["m4-1.png"]["cross_subject"]
+    assert not by_name["m1-3.png"]["identical"] and 0 < by_name["m1-3.png"]["distance"] <= dedup.MAX_DISTANCE
+    assert not by_name["m2-3.png"]["cross_subject"]
+
+    dedup.write_report(str(tmp_path / "report.csv"), rows)
+    dedup.write_quarantine(str(tmp_path / "quarantine.txt"), rows)
+    assert dedup.read_quarantine(str(tmp_path / "quarantine.txt")) == ["m4-1.png", "m1-3.png", "m2-3.png"]
+    with open(tmp_path / "report.csv", newline="") as f:
+        assert len(list(csv.DictReader(f))) == 5
+
+
 # =============================
 # NOTE:
-# test.py predict() is NOT tested because
-# test.py executes GUI + camera code during import.
-# This makes predict() unavailable safely in CI.
+# test.py itself is NOT tested because
+# it executes GUI + camera code during import;
+# inference.FaceMatcher covers the same path.
 # =============================
@@ -1,6 +1,11 @@
 #import matplotlib.pyplot as plt
 import numpy as np
 import random , os , cv2  , time 
+import dataset, image_cache, model_io, loader, dedup
+from random_search import RandomSearch, PopulationSearch
+from checkpoint import CheckpointWriter
+from network import (Layer, activation, activation_softmax, Loss, Loss_C, Loss_C2,
+                     Network, Optimizer_SGD, Optimizer_Adam)
 
 np.random.seed(0)
 random.seed(0)
@@ -8,137 +13,48 @@ random.seed(0)
 model_name = '50x50-4l'
 model_name_load = '50x50-4l'
 
-list_dirf = os.listdir()
 model_folder = 'model'
 folder = 'data'
-list_dir = os.listdir('data')
-print('photos : ', len (list_dir))
 a_data = 1400
-
-
-
-
-
-photodata=[]
-data = []
-t=[]
-
-for i in range(a_data):
-    try :
-        photodata=[]
-        a1=random.randint(1,len(list_dir)-1)
-        a2=random.randint(0,1)
-        image1 = cv2.imread(folder+"/"+list_dir[a1])
-        subnum = list_dir[a1].split('-')[0][1:]
-        subindexnum = list_dir[a1].split('-')[1]
-        if a2 ==0: #another person => 0
-            a3=random.randint(1,len(list_dir)-1)
-            subnum2 = list_dir[a3].split('-')[0][1:-1]
-            if  subnum2 ==  subnum :
-                a3+=1
-            subnum2 = list_dir[a3].split('-')[0][1:-1]
-            image2 = cv2.imread(folder+"/"+list_dir[a3])
-        if a2 ==1: #same person another photo=> 1
-            a4=random.randint(1,6)
-            
-            if  subindexnum[0:-4] ==  str(a4) :
-                a4+=1
-            
-            image2 = cv2.imread(folder+"/m"+subnum+'-'+str(a4)+'.png')
-            
-        for j in range(50):
-            for k in range(50):
-                photodata.append(image1[j][k][0]/255)
-        for j in range(50):
-            for k in range(50):
-                photodata.append(image2[j][k][0]/255)
-        data.append(photodata)        
-        t.append(a2)         
-            
-    except :
-        print(i)
-        
-    
-y= np.array(t)
-cv2.destroyAllWindows()
-
-print('data set: ',len(data))
-
-
-class Layer :
-    def __init__(self,n_inputs,n_neurons):
-        self.weights = 0.1 * np.random.rand(n_inputs,n_neurons)-0.05
-        self.biases = np.zeros((1,n_neurons))
-    def forward(self,inputs):
-        self.output = np.dot(inputs, self.weights) + self.biases
-class activation :
-    def forward(self,inputs):
-        self.output = np.maximum(0, inputs)
-class activation_softmax:
-    def forward(self,inputs):
-        exp_values = np.exp(inputs - np.max(inputs, axis=1,keepdims=True))
-        probabilities = exp_values/np.sum(exp_values, axis=1,keepdims=True)
-        self.output = probabilities
-class Loss:
-
-    def calculate (self,output,y):
-        sample_losses = self.forward(output,y)
-        data_loss=np.mean(sample_losses)
-        return data_loss
-class Loss_C(Loss):
-    def forward(self,y_pred,y_true):
-        samples = len(y_pred)
-        y_pred_clipped = np.clip(y_pred, 1e-7,1-1e-7)
-        if len(y_true.shape)==1:
-            correct_confidences = y_pred_clipped[range(samples),y_true]
-        elif len(y_true.shape)==2:
-            correct_confidences = np.sum(y_pred_clipped*y_true, axis=1)
-        negetive_log_likelhoods = -np.log(correct_confidences)
-        #negetive_log_likelhoods = correct_confidences
-        return negetive_log_likelhoods
-
-class Loss_C2(Loss):
-    def forward(self,y_pred,y_true):
-        samples = len(y_pred)
-        outputlen = len(y_pred[0])
-        loss_n = 0
-        for i in range (samples):
-            for j in range (outputlen):
-                loss_n += abs(y_pred[i][j]-y_true[i][j])**2 
-
-                
-        return loss_n / samples
-def save ():
-    w1=open(model_folder + '/' + 'best_layer1_weights'+model_name+'.npy','wb')
-    b1=open(model_folder + '/' + 'best_layer1_biases'+model_name+'.npy','wb')
-    w2=open(model_folder + '/' + 'best_layer2_weights'+model_name+'.npy','wb')
-    b2=open(model_folder + '/' + 'best_layer2_biases'+model_name+'.npy','wb')
-    w3=open(model_folder + '/' + 'best_layer3_weights'+model_name+'.npy','wb')
-    b3=open(model_folder + '/' + 'best_layer3_biases'+model_name+'.npy','wb')
-    w4=open(model_folder + '/' + 'best_layer4_weights'+model_name+'.npy','wb')
-    b4=open(model_folder + '/' + 'best_layer4_biases'+model_name+'.npy','wb')
-
-    best_loss_file = open(model_folder + '/' + 'best_loss'+model_name+'.txt','w')
-    best_loss_file.write(str(best_loss))
-    best_loss_file.close()
-
-    np.save(w1, best_layer1_weights.copy() )
-    np.save(b1, best_layer1_biases.copy()  )
-    np.save(w2, best_layer2_weights.copy() )
-    np.save(b2, best_layer2_biases.copy()  )
-    np.save(w3, best_layer3_weights.copy() )
-    np.save(b3, best_layer3_biases.copy()  )
-    np.save(w4, best_layer4_weights.copy() )
-    np.save(b4, best_layer4_biases.copy()  )
-    print('saved \n')
+# processes used to decode new or changed photos into the image cache
+decode_workers = os.cpu_count()
+# photos listed here (python dedup.py --quarantine) are left out of the pairs
+quarantine = 'quarantine.txt'
+
+# 'adam' / 'sgd' train with backpropagation, 'random' keeps the random-perturbation search,
+# 'population' scores population perturbations per generation on population_workers processes
+trainer = 'adam'
+epochs = 20
+batch_size = 64
+learning_rate = 0.0003
+# > 0: draw this many fresh balanced pairs per epoch on the fly instead of reusing the a_data pairs
+stream_pairs = 0
+# 'best' keeps the best candidate, 'es' takes a rank-weighted step (evolution strategies)
+population = 16
+population_workers = os.cpu_count()
+population_update = 'best'
+population_sigma = 0.01
+
+# checkpoints: at most one write per interval, keeping the last few with their loss / acc
+checkpoint_interval = 10
+checkpoint_min_delta = 0.
+checkpoint_keep = 3
+
+
+def save (acc=None):
+    # handed to the background writer; only the newest pending snapshot is written
+    checkpoints.submit([(best_layer1_weights, best_layer1_biases),
+                        (best_layer2_weights, best_layer2_biases),
+                        (best_layer3_weights, best_layer3_biases),
+                        (best_layer4_weights, best_layer4_biases)],
+                       loss=best_loss, acc=acc)
 
 def build_dataset(images):
-    data = []
-    for img1, img2 in images:
-        v1 = img1.flatten() / 255.0
-        v2 = img2.flatten() / 255.0
-        data.append(np.concatenate([v1, v2]))
-    return np.array(data)
+    first = np.array([img1 for img1, img2 in images])
+    second = np.array([img2 for img1, img2 in images])
+    n = len(first)
+    faces = np.concatenate([first, second])
+    return dataset.pair_matrix(faces, np.arange(n), np.arange(n, 2 * n))
 
 
 def test(a1,a2=0,a3=0,a4=0):
@@ -164,132 +80,201 @@ def test(a1,a2=0,a3=0,a4=0):
     print(layer3.output)
 
 
+def main():
+    # save(), test() and the callbacks below work on these module-level names
+    global layer1, layer2, layer3, layer4, activation1, activation2, activation3, activation4
+    global loss_function, checkpoints, best_loss
+    global best_layer1_weights, best_layer1_biases, best_layer2_weights, best_layer2_biases
+    global best_layer3_weights, best_layer3_biases, best_layer4_weights, best_layer4_biases
 
-layer1 = Layer(5000,500)
-layer2 = Layer(500,50)
-layer3 = Layer(50,10)
-layer4 = Layer(10,2)
-
-#load last weights
-
-try :
-    
-    best_loss = 999999
-    
-    w1=open(model_folder + '/' + 'best_layer1_weights'+model_name_load+'.npy','rb')
-    b1=open(model_folder + '/' + 'best_layer1_biases'+model_name_load+'.npy','rb')
-    w2=open(model_folder + '/' + 'best_layer2_weights'+model_name_load+'.npy','rb')
-    b2=open(model_folder + '/' + 'best_layer2_biases'+model_name_load+'.npy','rb')
-    w3=open(model_folder + '/' + 'best_layer3_weights'+model_name_load+'.npy','rb')
-    b3=open(model_folder + '/' + 'best_layer3_biases'+model_name_load+'.npy','rb')
-    w4=open(model_folder + '/' + 'best_layer4_weights'+model_name_load+'.npy','rb')
-    b4=open(model_folder + '/' + 'best_layer4_biases'+model_name_load+'.npy','rb')
-    
-    
-    layer1.weights = np.load(w1 , allow_pickle=True)
-    layer1.biases  = np.load(b1 , allow_pickle=True)
-    layer2.weights = np.load(w2 , allow_pickle=True)
-    layer2.biases  = np.load(b2 , allow_pickle=True)
-    layer3.weights = np.load(w3 , allow_pickle=True)
-    layer3.biases  = np.load(b3 , allow_pickle=True)
-    layer4.weights = np.load(w4 , allow_pickle=True)
-    layer4.biases  = np.load(b4 , allow_pickle=True)
-    print('best weights loaded ☻')
-    print('loading loss ')
-    best_loss_filer = open(model_folder + '/' + 'best_loss'+model_name_load+'.txt','r')
-    best_loss = eval (best_loss_filer.read())
-    print('OK !')
-
-except Exception as er:
-    
-    print(er, '\n making new model or loss ...')
-
-activation1=activation()
-activation2=activation()
-activation3=activation()
-activation4=activation_softmax()
-loss_function = Loss_C()
-
-#best_loss = 70.554
-#best_loss = 120.38655649204002
-
-best_layer1_weights = layer1.weights.copy()
-best_layer1_biases  = layer1.biases.copy()
-best_layer2_weights = layer2.weights.copy()
-best_layer2_biases  = layer2.biases.copy() 
-best_layer3_weights = layer3.weights.copy()
-best_layer3_biases  = layer3.biases.copy() 
-best_layer4_weights = layer4.weights.copy()
-best_layer4_biases  = layer4.biases.copy() 
-
-
-
-
-lr=0.1
-
-best_loss += 1
-rv= 0
-for i in range(10000000):
-    #print(i)
-    layer1.weights += rv * np.random.rand(5000,500)-rv/2
-    layer1.biases  += rv * np.random.rand(1,500)-rv/2
-    layer2.weights += rv * np.random.rand(500,50)-rv/2
-    layer2.biases  += rv * np.random.rand(1,50)-rv/2
-    layer3.weights += rv * np.random.rand(50,10)-rv/2
-    layer3.biases  += rv * np.random.rand(1,10)-rv/2
-    layer4.weights += rv * np.random.rand(10,2)-rv/2
-    layer4.biases  += rv * np.random.rand(1,2)-rv/2
-    
-    layer1.forward(data)
-    activation1.forward(layer1.output)
+    list_dir = os.listdir(folder)
+    print('photos : ', len (list_dir))
 
-    layer2.forward(activation1.output)
-    activation2.forward(layer2.output)
+    # decode every photo once (memory-mapped cache), then build the pairs with fancy indexing
+    images, image_files, subjects, photos = image_cache.load_images(folder, workers=decode_workers)
+    if quarantine and os.path.exists(quarantine):
+        keep = ~np.isin(image_files, dedup.read_quarantine(quarantine))
+        print('quarantined : ', int(np.sum(~keep)))
+        images, subjects = images[keep], subjects[keep]
+    data, y = dataset.build_pairs(images, subjects, a_data, rng=0)
+    cv2.destroyAllWindows()
 
-    layer3.forward(activation2.output)
-    activation3.forward(layer3.output)
+    print('data set: ',len(data))
 
-    layer4.forward(activation3.output)
-    activation4.forward(layer4.output)
+    layer1 = Layer(5000,500)
+    layer2 = Layer(500,50)
+    layer3 = Layer(50,10)
+    layer4 = Layer(10,2)
 
-    #print(activation2.output)
-    #print(y)
-    predictions = np.argmax(activation4.output,axis=1)
-    acc = np.mean(predictions==y)
-    #print(predictions)
-    loss = loss_function.calculate(activation4.output,y)
-    #print('loss : ',loss , rv)
-    
-    if loss<best_loss:
-        print('\nrv : ' , rv)
-        rv= lr
-        print('acc : ', round(acc*100000)/1000)
-        print('loss : ', loss ,'\ndelta loss : ', best_loss-loss )
-        save()
-        best_layer1_weights = layer1.weights.copy()
-        best_layer1_biases  = layer1.biases.copy()
-        best_layer2_weights = layer2.weights.copy()
-        best_layer2_biases  = layer2.biases.copy()         
-        best_layer3_weights = layer3.weights.copy()
-        best_layer3_biases  = layer3.biases.copy()         
-        best_layer4_weights = layer4.weights.copy()
-        best_layer4_biases  = layer4.biases.copy()         
-        best_loss = loss
-    else:
-        rv -= rv/10
-        layer1.weights = best_layer1_weights.copy()
-        layer1.biases  = best_layer1_biases.copy()
-        layer2.weights = best_layer2_weights.copy()
-        layer2.biases  = best_layer2_biases.copy()
-        layer3.weights = best_layer3_weights.copy()
-        layer3.biases  = best_layer3_biases.copy()
-        layer4.weights = best_layer4_weights.copy()
-        layer4.biases  = best_layer4_biases.copy()
-    if i %9000==0:
-        print('\nrv : ' , rv)
-        print('acc : ',round(acc*100000)/1000)
-        print('loss : ',loss)
-    if i %50==0:
-        print(i)
+    checkpoints = CheckpointWriter(model_io.model_path(model_folder, model_name),
+                                   min_interval=checkpoint_interval,
+                                   min_delta=checkpoint_min_delta, keep=checkpoint_keep)
 
+    #load last weights
 
+    try :
+
+        best_loss = 999999
+
+        # single-file model, or the old eight-file layout through the converter
+        params, meta = model_io.load(model_folder, model_name_load, mmap=False)
+        (layer1.weights, layer1.biases), (layer2.weights, layer2.biases), \
+            (layer3.weights, layer3.biases), (layer4.weights, layer4.biases) = params
+        print('best weights loaded ☻')
+        print('loading loss ')
+        best_loss = meta['loss']
+        print('OK !')
+
+    except Exception as er:
+
+        print(er, '\n making new model or loss ...')
+
+    activation1=activation()
+    activation2=activation()
+    activation3=activation()
+    activation4=activation_softmax()
+    loss_function = Loss_C()
+
+    #best_loss = 70.554
+    #best_loss = 120.38655649204002
+
+    best_layer1_weights = layer1.weights.copy()
+    best_layer1_biases  = layer1.biases.copy()
+    best_layer2_weights = layer2.weights.copy()
+    best_layer2_biases  = layer2.biases.copy() 
+    best_layer3_weights = layer3.weights.copy()
+    best_layer3_biases  = layer3.biases.copy() 
+    best_layer4_weights = layer4.weights.copy()
+    best_layer4_biases  = layer4.biases.copy()
+
+    # every trainer saves its first result, even if it is no better than the loaded loss
+    best_loss += 1
+
+    if trainer == 'random':
+        lr=0.1
+
+        # weights live in one float32 buffer; a rejected step subtracts the same noise again
+        search = RandomSearch([layer1, layer2, layer3, layer4], seed=0)
+        data = data.astype(np.float32, copy=False)
+        best_layer1_weights = layer1.weights
+        best_layer1_biases  = layer1.biases
+        best_layer2_weights = layer2.weights
+        best_layer2_biases  = layer2.biases
+        best_layer3_weights = layer3.weights
+        best_layer3_biases  = layer3.biases
+        best_layer4_weights = layer4.weights
+        best_layer4_biases  = layer4.biases
+
+        rv= 0
+        for i in range(10000000):
+            #print(i)
+            search.perturb(rv)
+
+            layer1.forward(data)
+            activation1.forward(layer1.output)
+
+            layer2.forward(activation1.output)
+            activation2.forward(layer2.output)
+
+            layer3.forward(activation2.output)
+            activation3.forward(layer3.output)
+
+            layer4.forward(activation3.output)
+            activation4.forward(layer4.output)
+
+            #print(activation2.output)
+            #print(y)
+            predictions = np.argmax(activation4.output,axis=1)
+            acc = np.mean(predictions==y)
+            #print(predictions)
+            loss = loss_function.calculate(activation4.output,y)
+            #print('loss : ',loss , rv)
+
+            if loss<best_loss:
+                print('\nrv : ' , rv)
+                rv= lr
+                print('acc : ', round(acc*100000)/1000)
+                print('loss : ', loss ,'\ndelta loss : ', best_loss-loss )
+                best_loss = loss
+                save(acc)
+            else:
+                rv -= rv/10
+                search.undo()
+            if i %9000==0:
+                print('\nrv : ' , rv)
+                print('acc : ',round(acc*100000)/1000)
+                print('loss : ',loss)
+            if i %50==0:
+                print(i)
+    elif trainer == 'population':
+        search = PopulationSearch([layer1, layer2, layer3, layer4], data, y, population=population,
+                                  workers=population_workers, sigma=population_sigma, seed=0,
+                                  update=population_update, lr=learning_rate)
+        best_layer1_weights = layer1.weights
+        best_layer1_biases  = layer1.biases
+        best_layer2_weights = layer2.weights
+        best_layer2_biases  = layer2.biases
+        best_layer3_weights = layer3.weights
+        best_layer3_biases  = layer3.biases
+        best_layer4_weights = layer4.weights
+        best_layer4_biases  = layer4.biases
+
+        def on_improve(generation, loss, acc):
+            global best_loss
+            print('acc : ', round(acc*100000)/1000)
+            print('loss : ', loss ,'\ndelta loss : ', best_loss-loss )
+            best_loss = loss
+            save(acc)
+
+        with search:
+            search.run(10000000, best_loss, on_improve, print_every=50)
+        # close() moved the layers out of shared memory; drop the views of the old block
+        best_layer1_weights = layer1.weights
+        best_layer1_biases  = layer1.biases
+        best_layer2_weights = layer2.weights
+        best_layer2_biases  = layer2.biases
+        best_layer3_weights = layer3.weights
+        best_layer3_biases  = layer3.biases
+        best_layer4_weights = layer4.weights
+        best_layer4_biases  = layer4.biases
+    else:
+        network = Network([layer1, layer2, layer3, layer4])
+        if trainer == 'sgd':
+            optimizer = Optimizer_SGD(learning_rate, momentum=0.9)
+        else:
+            optimizer = Optimizer_Adam(learning_rate)
+
+        def keep_best(epoch, loss, acc):
+            global best_loss, best_layer1_weights, best_layer1_biases, best_layer2_weights, best_layer2_biases
+            global best_layer3_weights, best_layer3_biases, best_layer4_weights, best_layer4_biases
+            # compare full-dataset loss like the random search does
+            loss, acc = network.loss(data, y)
+            if loss < best_loss:
+                # the checkpoint writer takes its own snapshot, no copies needed here
+                print('acc : ', round(acc*100000)/1000)
+                print('loss : ', loss ,'\ndelta loss : ', best_loss-loss )
+                best_layer1_weights = layer1.weights
+                best_layer1_biases  = layer1.biases
+                best_layer2_weights = layer2.weights
+                best_layer2_biases  = layer2.biases
+                best_layer3_weights = layer3.weights
+                best_layer3_biases  = layer3.biases
+                best_layer4_weights = layer4.weights
+                best_layer4_biases  = layer4.biases
+                best_loss = loss
+                save(acc)
+
+        if stream_pairs:
+            # pairs are built on a background thread while the current batch trains
+            with loader.Prefetcher(dataset.iter_pair_batches(images, subjects, batch_size, rng=0)) as batches:
+                network.fit_generator(batches, stream_pairs // batch_size, epochs=epochs,
+                                      optimizer=optimizer, callback=keep_best)
+        else:
+            network.fit(data, y, epochs=epochs, batch_size=batch_size, optimizer=optimizer,
+                        callback=keep_best, rng=0)
+
+    checkpoints.close()
+
+
+if __name__ == '__main__':
+    main()
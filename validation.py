@@ -0,0 +1,128 @@
+"""Vectorized data-quality checks over the image metadata table.
+
+Expectations are (name, kwargs) pairs named after their Great Expectations
+counterparts, so the same SUITE runs here with NumPy in milliseconds or,
+through run_ge_checkpoint.py --backend ge, on a GE validator. WARNINGS are
+only evaluated here.
+"""
+import csv
+import numpy as np
+
+# -----------------------------
+# Settings
+# -----------------------------
+IMAGE_SIZE = 50
+SUITE = [
+    ("expect_column_values_to_not_be_null", {"column": "filename"}),
+    ("expect_column_values_to_be_between", {"column": "width", "min_value": 1}),
+    ("expect_column_values_to_be_between", {"column": "height", "min_value": 1}),
+    # the network takes 50x50 single-channel crops
+    ("expect_column_values_to_be_in_set", {"column": "width", "value_set": [IMAGE_SIZE]}),
+    ("expect_column_values_to_be_in_set", {"column": "height", "value_set": [IMAGE_SIZE]}),
+    ("expect_column_values_to_be_in_set", {"column": "channels", "value_set": [1]}),
+]
+# reported, but do not fail the validation
+WARNINGS = [
+    # the same file content saved twice (e.g. one photo enrolled under two subjects)
+    ("expect_column_values_to_be_unique", {"column": "hash"}),
+]
+# unexpected values listed per failed expectation
+EXAMPLES = 5
+NUMERIC = ("width", "height", "channels", "size_kb")
+
+
+def read_table(csv_path):
+    """{column: array} from a metadata CSV; numeric columns with empty cells become float with NaN."""
+    with open(csv_path, newline="") as f:
+        reader = csv.reader(f)
+        header = next(reader, [])
+        columns = list(zip(*reader)) or [()] * len(header)
+    table = {}
+    for name, values in zip(header, columns):
+        values = np.array(values, dtype=str)
+        if name in NUMERIC:
+            empty = values == ""
+            numbers = np.full(len(values), np.nan)
+            numbers[~empty] = values[~empty].astype(float)
+            values = numbers
+        table[name] = values
+    return table
+
+
+def null_mask(values):
+    values = np.asarray(values)
+    if values.dtype.kind == "f":
+        return np.isnan(values)
+    if values.dtype.kind in "US":
+        return values == ""
+    if values.dtype.kind == "O":
+        return np.array([v is None or v == "" or v != v for v in values], dtype=bool)
+    return np.zeros(len(values), dtype=bool)
+
+
+def expect_column_values_to_not_be_null(table, column):
+    return null_mask(table[column])
+
+
+def expect_column_values_to_be_between(table, column, min_value=None, max_value=None):
+    # like GE, nulls are not counted as unexpected
+    values = np.asarray(table[column], dtype=float)
+    unexpected = np.zeros(len(values), dtype=bool)
+    if min_value is not None:
+        unexpected |= values < min_value
+    if max_value is not None:
+        unexpected |= values > max_value
+    return unexpected & ~np.isnan(values)
+
+
+def expect_column_values_to_be_in_set(table, column, value_set):
+    values = np.asarray(table[column])
+    return ~np.isin(values, list(value_set)) & ~null_mask(values)
+
+
+def expect_column_values_to_be_unique(table, column):
+    values = np.asarray(table[column])
+    present = ~null_mask(values)
+    _, inverse, counts = np.unique(values[present], return_inverse=True, return_counts=True)
+    unexpected = np.zeros(len(values), dtype=bool)
+    unexpected[present] = counts[inverse] > 1
+    return unexpected
+
+
+def validate(table, suite=SUITE, warnings=WARNINGS):
+    """{'success', 'results'} with one result per expectation: kwargs, severity, success, unexpected rows.
+
+    success only depends on the suite; failed warnings are just reported.
+    """
+    results = []
+    for severity, expectations in (("error", suite), ("warning", warnings)):
+        for name, kwargs in expectations:
+            result = {"expectation_type": name, "kwargs": kwargs, "severity": severity}
+            column = kwargs["column"]
+            if column not in table:
+                result.update(success=False, unexpected_count=None, unexpected_rows=[],
+                              error="missing column %r" % column)
+            else:
+                unexpected = np.flatnonzero(globals()[name](table, **kwargs))
+                result.update(success=not len(unexpected), unexpected_count=len(unexpected),
+                              unexpected_rows=unexpected.tolist())
+            results.append(result)
+    return {"success": all(r["success"] for r in results if r["severity"] == "error"), "results": results}
+
+
+def report(table, validation, examples=EXAMPLES):
+    """Printable lines, one per expectation plus examples of failing rows by filename."""
+    names = table.get("filename")
+    lines = []
+    for r in validation["results"]:
+        kwargs = ", ".join("%s=%s" % item for item in r["kwargs"].items())
+        if r["success"]:
+            lines.append("✅ %s(%s)" % (r["expectation_type"], kwargs))
+            continue
+        detail = r.get("error") or "%d unexpected" % r["unexpected_count"]
+        mark = "❌" if r["severity"] == "error" else "⚠️"
+        lines.append("%s %s(%s): %s" % (mark, r["expectation_type"], kwargs, detail))
+        for row in r["unexpected_rows"][:examples]:
+            value = table[r["kwargs"]["column"]][row]
+            lines.append("     %s: %s" % (names[row] if names is not None else row, value))
+    return lines